@@ -0,0 +1,207 @@
+// Virtualized tables for the JSON data files written by scripts/data_tables.py.
+// Each <div class="sf-data-table" data-src="..."> fetches its data once it
+// scrolls into view and only renders the rows visible in its viewport.
+(function() {
+  const ROW_HEIGHT = 32;
+  const VIEWPORT_ROWS = 15;
+  const OVERSCAN = 5;
+
+  const configElement = document.getElementById('__config');
+  const config = configElement ? JSON.parse(configElement.textContent) : {};
+  const base = new URL(config.base || '.', window.location.href);
+
+  function element(tag, className, text) {
+    const node = document.createElement(tag);
+    if (className) {
+      node.className = className;
+    }
+    if (text !== undefined) {
+      node.textContent = text;
+    }
+    return node;
+  }
+
+  function compare(a, b, numeric) {
+    if (numeric) {
+      return (Number(a) || 0) - (Number(b) || 0);
+    }
+    return String(a ?? '').localeCompare(String(b ?? ''), undefined, { numeric: true });
+  }
+
+  class DataTable {
+    constructor(container, data) {
+      this.container = container;
+      this.columns = data.columns;
+      this.rows = data.rows;
+      // Lower-cased row text, built once for filtering
+      this.searchText = this.rows.map((row) => row.join(' ').toLowerCase());
+      this.pageSize = parseInt(container.dataset.pageSize, 10) || 200;
+      this.view = this.rows.map((_, index) => index);
+      this.page = 0;
+      this.sortColumn = null;
+      this.sortDescending = false;
+      this.build();
+      this.refresh();
+    }
+
+    build() {
+      this.container.innerHTML = '';
+
+      const toolbar = element('div', 'sf-data-table__toolbar');
+      this.filter = element('input', 'sf-data-table__filter md-input');
+      this.filter.type = 'search';
+      this.filter.placeholder = `Filter ${this.rows.length} rows`;
+      let timer = null;
+      this.filter.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(() => this.applyFilter(), 150);
+      });
+      this.status = element('span', 'sf-data-table__status');
+      this.previous = element('button', 'md-button', 'Previous');
+      this.next = element('button', 'md-button', 'Next');
+      this.previous.addEventListener('click', () => this.goTo(this.page - 1));
+      this.next.addEventListener('click', () => this.goTo(this.page + 1));
+      toolbar.append(this.filter, this.status, this.previous, this.next);
+
+      const header = element('div', 'sf-data-table__row sf-data-table__header');
+      this.headerCells = this.columns.map((column, index) => {
+        const cell = element('div', 'sf-data-table__cell', column.name);
+        cell.addEventListener('click', () => this.sortBy(index));
+        header.appendChild(cell);
+        return cell;
+      });
+
+      this.viewport = element('div', 'sf-data-table__viewport');
+      this.viewport.style.height = `${ROW_HEIGHT * VIEWPORT_ROWS}px`;
+      this.spacer = element('div', 'sf-data-table__spacer');
+      this.body = element('div', 'sf-data-table__body');
+      this.spacer.appendChild(this.body);
+      this.viewport.appendChild(this.spacer);
+      this.viewport.addEventListener('scroll', () => this.renderRows());
+
+      const grid = `repeat(${this.columns.length}, minmax(8rem, 1fr))`;
+      this.container.style.setProperty('--sf-data-table-columns', grid);
+      this.container.append(toolbar, header, this.viewport);
+    }
+
+    applyFilter() {
+      const terms = this.filter.value.toLowerCase().split(/\s+/).filter(Boolean);
+      this.view = [];
+      this.searchText.forEach((text, index) => {
+        if (terms.every((term) => text.includes(term))) {
+          this.view.push(index);
+        }
+      });
+      this.sortView();
+      this.page = 0;
+      this.refresh();
+    }
+
+    sortBy(index) {
+      this.sortDescending = this.sortColumn === index ? !this.sortDescending : false;
+      this.sortColumn = index;
+      this.headerCells.forEach((cell, i) => {
+        cell.dataset.sort = i === index ? (this.sortDescending ? 'desc' : 'asc') : '';
+      });
+      this.sortView();
+      this.refresh();
+    }
+
+    sortView() {
+      if (this.sortColumn === null) {
+        return;
+      }
+      const column = this.sortColumn;
+      const numeric = this.columns[column].type === 'number';
+      const direction = this.sortDescending ? -1 : 1;
+      this.view.sort((a, b) => direction * compare(this.rows[a][column], this.rows[b][column], numeric));
+    }
+
+    pageCount() {
+      return Math.max(1, Math.ceil(this.view.length / this.pageSize));
+    }
+
+    goTo(page) {
+      this.page = Math.min(Math.max(page, 0), this.pageCount() - 1);
+      this.refresh();
+    }
+
+    refresh() {
+      const start = this.page * this.pageSize;
+      this.pageRows = this.view.slice(start, start + this.pageSize);
+      const end = start + this.pageRows.length;
+      this.status.textContent = this.view.length
+        ? `${start + 1}–${end} of ${this.view.length}`
+        : 'No matching rows';
+      this.previous.disabled = this.page === 0;
+      this.next.disabled = this.page >= this.pageCount() - 1;
+      this.spacer.style.height = `${this.pageRows.length * ROW_HEIGHT}px`;
+      this.viewport.scrollTop = 0;
+      this.renderRows();
+    }
+
+    // Render only the rows inside the viewport, plus a few above and below
+    renderRows() {
+      const first = Math.max(0, Math.floor(this.viewport.scrollTop / ROW_HEIGHT) - OVERSCAN);
+      const last = Math.min(this.pageRows.length, first + VIEWPORT_ROWS + 2 * OVERSCAN);
+      const fragment = document.createDocumentFragment();
+      for (let i = first; i < last; i++) {
+        const row = element('div', 'sf-data-table__row');
+        this.rows[this.pageRows[i]].forEach((value) => {
+          const cell = element('div', 'sf-data-table__cell', value ?? '');
+          cell.title = value ?? '';
+          row.appendChild(cell);
+        });
+        fragment.appendChild(row);
+      }
+      this.body.style.transform = `translateY(${first * ROW_HEIGHT}px)`;
+      this.body.replaceChildren(fragment);
+    }
+  }
+
+  function load(container) {
+    container.classList.add('sf-data-table--loading');
+    fetch(new URL(container.dataset.src, base))
+      .then((response) => response.json())
+      .then((data) => {
+        container.classList.remove('sf-data-table--loading');
+        new DataTable(container, data);
+      })
+      .catch((error) => {
+        container.classList.remove('sf-data-table--loading');
+        container.textContent = `Failed to load table data: ${error}`;
+      });
+  }
+
+  function init() {
+    const containers = document.querySelectorAll('.sf-data-table:not([data-loaded])');
+    if (!containers.length) {
+      return;
+    }
+    const observer = 'IntersectionObserver' in window
+      ? new IntersectionObserver((entries) => {
+        entries.forEach((entry) => {
+          if (entry.isIntersecting) {
+            observer.unobserve(entry.target);
+            load(entry.target);
+          }
+        });
+      }, { rootMargin: '200px' })
+      : null;
+    containers.forEach((container) => {
+      container.dataset.loaded = 'true';
+      if (observer) {
+        observer.observe(container);
+      } else {
+        load(container);
+      }
+    });
+  }
+
+  // Material's instant navigation replaces the page content without a reload
+  if (window.document$) {
+    window.document$.subscribe(init);
+  } else {
+    document.addEventListener('DOMContentLoaded', init);
+  }
+})();
@@ -0,0 +1,146 @@
+// Full-text search over the sharded index written by overrides/hooks/search_shards.py.
+// The built-in search answers page titles from the small head index; this
+// script loads the section shards, with every heading and field entry, on
+// demand, the current page's section first, and lists the full-text matches
+// below the built-in results.
+(function() {
+  const MAX_RESULTS = 10;
+  const MIN_QUERY_LENGTH = 3;
+  const DEBOUNCE_MS = 250;
+
+  const configElement = document.getElementById('__config');
+  const config = configElement ? JSON.parse(configElement.textContent) : {};
+  // Resolved once, relative to the page the site was entered on
+  const base = new URL(config.base || '.', window.location.href);
+
+  let manifest = null;
+  const shards = {};
+
+  function loadManifest() {
+    if (!manifest) {
+      manifest = fetch(new URL('search/shards.json', base))
+        .then((response) => (response.ok ? response.json() : { shards: {} }))
+        .catch(() => ({ shards: {} }));
+    }
+    return manifest;
+  }
+
+  function loadShard(name, shard) {
+    if (!shards[name]) {
+      shards[name] = fetch(new URL(`search/${shard.file}`, base))
+        .then((response) => response.json())
+        .then((data) => data.docs)
+        .catch(() => []);
+    }
+    return shards[name];
+  }
+
+  function currentSection() {
+    return window.location.href.slice(base.href.length).split('/')[0];
+  }
+
+  // Shard names with the current page's section first
+  async function shardOrder() {
+    const list = (await loadManifest()).shards;
+    const section = currentSection();
+    const names = Object.keys(list).sort((a, b) => (b === section) - (a === section));
+    return { list, names };
+  }
+
+  async function search(query) {
+    const terms = query.toLowerCase().split(/\s+/).filter(Boolean);
+    const results = [];
+    const { list, names } = await shardOrder();
+    for (const name of names) {
+      const docs = await loadShard(name, list[name]);
+      for (const doc of docs) {
+        const text = `${doc.title} ${doc.text}`.toLowerCase();
+        if (terms.every((term) => text.includes(term))) {
+          results.push(doc);
+          if (results.length >= MAX_RESULTS) {
+            return results;
+          }
+        }
+      }
+    }
+    return results;
+  }
+
+  function snippet(html, terms) {
+    const text = html.replace(/<[^>]+>/g, ' ').replace(/\s+/g, ' ').trim();
+    const position = Math.max(0, text.toLowerCase().indexOf(terms[0]) - 40);
+    return (position ? '… ' : '') + text.slice(position, position + 160);
+  }
+
+  function render(container, results, query) {
+    container.innerHTML = '';
+    if (!results.length) {
+      return;
+    }
+    const terms = query.toLowerCase().split(/\s+/).filter(Boolean);
+    const shown = new Set(
+      Array.from(document.querySelectorAll('.md-search-result__list a'), (link) => link.href)
+    );
+    const heading = document.createElement('div');
+    heading.className = 'md-search-result__meta sf-shard-results__title';
+    heading.textContent = 'Full-text matches';
+    container.appendChild(heading);
+    results.forEach((doc) => {
+      const href = new URL(doc.location, base).href;
+      if (shown.has(href)) {
+        return;
+      }
+      const item = document.createElement('li');
+      item.className = 'md-search-result__item';
+      const link = document.createElement('a');
+      link.className = 'md-search-result__link';
+      link.href = href;
+      const article = document.createElement('article');
+      article.className = 'md-search-result__article md-typeset';
+      const title = document.createElement('h2');
+      title.textContent = doc.title;
+      const text = document.createElement('p');
+      text.textContent = snippet(doc.text, terms);
+      article.append(title, text);
+      link.appendChild(article);
+      item.appendChild(link);
+      container.appendChild(item);
+    });
+  }
+
+  document.addEventListener('DOMContentLoaded', function() {
+    const input = document.querySelector('.md-search__input');
+    const output = document.querySelector('.md-search-result');
+    if (!input || !output) {
+      return;
+    }
+    const container = document.createElement('ol');
+    container.className = 'md-search-result__list sf-shard-results';
+    output.appendChild(container);
+
+    // Fetch the current section's shard as soon as search is opened
+    input.addEventListener('focus', () => {
+      shardOrder().then(({ list, names }) => names.length && loadShard(names[0], list[names[0]]));
+    });
+
+    let timer = null;
+    let latest = '';
+    input.addEventListener('input', () => {
+      clearTimeout(timer);
+      const query = input.value.trim();
+      latest = query;
+      if (query.length < MIN_QUERY_LENGTH) {
+        container.innerHTML = '';
+        return;
+      }
+      timer = setTimeout(() => {
+        search(query).then((results) => {
+          // Drop results of queries the user has already typed past
+          if (query === latest) {
+            render(container, results, query);
+          }
+        });
+      }, DEBOUNCE_MS);
+    });
+  });
+})();
@@ -0,0 +1,159 @@
+"""
+MkDocs hook: page dates from Salesforce for generated pages
+
+Generated pages carry sf_created_date and sf_modified_date in their front
+matter (see scripts/object_dates.py). For those pages the
+git-revision-date-localized plugin is skipped, which saves a git log call
+per file, and the page.meta values it would set are filled from the
+Salesforce dates instead. Hand-written pages still get their dates from git.
+"""
+
+import inspect
+import logging
+from datetime import date, datetime, timezone
+
+from mkdocs.plugins import event_priority
+from mkdocs.structure.files import Files
+
+try:
+    from babel.dates import format_date, format_time
+except ImportError:  # pragma: no cover - babel ships with mkdocs-material
+    format_date = format_time = None
+
+log = logging.getLogger("mkdocs.hooks.page_dates")
+
+GIT_PLUGIN = "git-revision-date-localized"
+CREATED_KEY = "sf_created_date"
+MODIFIED_KEY = "sf_modified_date"
+
+# Bytes read from each page to look for the front matter keys
+FRONT_MATTER_PEEK = 4096
+
+_generated = set()
+
+
+def _owner(handler):
+    """Plugin instance behind a (possibly wrapped) event handler"""
+    return getattr(inspect.unwrap(handler), "__self__", None)
+
+
+def _has_dates(path):
+    with open(path, "rb") as f:
+        head = f.read(FRONT_MATTER_PEEK)
+    if not head.startswith(b"---"):
+        return False
+    front = head.split(b"\n---", 1)[0]
+    return f"\n{MODIFIED_KEY}:".encode() in front or f"\n{CREATED_KEY}:".encode() in front
+
+
+def _skip_generated_files(handler):
+    def on_files(files, **kwargs):
+        # Hand the plugin only the files it still has to look up in git
+        others = Files([f for f in files if f.src_uri not in _generated])
+        handler(others, **kwargs)
+        return files
+
+    on_files._sf_page_dates = True
+    return on_files
+
+
+def _skip_generated_pages(handler):
+    def on_page_markdown(markdown, **kwargs):
+        if kwargs["page"].file.src_uri in _generated:
+            return markdown
+        return handler(markdown, **kwargs)
+
+    on_page_markdown._sf_page_dates = True
+    return on_page_markdown
+
+
+def on_config(config):
+    plugin = config.plugins.get(GIT_PLUGIN)
+    if plugin is None:
+        return
+    wrappers = {"files": _skip_generated_files, "page_markdown": _skip_generated_pages}
+    for event, wrap in wrappers.items():
+        handlers = config.plugins.events[event]
+        for i, handler in enumerate(handlers):
+            if _owner(handler) is plugin and not getattr(handler, "_sf_page_dates", False):
+                handlers[i] = wrap(handler)
+
+
+# Runs before the plugins so the generated pages are known when they run
+@event_priority(100)
+def on_files(files, config):
+    _generated.clear()
+    for file in files.documentation_pages():
+        try:
+            if _has_dates(file.abs_src_path):
+                _generated.add(file.src_uri)
+        except OSError:
+            continue
+    if _generated:
+        log.debug(f"{len(_generated)} pages use Salesforce dates")
+    return files
+
+
+def _parse(value):
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    value = str(value).strip()
+    for fmt in ("%Y-%m-%dT%H:%M:%S.%f%z", "%Y-%m-%dT%H:%M:%S%z", "%Y-%m-%d"):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    return None
+
+
+def _formats(moment, locale):
+    """The date formats git-revision-date-localized provides"""
+    if format_date is not None:
+        long_date = format_date(moment, format="long", locale=locale)
+        time_text = format_time(moment, format="HH:mm:ss", locale=locale)
+    else:
+        long_date = moment.strftime("%B %d, %Y")
+        time_text = moment.strftime("%H:%M:%S")
+    return {
+        "date": long_date,
+        "datetime": f"{long_date} {time_text}",
+        "iso_date": moment.strftime("%Y-%m-%d"),
+        "iso_datetime": moment.strftime("%Y-%m-%d %H:%M:%S"),
+        "timeago": f'<span class="timeago" datetime="{moment.isoformat()}" locale="{locale}"></span>',
+    }
+
+
+def _span(text, date_type):
+    return (
+        '<span class="git-revision-date-localized-plugin '
+        f'git-revision-date-localized-plugin-{date_type}">{text}</span>'
+    )
+
+
+def on_page_markdown(markdown, page, config, files):
+    if page.file.src_uri not in _generated:
+        return markdown
+
+    plugin = config.plugins.get(GIT_PLUGIN)
+    options = plugin.config if plugin is not None else {}
+    date_type = options.get("type", "date")
+    locale = options.get("locale") or config.theme.get("language") or "en"
+    creation = options.get("enable_creation_date", True)
+
+    for key, meta_key in (
+        (MODIFIED_KEY, "git_revision_date_localized"),
+        (CREATED_KEY, "git_creation_date_localized"),
+    ):
+        if key == CREATED_KEY and not creation:
+            continue
+        moment = _parse(page.meta.get(key)) if page.meta.get(key) else None
+        if moment is None:
+            continue
+        formats = _formats(moment, locale)
+        page.meta[meta_key] = _span(formats.get(date_type, formats["date"]), date_type)
+        for name, text in formats.items():
+            page.meta[f"{meta_key}_raw_{name}"] = text
+    return markdown
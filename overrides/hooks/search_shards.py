@@ -0,0 +1,114 @@
+"""
+MkDocs hook: sharded search index
+
+The search plugin writes one search_index.json for the whole site, which
+every visitor downloads before search works. After the build this hook
+splits it into one shard per top-level docs section (data_model, admin,
+security, ...) under search/shards/ and replaces search_index.json with a
+small head index. The head keeps the page-level entries only (page titles,
+section index pages), each with short, compacted text; the heading and
+field entries of a page (locations with an #anchor) are in its section's
+shard only. The built-in search answers page titles from the head index
+right away; search_shards.js loads the full text shards lazily, starting
+with the section of the current page.
+
+Entries of field sections (the data dictionary tables) are compacted to
+their distinct words, which drops the table markup and the repeated type
+and Yes/No columns but keeps every field name and label searchable.
+"""
+
+import json
+import logging
+import os
+import re
+
+from mkdocs.plugins import event_priority
+
+log = logging.getLogger("mkdocs.hooks.search_shards")
+
+SHARD_DIR = "shards"
+MANIFEST = "shards.json"
+ROOT_SECTION = "index"
+
+# Characters of text kept per entry in the head index
+HEAD_TEXT_LENGTH = 160
+
+TAG_PATTERN = re.compile(r"<[^>]+>")
+FIELD_SECTION_PATTERN = re.compile(r"\bfields?\b", re.IGNORECASE)
+
+
+def compact_text(text):
+    """Strip markup and keep each distinct word once, in order"""
+    seen = set()
+    words = []
+    for word in TAG_PATTERN.sub(" ", text or "").split():
+        key = word.lower()
+        if key not in seen:
+            seen.add(key)
+            words.append(word)
+    return " ".join(words)
+
+
+def section_of(location, sections):
+    """Top-level docs section of a search entry location"""
+    first = location.split("#", 1)[0].strip("/").split("/", 1)[0]
+    return first if first in sections else ROOT_SECTION
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    text = json.dumps(data, separators=(",", ":"))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return len(text.encode("utf-8"))
+
+
+# Runs after the search plugin has written its index
+@event_priority(-100)
+def on_post_build(config):
+    search_dir = os.path.join(config.site_dir, "search")
+    index_path = os.path.join(search_dir, "search_index.json")
+    if not os.path.isfile(index_path):
+        return
+    with open(index_path, encoding="utf-8") as f:
+        index = json.load(f)
+    full_size = os.path.getsize(index_path)
+
+    sections = {
+        name
+        for name in os.listdir(config.docs_dir)
+        if os.path.isdir(os.path.join(config.docs_dir, name))
+    }
+    shards = {}
+    head = []
+    for entry in index.get("docs", []):
+        if FIELD_SECTION_PATTERN.search(entry.get("title", "")):
+            entry = dict(entry, text=compact_text(entry.get("text")))
+        shards.setdefault(section_of(entry["location"], sections), []).append(entry)
+        if "#" in entry["location"]:
+            # Heading or field entry: searched in the shard only
+            continue
+        text = compact_text(entry.get("text"))
+        if len(text) > HEAD_TEXT_LENGTH:
+            text = text[:HEAD_TEXT_LENGTH].rsplit(" ", 1)[0] + " …"
+        head.append(dict(entry, text=text))
+
+    manifest = {"version": 1, "shards": {}}
+    for name, docs in sorted(shards.items()):
+        file_name = f"{SHARD_DIR}/{name}.json"
+        size = _write_json(os.path.join(search_dir, file_name), {"docs": docs})
+        manifest["shards"][name] = {"file": file_name, "docs": len(docs), "bytes": size}
+    _write_json(os.path.join(search_dir, MANIFEST), manifest)
+
+    # Shards of sections that no longer exist
+    written = {shard["file"] for shard in manifest["shards"].values()}
+    shard_dir = os.path.join(search_dir, SHARD_DIR)
+    for file_name in os.listdir(shard_dir) if os.path.isdir(shard_dir) else []:
+        if f"{SHARD_DIR}/{file_name}" not in written:
+            os.remove(os.path.join(shard_dir, file_name))
+    head_size = _write_json(index_path, dict(index, docs=head))
+
+    log.info(
+        f"Search index split into {len(shards)} shards, head index of {len(head)} pages "
+        f"{head_size / 1024:.0f} KB (was {full_size / 1024:.0f} KB)"
+    )
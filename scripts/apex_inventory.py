@@ -0,0 +1,196 @@
+"""
+Apex classes, triggers, tests and code coverage
+
+Everything comes from a few Tooling queries, read across all pages: ApexClass and
+ApexTrigger without their bodies, and ApexCodeCoverageAggregate for the
+covered and uncovered lines of every class and trigger. Coverage is joined
+and summed in one pass over the aggregate rows.
+
+Class bodies are only needed to tell test classes apart. They are fetched
+for classes that are new or whose LastModifiedDate changed since the last
+run; the analysis of every other class is reused from the previous
+inventory, so unchanged classes are never fetched again. A class whose body
+could not be fetched is stored with body_missing set and fetched again on
+the next run.
+"""
+
+import logging
+import re
+from typing import Dict, List, Optional
+
+from instrumentation import span
+from query_iterator import iter_query, query_all
+
+logger = logging.getLogger(__name__)
+
+CLASS_QUERY = (
+    "SELECT Id, Name, NamespacePrefix, ApiVersion, Status, IsValid, "
+    "LengthWithoutComments, LastModifiedDate FROM ApexClass"
+)
+TRIGGER_QUERY = (
+    "SELECT Id, Name, NamespacePrefix, TableEnumOrId, ApiVersion, Status, IsValid, "
+    "LengthWithoutComments, LastModifiedDate, UsageBeforeInsert, UsageAfterInsert, "
+    "UsageBeforeUpdate, UsageAfterUpdate, UsageBeforeDelete, UsageAfterDelete, "
+    "UsageAfterUndelete FROM ApexTrigger"
+)
+COVERAGE_QUERY = (
+    "SELECT ApexClassOrTriggerId, NumLinesCovered, NumLinesUncovered "
+    "FROM ApexCodeCoverageAggregate"
+)
+BODY_QUERY = "SELECT Id, Body FROM ApexClass WHERE Id IN ({ids})"
+
+# Ids per body query, keeps the query URL well below its length limit
+BODY_BATCH_SIZE = 100
+
+TRIGGER_EVENTS = (
+    ("UsageBeforeInsert", "before insert"),
+    ("UsageAfterInsert", "after insert"),
+    ("UsageBeforeUpdate", "before update"),
+    ("UsageAfterUpdate", "after update"),
+    ("UsageBeforeDelete", "before delete"),
+    ("UsageAfterDelete", "after delete"),
+    ("UsageAfterUndelete", "after undelete"),
+)
+
+# Org-wide coverage required for production deployments
+REQUIRED_COVERAGE = 75.0
+
+IS_TEST_PATTERN = re.compile(r"@isTest\b", re.IGNORECASE)
+TEST_METHOD_PATTERN = re.compile(
+    r"(@isTest\s+(?:(?:public|private|global|static)\s+)*void\s+\w+\s*\()"
+    r"|(\btestMethod\s+void\s+\w+\s*\()",
+    re.IGNORECASE,
+)
+CLASS_PATTERN = re.compile(r"\bclass\s+\w+", re.IGNORECASE)
+
+
+def analyze_body(body: str) -> Dict:
+    """Test class flag and test method count of an Apex class body"""
+    class_match = CLASS_PATTERN.search(body or "")
+    header = (body or "")[: class_match.start()] if class_match else ""
+    test_methods = len(TEST_METHOD_PATTERN.findall(body or ""))
+    return {
+        "is_test": bool(IS_TEST_PATTERN.search(header)) or test_methods > 0,
+        "test_methods": test_methods,
+    }
+
+
+def _coverage(covered: int, uncovered: int) -> Optional[float]:
+    total = covered + uncovered
+    return round(covered / total * 100, 2) if total else None
+
+
+def _fetch_bodies(sf, class_ids: List[str]) -> Dict[str, str]:
+    bodies = {}
+    for i in range(0, len(class_ids), BODY_BATCH_SIZE):
+        ids = ", ".join(f"'{class_id}'" for class_id in class_ids[i : i + BODY_BATCH_SIZE])
+        with span("tooling_query", entity="ApexClass.Body"):
+            for record in iter_query(sf, BODY_QUERY.format(ids=ids), tooling=True):
+                bodies[record["Id"]] = record.get("Body") or ""
+    return bodies
+
+
+def load_apex_inventory(sf, previous: Optional[Dict] = None) -> Dict:
+    """
+    Load classes, triggers and coverage
+
+    Args:
+        sf: simple_salesforce connection
+        previous: Inventory of an earlier run; the body analysis of classes
+            with the same LastModifiedDate is taken from it
+
+    Returns:
+        {"classes", "triggers", "tests", "totals", "body_fetches"}
+    """
+    previous = previous or {}
+    known = {c["id"]: c for c in previous.get("classes", []) + previous.get("tests", [])}
+
+    with span("tooling_query", entity="ApexClass"):
+        class_records = query_all(sf, CLASS_QUERY, tooling=True)
+    with span("tooling_query", entity="ApexTrigger"):
+        trigger_records = query_all(sf, TRIGGER_QUERY, tooling=True)
+    try:
+        with span("tooling_query", entity="ApexCodeCoverageAggregate"):
+            coverage_records = query_all(sf, COVERAGE_QUERY, tooling=True)
+    except Exception as e:
+        # No coverage until tests have run in the org
+        logger.warning(f"Failed to get code coverage: {str(e)}")
+        coverage_records = []
+
+    changed = [
+        record["Id"]
+        for record in class_records
+        if known.get(record["Id"], {}).get("last_modified") != record.get("LastModifiedDate")
+        or known[record["Id"]].get("body_missing")
+    ]
+    bodies = _fetch_bodies(sf, changed) if changed else {}
+
+    # One pass over the aggregate rows
+    lines = {}
+    for record in coverage_records:
+        lines[record["ApexClassOrTriggerId"]] = (
+            record.get("NumLinesCovered") or 0,
+            record.get("NumLinesUncovered") or 0,
+        )
+    covered_total = sum(covered for covered, _ in lines.values())
+    uncovered_total = sum(uncovered for _, uncovered in lines.values())
+
+    def component(record: Dict) -> Dict:
+        covered, uncovered = lines.get(record["Id"], (0, 0))
+        return {
+            "id": record["Id"],
+            "name": record["Name"],
+            "namespace": record.get("NamespacePrefix") or "",
+            "api_version": record.get("ApiVersion"),
+            "status": record.get("Status"),
+            "valid": record.get("IsValid"),
+            "length": record.get("LengthWithoutComments") or 0,
+            "last_modified": record.get("LastModifiedDate"),
+            "lines_covered": covered,
+            "lines_uncovered": uncovered,
+            "coverage": _coverage(covered, uncovered),
+        }
+
+    classes, tests = [], []
+    for record in class_records:
+        entry = component(record)
+        if record["Id"] in bodies:
+            entry.update(analyze_body(bodies[record["Id"]]))
+        else:
+            cached = known.get(record["Id"])
+            if record["Id"] in changed:
+                # Deleted or unreadable between the list and the body query:
+                # flagged, so the body is fetched again next run
+                logger.warning(
+                    f"No body for Apex class {record['Name']}, "
+                    f"{'previous analysis kept' if cached else 'counted as non-test'}"
+                )
+                cached = cached or {"is_test": False, "test_methods": 0}
+                entry["body_missing"] = True
+            entry.update(is_test=cached["is_test"], test_methods=cached["test_methods"])
+        (tests if entry["is_test"] else classes).append(entry)
+
+    triggers = []
+    for record in trigger_records:
+        entry = component(record)
+        entry["object"] = record.get("TableEnumOrId")
+        entry["events"] = [event for key, event in TRIGGER_EVENTS if record.get(key)]
+        triggers.append(entry)
+
+    by_name = lambda c: c["name"].lower()
+    return {
+        "classes": sorted(classes, key=by_name),
+        "triggers": sorted(triggers, key=lambda t: (t["object"] or "", t["name"].lower())),
+        "tests": sorted(tests, key=by_name),
+        "totals": {
+            "classes": len(classes),
+            "triggers": len(triggers),
+            "tests": len(tests),
+            "test_methods": sum(t["test_methods"] for t in tests),
+            "lines_covered": covered_total,
+            "lines_uncovered": uncovered_total,
+            "coverage": _coverage(covered_total, uncovered_total),
+            "required_coverage": REQUIRED_COVERAGE,
+        },
+        "body_fetches": len(bodies),
+    }
@@ -1,19 +1,57 @@
 import os
+import sys
 import json
+import argparse
+import time
 from InquirerPy import prompt
-from simple_salesforce import Salesforce
 from pathlib import Path
-import mkdocs.config
-import mkdocs.commands.build
 
 from jinja2 import Environment, FileSystemLoader, Template
 
+from cache_bundle import BundleError, export_bundle, import_bundle
+from cache_warmer import DEFAULT_WORKERS
+from field_catalog import (
+    DEFAULT_DB,
+    EXPORT_FORMATS,
+    SEARCH_KINDS,
+    CatalogError,
+    build_catalog,
+    export_catalog,
+    query,
+    search,
+)
+from main import (
+    CacheConfig,
+    SalesforceCache,
+    SalesforceDocGenerator,
+    SalesforceMetadata,
+    metadata_type_to_docs_path,
+    metadata_type_to_template_path,
+)
+from mkdocs_builder import MkDocsBuilder
+from org_runner import run_all
+from page_assembler import PageAssembler
+from sf_session import connect
+from watch_daemon import DEFAULT_INTERVAL, WatchDaemon
+
+# Docs page types refreshed for each wizard choice
+WIZARD_PAGE_TYPES = {
+    "CustomObject": ["custom_objects", "custom_fields", "object_relationships"],
+    "ApexClass": ["apex_classes", "apex_tests"],
+    "ApexTrigger": ["apex_triggers"],
+    "Layout": ["page_layouts"],
+    "Flow": ["flow_usage"],
+    "Profile": ["profile_permissions", "profile_matrix"],
+    "PermissionSet": ["permission_sets"],
+}
+
 
 class SFDCBossApp:
     def __init__(self):
         self.config_dir = Path.home() / ".sfdcboss"
         self.config_file = self.config_dir / "config.json"
         self.sf_auths = {}
+        self.mkdocs_builder = MkDocsBuilder()
         self.load_config()
 
     def load_config(self):
@@ -84,11 +122,14 @@ class SFDCBossApp:
         ]
 
         answers = prompt(questions)
-        org_name = answers["org_name"]
+        return self.connect_org(answers["org_name"])
+
+    def connect_org(self, org_name):
+        """Connect to a configured org"""
         auth = self.sf_auths[org_name]
 
         try:
-            sf = Salesforce(
+            sf = connect(
                 username=auth["username"],
                 password=auth["password"],
                 security_token=auth["security_token"],
@@ -101,10 +142,14 @@ class SFDCBossApp:
             return None
 
     def build_frontend(self):
-        """Build MkDocs frontend"""
-        # run mkdocs build
+        """Build MkDocs frontend, re-rendering only pages that changed"""
         try:
-            os.system("mkdocs build")
+            stats = self.mkdocs_builder.build()
+            print(
+                f"Built {stats['rebuilt']} of {stats['pages']} pages in "
+                f"{stats['seconds']:.2f}s ({'incremental' if stats['incremental'] else 'full'})"
+            )
+            print(self.mkdocs_builder.plugin_timing_table())
         except Exception as e:
             print(f"Failed to build frontend: {str(e)}")
 
@@ -112,9 +157,9 @@ class SFDCBossApp:
         os.makedirs("docs", exist_ok=True)
 
     def serve_frontend(self):
-        """Serve MkDocs frontend"""
+        """Serve MkDocs frontend with incremental rebuilds on change"""
         try:
-            os.system("mkdocs serve")
+            self.mkdocs_builder.serve()
         except Exception as e:
             print(f"Failed to serve frontend: {str(e)}")
 
@@ -135,20 +180,81 @@ class SFDCBossApp:
                     "Layout",
                     "Profile",
                     "PermissionSet",
+                    "Flow",
                 ],
                 "name": "metadata_types",
             }
         ]
 
         answers = prompt(questions)
+        metadata_types = answers["metadata_types"]
+        if not metadata_types:
+            return
 
-        # Here you would implement the metadata retrieval logic
-        # This is a placeholder for the actual implementation
-        print(f"Retrieving metadata types: {answers['metadata_types']}")
-
-        # Example of how you might document the metadata
-        docs_dir = Path("docs/metadata")
-        docs_dir.mkdir(exist_ok=True)
+        # listMetadata + readMetadata, one worker per type; cached per type
+        print(f"Retrieving metadata types: {metadata_types}")
+        metadata = SalesforceMetadata(sf, SalesforceCache(CacheConfig()))
+        components = metadata.get_metadata_components(metadata_types)
+        for metadata_type in metadata_types:
+            print(f"{metadata_type}: {len(components.get(metadata_type, []))} components")
+
+        page_types = [
+            page_type
+            for metadata_type in metadata_types
+            for page_type in WIZARD_PAGE_TYPES.get(metadata_type, [])
+        ]
+        # Every section of the affected pages, so shared pages stay complete
+        paths = {metadata_type_to_docs_path[t] for t in page_types}
+        docs_paths = {t: p for t, p in metadata_type_to_docs_path.items() if p in paths}
+        if docs_paths:
+            PageAssembler(metadata, docs_paths, metadata_type_to_template_path).assemble()
+
+    def run_all_orgs(self, output_root="orgs", cpu_budget=None, api_budget=None):
+        """Document every configured org concurrently, without prompts"""
+        if not self.sf_auths:
+            print("No authentication details found. Please set up authentication first.")
+            return []
+        results = run_all(
+            self.sf_auths,
+            output_root=output_root,
+            cpu_budget=cpu_budget,
+            api_budget=api_budget,
+        )
+        failed = [r["org"] for r in results if r["error"]]
+        print(f"Documented {len(results) - len(failed)} of {len(results)} orgs into {output_root}")
+        return results
+
+    def watch(self, org_name, interval=DEFAULT_INTERVAL):
+        """Regenerate the pages affected by Setup changes as they happen"""
+        if org_name not in self.sf_auths:
+            print(f"No authentication details found for {org_name}.")
+            return
+        sf = self.connect_org(org_name)
+        if not sf:
+            return
+        metadata = SalesforceMetadata(sf, SalesforceCache(CacheConfig()))
+        assembler = PageAssembler(
+            metadata, metadata_type_to_docs_path, metadata_type_to_template_path
+        )
+        # One full run loads everything the daemon keeps in memory
+        assembler.assemble()
+        WatchDaemon(metadata, assembler, interval).run()
+
+    def warm_cache(self, org_name, api_budget=None, workers=DEFAULT_WORKERS):
+        """Fill the cache ahead of a documentation run, most important objects first"""
+        if org_name not in self.sf_auths:
+            print(f"No authentication details found for {org_name}.")
+            return None
+        sf = self.connect_org(org_name)
+        if not sf:
+            return None
+        generator = SalesforceDocGenerator(None, None, None, sf_connection=sf)
+        stats = generator.warm_cache(api_budget, workers)
+        print(
+            f"Warmed {stats['warmed']} objects, {stats['cached']} already cached, "
+            f"{stats['failed']} failed, {stats['not_started']} not started"
+        )
+        return stats
 
     def check_status(self):
         """Check status of the app"""
@@ -158,12 +264,161 @@ class SFDCBossApp:
         # files in cache folder .sf_cache
         # files in cache folder .sf_cache
         # files in cache folder .sf_cache
-        files = os.listdir(".sf_cache")
+        files = list(Path(".sf_cache").rglob("*.pkl"))
         # count files
         print(f"Cache files: {len(files)}")
 
 
+def run_headless(argv):
+    """Commands that run without the interactive menu"""
+    parser = argparse.ArgumentParser(description="sfdcboss docs generator")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_all_parser = subparsers.add_parser(
+        "run-all", help="Document every configured org in parallel worker processes"
+    )
+    run_all_parser.add_argument(
+        "--output-root", default="orgs", help="One docs tree per org below this directory"
+    )
+    run_all_parser.add_argument(
+        "--cpu-budget", type=int, help="Worker processes at the same time (default: CPU count)"
+    )
+    run_all_parser.add_argument(
+        "--api-budget",
+        type=int,
+        help="API requests for the whole run, split equally between orgs (default: unlimited)",
+    )
+    watch_parser = subparsers.add_parser(
+        "watch", help="Regenerate pages as Setup changes are made in an org"
+    )
+    watch_parser.add_argument("org", help="Configured org name")
+    watch_parser.add_argument(
+        "--interval",
+        type=float,
+        default=DEFAULT_INTERVAL,
+        help=f"Seconds between SetupAuditTrail polls (default: {DEFAULT_INTERVAL:g})",
+    )
+    warm_parser = subparsers.add_parser(
+        "warm-cache", help="Prefetch object metadata into the cache, core objects first"
+    )
+    warm_parser.add_argument("org", help="Configured org name")
+    warm_parser.add_argument(
+        "--api-budget", type=int, help="API requests the warm-up may use (default: unlimited)"
+    )
+    warm_parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Objects fetched at the same time (default: {DEFAULT_WORKERS})",
+    )
+    for command, help_text in (
+        ("cache-export", "Pack the cache into a bundle, e.g. to store as a CI cache artifact"),
+        ("cache-import", "Restore a cache bundle, validating every entry"),
+    ):
+        cache_parser = subparsers.add_parser(command, help=help_text)
+        cache_parser.add_argument("bundle", help="Bundle file (.tar.gz)")
+        cache_parser.add_argument(
+            "--cache-dir", default=".sf_cache", help="Cache directory (default: .sf_cache)"
+        )
+        cache_parser.add_argument("--org-id", help="Only the entries of this org id")
+    catalog_parser = subparsers.add_parser(
+        "catalog", help="Searchable catalog of the objects, fields and picklist values in the cache"
+    )
+    catalog_parser.add_argument(
+        "--db", default=DEFAULT_DB, help=f"Catalog database (default: {DEFAULT_DB})"
+    )
+    catalog_actions = catalog_parser.add_subparsers(dest="action", required=True)
+    build_parser = catalog_actions.add_parser("build", help="Build the catalog from the cache")
+    build_parser.add_argument(
+        "--cache-dir", default=".sf_cache", help="Cache directory (default: .sf_cache)"
+    )
+    search_parser = catalog_actions.add_parser(
+        "search", help="Full-text search of names, labels, help texts and picklist values"
+    )
+    search_parser.add_argument("text", help="Words to find, e.g. 'billing country'")
+    search_parser.add_argument("--kind", choices=SEARCH_KINDS, help="Only matches of this kind")
+    search_parser.add_argument("--org-id", help="Only matches of this org")
+    search_parser.add_argument("--limit", type=int, default=50, help="Matches shown (default: 50)")
+    query_parser = catalog_actions.add_parser("query", help="Run a read-only SQL query")
+    query_parser.add_argument("sql", help="e.g. \"SELECT object, name FROM fields WHERE label = 'Region'\"")
+    export_parser = catalog_actions.add_parser("export", help="Write every table to a directory")
+    export_parser.add_argument("out_dir", help="Directory for the exported tables")
+    export_parser.add_argument(
+        "--format", choices=EXPORT_FORMATS, default="csv", help="File format (default: csv)"
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "catalog":
+        try:
+            return run_catalog(args)
+        except CatalogError as e:
+            print(f"Error in catalog: {str(e)}")
+            return 1
+    if args.command == "cache-export":
+        manifest = export_bundle(args.cache_dir, args.bundle, args.org_id)
+        entries = sum(len(ns["entries"]) for ns in manifest["namespaces"].values())
+        print(
+            f"Exported {entries} cache entries of {len(manifest['namespaces'])} "
+            f"namespaces to {args.bundle}"
+        )
+        return 0
+    if args.command == "cache-import":
+        try:
+            stats = import_bundle(args.bundle, args.cache_dir, args.org_id)
+        except BundleError as e:
+            print(f"Error importing cache bundle: {str(e)}")
+            return 1
+        print(
+            f"Imported {stats['imported']} cache entries, kept {stats['kept']} newer local ones, "
+            f"skipped {stats['skipped']}, rejected {len(stats['rejected'])}"
+        )
+        return 0
+    if args.command == "watch":
+        SFDCBossApp().watch(args.org, args.interval)
+        return 0
+    if args.command == "warm-cache":
+        stats = SFDCBossApp().warm_cache(args.org, args.api_budget, args.workers)
+        return 0 if stats is not None else 1
+    results = SFDCBossApp().run_all_orgs(args.output_root, args.cpu_budget, args.api_budget)
+    return 1 if any(r["error"] for r in results) else 0
+
+
+def run_catalog(args):
+    """The catalog subcommands of run_headless"""
+    if args.action == "build":
+        started = time.perf_counter()
+        counts = build_catalog(args.cache_dir, args.db)
+        print(
+            f"Catalog of {counts['objects']} objects, {counts['fields']} fields and "
+            f"{counts['picklist_values']} picklist values built in "
+            f"{time.perf_counter() - started:.2f}s: {args.db}"
+        )
+        return 0
+    if args.action == "export":
+        for path in export_catalog(args.out_dir, args.db, args.format):
+            print(f"Exported {path}")
+        return 0
+
+    started = time.perf_counter()
+    if args.action == "search":
+        rows = search(args.text, args.db, args.kind, args.org_id, args.limit)
+    else:
+        rows = query(args.sql, db_path=args.db)
+    elapsed = (time.perf_counter() - started) * 1000
+    for row in rows:
+        if args.action == "search":
+            location = ".".join(filter(None, (row["object"], row["field"])))
+            value = f" = {row['value']}" if row["value"] else ""
+            print(f"{row['kind']:<15} {location}{value}  {row['text']}")
+        else:
+            print("\t".join("" if v is None else str(v) for v in row.values()))
+    print(f"{len(rows)} rows in {elapsed:.1f} ms")
+    return 0
+
+
 def main():
+    if len(sys.argv) > 1:
+        sys.exit(run_headless(sys.argv[1:]))
+
     ascii_art_boss_text = """
             .                                       .           
      ,-     |                                       |           
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark for the documentation generators
+
+Starts a local fake Salesforce server (see fake_salesforce.py) and runs the
+full fetch -> render -> write pipeline of every generator entry point against
+it. Each scenario runs in its own process so peak RSS is measured per
+scenario. Results are written as JSON and can be compared with a previous
+run to catch performance regressions.
+
+Usage:
+    python scripts/benchmark.py --objects 40 --latency-ms 25 --output bench.json
+
+    # Compare against a previous run (exits with status 1 on regressions)
+    python scripts/benchmark.py --baseline bench.json --output bench-new.json
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from fake_salesforce import FakeOrg, FakeSalesforceServer, connect
+from instrumentation import classify_endpoint
+
+logger = logging.getLogger(__name__)
+
+RESULT_SCHEMA_VERSION = 1
+REPO_ROOT = Path(__file__).resolve().parent.parent
+TEMPLATE_DIR = REPO_ROOT / "templates"
+
+# Scenarios run in this order; main_warm reuses the cache written by main_cold
+SCENARIOS = ["docs_generator", "doc_generator", "main_cold", "main_warm"]
+
+
+def _percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def _run_docs_generator(sf, output_dir, cache_dir):
+    from salesforce_docs_generator import SalesforceDocGenerator
+
+    generator = SalesforceDocGenerator(
+        template_dir=str(TEMPLATE_DIR), sf_connection=sf
+    )
+    documented = generator.generate_standard_objects_documentation(output_dir)
+    documented += generator.generate_custom_objects_documentation(output_dir)
+    return len(documented), None
+
+
+def _run_doc_generator(sf, output_dir, cache_dir):
+    from salesforce_doc_generator import SalesforceDocumentationGenerator
+
+    generator = SalesforceDocumentationGenerator(
+        template_path=str(TEMPLATE_DIR / "object_documentation.j2"),
+        sf_connection=sf,
+    )
+    documented = generator.generate_standard_objects_documentation(output_dir)
+    documented += generator.generate_custom_objects_documentation(output_dir)
+    return len(documented), None
+
+
+def _run_main_generator(sf, output_dir, cache_dir):
+    from main import CacheConfig, SalesforceDocGenerator
+
+    generator = SalesforceDocGenerator(
+        username=None,
+        password=None,
+        security_token=None,
+        cache_config=CacheConfig(cache_dir=cache_dir),
+        template_path=str(TEMPLATE_DIR / "standard_objects.j2"),
+        sf_connection=sf,
+    )
+    generator.save_documentation(os.path.join(output_dir, "standard-objects.md"))
+    lookups = generator.cache.hits + generator.cache.misses
+    hit_rate = generator.cache.hits / lookups if lookups else None
+    # Every object that was fetched successfully has a cache entry
+    documented = len(list(Path(cache_dir).rglob("object_metadata_*.pkl")))
+    return documented, hit_rate
+
+
+SCENARIO_RUNNERS = {
+    "docs_generator": _run_docs_generator,
+    "doc_generator": _run_doc_generator,
+    "main_cold": _run_main_generator,
+    "main_warm": _run_main_generator,
+}
+
+
+def run_scenario(name, instance_url, workdir):
+    """
+    Run one scenario against the fake server (executed in a child process)
+
+    Args:
+        name (str): Scenario name from SCENARIO_RUNNERS
+        instance_url (str): Fake server URL
+        workdir (str): Directory for output and cache files
+
+    Returns:
+        dict: Measurements for the scenario
+    """
+    import requests
+
+    logging.basicConfig(level=logging.WARNING)
+    latencies = []
+    calls = Counter()
+    bytes_received = 0
+
+    def record_response(response, *args, **kwargs):
+        nonlocal bytes_received
+        latencies.append(response.elapsed.total_seconds() * 1000.0)
+        calls[classify_endpoint(response.request.path_url)] += 1
+        bytes_received += len(response.content)
+
+    session = requests.Session()
+    session.hooks["response"].append(record_response)
+    sf = connect(instance_url, session=session)
+
+    output_dir = os.path.join(workdir, name, "docs")
+    cache_dir = os.path.join(workdir, "cache")
+    os.makedirs(output_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    objects, cache_hit_rate = SCENARIO_RUNNERS[name](sf, output_dir, cache_dir)
+    elapsed = time.perf_counter() - started
+
+    files = list(Path(output_dir).rglob("*.md"))
+    return {
+        "objects": objects,
+        "elapsed_seconds": round(elapsed, 4),
+        "objects_per_second": round(objects / elapsed, 3) if elapsed else None,
+        "api_calls": sum(calls.values()),
+        "api_calls_by_endpoint": dict(calls),
+        "bytes_received": bytes_received,
+        "latency_ms_p50": _percentile(latencies, 50),
+        "latency_ms_p99": _percentile(latencies, 99),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "cache_hit_rate": cache_hit_rate,
+        "files_written": len(files),
+        "bytes_written": sum(f.stat().st_size for f in files),
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(args):
+    """
+    Start the fake server and run every requested scenario
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments
+
+    Returns:
+        dict: Benchmark results ready to be serialized as JSON
+    """
+    org = FakeOrg(
+        standard_objects=args.objects // 2,
+        custom_objects=args.objects - args.objects // 2,
+        fields_per_object=args.fields,
+        seed=args.seed,
+    )
+    context = multiprocessing.get_context("spawn")
+    results = {}
+
+    with FakeSalesforceServer(
+        org=org,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_limit=args.rate_limit,
+    ) as server, tempfile.TemporaryDirectory(prefix="sf-bench-") as workdir:
+        for name in args.scenarios:
+            runs = []
+            for _ in range(args.repeat):
+                if name != "main_warm":
+                    # Every scenario except the warm one starts with a cold cache
+                    shutil.rmtree(Path(workdir) / "cache", ignore_errors=True)
+                server.reset_stats()
+                with context.Pool(1) as pool:
+                    run = pool.apply(run_scenario, (name, server.instance_url, workdir))
+                run["server_rejected"] = server.stats()["rejected"]
+                runs.append(run)
+            # Report the run with the median wall time
+            runs.sort(key=lambda r: r["elapsed_seconds"])
+            results[name] = runs[len(runs) // 2]
+            logger.info(
+                f"{name}: {results[name]['objects_per_second']} objects/s, "
+                f"{results[name]['api_calls']} API calls"
+            )
+
+    return {
+        "schema_version": RESULT_SCHEMA_VERSION,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "config": {
+            "objects": args.objects,
+            "fields": args.fields,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "rate_limit": args.rate_limit,
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "scenarios": results,
+    }
+
+
+def compare_results(baseline, current, tolerance):
+    """
+    Compare two result sets and list regressions
+
+    Args:
+        baseline (dict): Previous benchmark results
+        current (dict): New benchmark results
+        tolerance (float): Allowed relative change before flagging (0.1 = 10%)
+
+    Returns:
+        list: Human readable regression descriptions
+    """
+    regressions = []
+    # (metric, True if higher is better)
+    metrics = [
+        ("objects_per_second", True),
+        ("latency_ms_p99", False),
+        ("peak_rss_kb", False),
+        ("api_calls", False),
+    ]
+    for name, result in current["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for metric, higher_is_better in metrics:
+            old, new = previous.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (higher_is_better and change < -tolerance) or (
+                not higher_is_better and change > tolerance
+            ):
+                regressions.append(
+                    f"{name}.{metric}: {old} -> {new} ({change:+.1%})"
+                )
+    return regressions
+
+
+def print_summary(results):
+    header = f"{'scenario':<16}{'obj/s':>10}{'calls':>8}{'p50 ms':>10}{'p99 ms':>10}{'rss MB':>9}{'cache':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results["scenarios"].items():
+        hit_rate = r["cache_hit_rate"]
+        print(
+            f"{name:<16}{r['objects_per_second'] or 0:>10.2f}{r['api_calls']:>8}"
+            f"{r['latency_ms_p50'] or 0:>10.2f}{r['latency_ms_p99'] or 0:>10.2f}"
+            f"{r['peak_rss_kb'] / 1024:>9.1f}"
+            f"{'-' if hit_rate is None else f'{hit_rate:.0%}':>8}"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the documentation generators against a fake org"
+    )
+    parser.add_argument("--objects", type=int, default=20, help="Objects in the org")
+    parser.add_argument("--fields", type=int, default=40, help="Fields per object")
+    parser.add_argument(
+        "--latency-ms", type=float, default=20, help="Server latency per request"
+    )
+    parser.add_argument("--jitter-ms", type=float, default=5, help="Latency jitter")
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=0,
+        help="Requests per second before the server refuses (0: unlimited)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Org generation seed")
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Runs per scenario (median is kept)"
+    )
+    parser.add_argument(
+        "--scenario",
+        dest="scenarios",
+        action="append",
+        choices=SCENARIOS,
+        help="Scenario to run (repeatable, default: all)",
+    )
+    parser.add_argument(
+        "--output", default="benchmark-results.json", help="Result JSON file"
+    )
+    parser.add_argument("--baseline", help="Previous result JSON to compare with")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.15,
+        help="Relative change allowed before a regression is reported",
+    )
+    args = parser.parse_args()
+    args.scenarios = args.scenarios or SCENARIOS
+    return args
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    args = parse_args()
+    results = run_benchmarks(args)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print_summary(results)
+    print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, results, args.tolerance)
+        if regressions:
+            print("Performance regressions detected:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
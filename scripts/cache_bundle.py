@@ -0,0 +1,261 @@
+"""
+Cache namespaces and portable cache bundles
+
+Cached data only stays valid for the org, API version and cache layout it was
+fetched with, so SalesforceCache keeps the entries of each combination in
+their own directory:
+
+    <cache_dir>/<org id>-v<API version>-s<schema version>/object_metadata_Account.pkl
+
+CACHE_SCHEMA_VERSION is bumped whenever the shape of cached data changes;
+entries of older schema versions are then simply never read again.
+
+export_bundle() packs the namespaces of a cache directory into one gzipped
+tar file with a manifest of every entry's SHA-256. A CI job can store the
+bundle as a cache artifact, and the next job restores it with
+import_bundle(). The import checks each entry against the manifest and the
+expected layout before it is written. Entries keep their timestamps, so the
+cache TTL still applies. A local entry newer than the bundle's is kept.
+
+Bundles contain pickles: only import bundles your own jobs produced.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import pickle
+import re
+import tarfile
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_SCHEMA_VERSION = 2
+
+BUNDLE_FORMAT = 1
+MANIFEST_NAME = "manifest.json"
+
+NAMESPACE_PATTERN = re.compile(
+    r"^(?P<org_id>[A-Za-z0-9]+)-v(?P<api_version>\d+\.\d+)-s(?P<schema_version>\d+)$"
+)
+ENTRY_PATTERN = re.compile(r"^[A-Za-z0-9_.-]+\.pkl$")
+ORG_ID_PATTERN = re.compile(r"^00D[A-Za-z0-9]{12,15}$")
+
+# Classes cache entries may contain; anything else in a bundle is rejected
+SAFE_CLASSES = {
+    ("builtins", name)
+    for name in "dict list tuple set frozenset bytearray bytes str int float complex bool".split()
+} | {
+    ("array", "array"),
+    ("array", "_array_reconstructor"),
+    ("collections", "OrderedDict"),
+    ("collections", "defaultdict"),
+    ("collections", "deque"),
+    ("datetime", "date"),
+    ("datetime", "datetime"),
+    ("datetime", "timedelta"),
+    ("datetime", "timezone"),
+    ("hierarchy", "Hierarchy"),
+    ("hierarchy", "HierarchyNode"),
+    ("permissions_matrix", "PermissionMatrix"),
+}
+
+
+class BundleError(Exception):
+    """Raised when a bundle cannot be read or was written in another format"""
+
+
+def namespace(org_id: str, api_version: str, schema_version: int = CACHE_SCHEMA_VERSION) -> str:
+    """Directory name of the cache entries of one org and API version"""
+    return f"{org_id}-v{api_version}-s{schema_version}"
+
+
+def parse_namespace(name: str) -> Optional[Dict]:
+    """org_id, api_version and schema_version of a namespace, None for other names"""
+    match = NAMESPACE_PATTERN.match(name)
+    if not match:
+        return None
+    parsed = match.groupdict()
+    parsed["schema_version"] = int(parsed["schema_version"])
+    return parsed
+
+
+def cache_namespace(sf) -> str:
+    """
+    Cache namespace of a connection
+
+    The org id is the prefix of the session id. Replayed sessions are
+    redacted, their instance host identifies the org instead.
+    """
+    org_id = (getattr(sf, "session_id", None) or "").split("!")[0]
+    if not ORG_ID_PATTERN.match(org_id):
+        org_id = re.sub(r"[^A-Za-z0-9]", "", getattr(sf, "sf_instance", None) or "") or "unknown"
+    return namespace(org_id, sf.sf_version)
+
+
+def namespace_dirs(cache_dir: str) -> List[str]:
+    """Namespace directories below cache_dir, relative to it"""
+    found = []
+    for root, dirs, _ in os.walk(cache_dir):
+        for name in sorted(dirs):
+            if parse_namespace(name):
+                found.append(os.path.relpath(os.path.join(root, name), cache_dir))
+        # Namespaces are never nested
+        dirs[:] = [name for name in dirs if not parse_namespace(name)]
+    return sorted(path.replace(os.sep, "/") for path in found)
+
+
+def export_bundle(cache_dir: str, bundle_path: str, org_id: Optional[str] = None) -> Dict:
+    """
+    Pack the cache namespaces of cache_dir into a gzipped tar bundle
+
+    Args:
+        cache_dir: Cache directory (run-all caches with one directory per org work too)
+        bundle_path: Bundle file to write
+        org_id: Only pack the namespaces of this org
+
+    Returns:
+        The bundle manifest
+    """
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "namespaces": {},
+    }
+    tmp_path = f"{bundle_path}.tmp"
+    with tarfile.open(tmp_path, "w:gz") as bundle:
+        for path in namespace_dirs(cache_dir):
+            parsed = parse_namespace(os.path.basename(path))
+            if org_id and parsed["org_id"] != org_id:
+                continue
+            entries = {}
+            directory = os.path.join(cache_dir, path)
+            for filename in sorted(os.listdir(directory)):
+                if not ENTRY_PATTERN.match(filename):
+                    continue
+                with open(os.path.join(directory, filename), "rb") as f:
+                    content = f.read()
+                entries[filename] = hashlib.sha256(content).hexdigest()
+                info = tarfile.TarInfo(f"{path}/{filename}")
+                info.size = len(content)
+                bundle.addfile(info, io.BytesIO(content))
+            manifest["namespaces"][path] = {**parsed, "entries": entries}
+        data = json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8")
+        info = tarfile.TarInfo(MANIFEST_NAME)
+        info.size = len(data)
+        bundle.addfile(info, io.BytesIO(data))
+    os.replace(tmp_path, bundle_path)
+    return manifest
+
+
+class EntryUnpickler(pickle.Unpickler):
+    """Unpickler that only resolves SAFE_CLASSES"""
+
+    def find_class(self, module: str, name: str):
+        if (module, name) not in SAFE_CLASSES:
+            raise pickle.UnpicklingError(f"{module}.{name} is not allowed in a cache entry")
+        return super().find_class(module, name)
+
+
+def load_entry(content: bytes):
+    """Unpickle a cache entry of a bundle with EntryUnpickler"""
+    return EntryUnpickler(io.BytesIO(content)).load()
+
+
+def _check_entry(content: bytes, expected_hash: Optional[str]) -> Optional[str]:
+    """Why an entry is rejected, None when it is valid"""
+    if expected_hash is None:
+        return "not in the manifest"
+    if hashlib.sha256(content).hexdigest() != expected_hash:
+        return "checksum mismatch"
+    try:
+        entry = load_entry(content)
+    except Exception as e:
+        return f"unreadable ({str(e)})"
+    if not isinstance(entry, dict) or set(entry) != {"timestamp", "data"}:
+        return "not a cache entry"
+    if not isinstance(entry["timestamp"], (int, float)):
+        return "invalid timestamp"
+    return None
+
+
+def _timestamp(path: str) -> Optional[float]:
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)["timestamp"]
+    except Exception:
+        return None
+
+
+def import_bundle(bundle_path: str, cache_dir: str, org_id: Optional[str] = None) -> Dict:
+    """
+    Restore a bundle written by export_bundle() into cache_dir
+
+    Namespaces of another schema version (or org, when org_id is given) are
+    skipped. Invalid entries are rejected one by one; the rest is restored.
+
+    Returns:
+        {"imported", "kept", "skipped", "rejected"}; rejected lists
+        (entry, reason) pairs
+    """
+    stats = {"imported": 0, "kept": 0, "skipped": 0, "rejected": []}
+    try:
+        bundle = tarfile.open(bundle_path, "r:gz")
+    except (OSError, tarfile.TarError) as e:
+        raise BundleError(f"Cannot read cache bundle {bundle_path}: {str(e)}")
+
+    with bundle:
+        try:
+            manifest = json.load(bundle.extractfile(MANIFEST_NAME))
+        except (KeyError, ValueError) as e:
+            raise BundleError(f"{bundle_path} has no valid manifest: {str(e)}")
+        if manifest.get("format") != BUNDLE_FORMAT:
+            raise BundleError(
+                f"{bundle_path} has bundle format {manifest.get('format')}, expected {BUNDLE_FORMAT}"
+            )
+        namespaces = manifest.get("namespaces") or {}
+
+        for member in bundle.getmembers():
+            if member.name == MANIFEST_NAME:
+                continue
+            path, _, filename = member.name.rpartition("/")
+            parts = path.split("/")
+            parsed = parse_namespace(parts[-1])
+            if (
+                not member.isfile()
+                or not parsed
+                or not ENTRY_PATTERN.match(filename)
+                or any(part in ("", ".", "..") for part in parts)
+                or path not in namespaces
+            ):
+                stats["rejected"].append((member.name, "unexpected path"))
+                continue
+            if parsed["schema_version"] != CACHE_SCHEMA_VERSION or (
+                org_id and parsed["org_id"] != org_id
+            ):
+                stats["skipped"] += 1
+                continue
+
+            content = bundle.extractfile(member).read()
+            reason = _check_entry(content, namespaces[path]["entries"].get(filename))
+            if reason:
+                stats["rejected"].append((member.name, reason))
+                continue
+
+            target = os.path.join(cache_dir, *parts, filename)
+            local = _timestamp(target)
+            if local is not None and local >= load_entry(content)["timestamp"]:
+                stats["kept"] += 1
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(f"{target}.tmp", "wb") as f:
+                f.write(content)
+            os.replace(f"{target}.tmp", target)
+            stats["imported"] += 1
+
+    for name, reason in stats["rejected"]:
+        logger.warning(f"Rejected cache entry {name}: {reason}")
+    return stats
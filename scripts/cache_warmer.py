@@ -0,0 +1,148 @@
+"""
+Priority-ordered cache warm-up
+
+Once the cache TTL has passed, the first build pays for every describe. The
+warmer fetches the object metadata ahead of time, most important objects
+first, so that the build mostly hits the cache:
+
+    1. the core objects, in their documented order
+    2. the other documented objects, ranked by record count (one
+       limits/recordCount call) and by how recently their definition changed
+       (the object dates)
+
+Objects still cached are skipped. Each object is saved to the cache as soon
+as it is fetched, so stopping the warm-up (Ctrl+C, stop(), the API budget
+running out) leaves a partially warm cache that is still used.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from instrumentation import span
+from sf_session import ApiBudget
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+
+
+def record_counts(sf, object_names: List[str]) -> Dict[str, int]:
+    """Record counts of several objects in one call, empty if unavailable"""
+    try:
+        with span("record_counts"):
+            result = sf.restful("limits/recordCount", params={"sObjects": ",".join(object_names)})
+    except Exception as e:
+        logger.warning(f"Failed to get record counts: {str(e)}")
+        return {}
+    return {entry["name"]: entry.get("count", 0) for entry in result.get("sObjects", [])}
+
+
+def _ranks(values: Dict[str, object], names: List[str]) -> Dict[str, int]:
+    """Position of each name when sorted by value, highest first; missing values last"""
+    present = sorted((n for n in names if values.get(n) is not None), key=lambda n: values[n], reverse=True)
+    ranks = {name: i for i, name in enumerate(present)}
+    return {name: ranks.get(name, len(names)) for name in names}
+
+
+class CacheWarmer:
+    """Fetch object metadata into the cache in priority order"""
+
+    def __init__(
+        self,
+        metadata,
+        core_objects: List[str],
+        budget: Optional[ApiBudget] = None,
+        workers: int = DEFAULT_WORKERS,
+    ):
+        """
+        Args:
+            metadata: SalesforceMetadata whose cache is warmed
+            core_objects: Objects warmed first, in this order
+            budget: ApiBudget attached to the connection's session; the
+                warm-up stops once it is used up
+            workers: Objects fetched at the same time
+        """
+        self.metadata = metadata
+        self.core_objects = core_objects
+        self.budget = budget
+        self.workers = workers
+        self._stop = threading.Event()
+        self.stats = {"warmed": 0, "cached": 0, "failed": 0, "not_started": 0}
+
+    def plan(self) -> List[str]:
+        """Objects in warm-up order"""
+        others = [
+            name
+            for name in self.metadata.get_custom_object_names()
+            if name not in self.core_objects
+        ]
+        counts = record_counts(self.metadata.sf, others)
+        modified = {
+            name: (dates or {}).get("modified")
+            for name, dates in self.metadata.get_object_dates().items()
+        }
+        by_count, by_modified = _ranks(counts, others), _ranks(modified, others)
+        # Equal weight for both rankings, ties broken by name
+        others.sort(key=lambda name: (by_count[name] + by_modified[name], name))
+        return list(self.core_objects) + others
+
+    def _is_cached(self, object_name: str) -> bool:
+        return self.metadata.cache.load(f"object_metadata_{object_name}.pkl") is not None
+
+    def _warm(self, object_name: str) -> str:
+        if self._stop.is_set() or (self.budget and self.budget.exhausted):
+            return "not_started"
+        if self._is_cached(object_name):
+            return "cached"
+        refused = self.budget.refused if self.budget else 0
+        with span("warm", object=object_name):
+            metadata = self.metadata.get_object_metadata(object_name)
+        if self.budget and self.budget.refused > refused:
+            # The budget ran out while the object was fetched; its record
+            # count or validation rules may be missing, so it is not kept
+            self.metadata.cache.invalidate(f"object_metadata_{object_name}.pkl")
+            return "not_started"
+        return "warmed" if metadata else "failed"
+
+    def stop(self):
+        """Let running fetches finish and start no new ones"""
+        self._stop.set()
+
+    def run(self) -> Dict[str, int]:
+        """
+        Warm the cache until every object is cached, stop() is called or the budget is used up
+
+        Returns:
+            Number of objects warmed, already cached, failed and not started
+        """
+        try:
+            objects = self.plan()
+        except KeyboardInterrupt:
+            print("Warm-up interrupted before it started")
+            return self.stats
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # Submitted in priority order; the pool starts them in that order
+            futures = [executor.submit(self._warm, name) for name in objects]
+            try:
+                for future in futures:
+                    future.result()
+            except KeyboardInterrupt:
+                # Stopped before leaving the with block, whose shutdown would
+                # otherwise wait for every queued object to be fetched
+                self.stop()
+                for future in futures:
+                    future.cancel()
+                print("Warm-up interrupted, objects fetched so far stay cached")
+        for future in futures:
+            self.stats["not_started" if future.cancelled() else future.result()] += 1
+        if self.budget and self.budget.exhausted:
+            print(f"Warm-up stopped after the API budget of {self.budget.max_calls} requests")
+        return self.stats
+
+    def start(self) -> threading.Thread:
+        """Run the warm-up on a background thread"""
+        thread = threading.Thread(target=self.run, name="cache-warmer", daemon=True)
+        thread.start()
+        return thread
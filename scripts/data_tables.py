@@ -0,0 +1,166 @@
+"""
+Large tables as JSON data files
+
+In the "json" table mode a generator writes the rows of a large table (the
+data dictionary, field usage, ...) as compact JSON next to the page and puts
+a placeholder element in the markdown instead of the table.
+docs/assets/javascripts/data_tables.js turns the placeholder into a
+virtualized table with sorting, filtering and paging, and only fetches the
+data when the table scrolls into view.
+
+Data file layout:
+    {"columns": [{"name": str, "type": "text" | "number"}, ...],
+     "rows": [[value, ...], ...]}
+"""
+
+import html
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from output_writer import get_writer
+
+TABLE_MODES = ("markdown", "json")
+
+# Rows rendered per page of the client-side table
+DEFAULT_PAGE_SIZE = 200
+
+Column = Tuple[str, str, Callable[[Dict, Dict], Any]]
+
+
+def _field_name(field: Dict) -> str:
+    # Raw describe fields use "name", normalized object metadata "api_name"
+    return field.get("name") or field.get("api_name") or ""
+
+
+def _required(field: Dict) -> bool:
+    if "nillable" in field:
+        return not field["nillable"]
+    return bool(field.get("required"))
+
+
+def _yes_no(value: Any) -> str:
+    return "Yes" if value else "No"
+
+
+# (header, type, value(object, field))
+FIELD_COLUMNS: List[Column] = [
+    ("Object", "text", lambda obj, field: obj.get("api_name")),
+    ("Field API Name", "text", lambda obj, field: _field_name(field)),
+    ("Label", "text", lambda obj, field: field.get("label")),
+    ("Type", "text", lambda obj, field: field.get("type")),
+    ("Required", "text", lambda obj, field: _yes_no(_required(field))),
+    ("Unique", "text", lambda obj, field: _yes_no(field.get("unique"))),
+    ("External ID", "text", lambda obj, field: _yes_no(field.get("externalId"))),
+    ("Help Text", "text", lambda obj, field: field.get("inlineHelpText") or ""),
+    ("Description", "text", lambda obj, field: field.get("description") or ""),
+]
+
+FIELD_USAGE_COLUMNS: List[Column] = [
+    ("Object", "text", lambda obj, usage: obj.get("api_name")),
+    ("Field API Name", "text", lambda obj, usage: usage[0]),
+    ("Usage %", "number", lambda obj, usage: round(usage[1], 2)),
+]
+
+
+def field_rows(objects: Sequence[Dict], custom: Optional[bool] = None) -> List[List[Any]]:
+    """
+    Data dictionary rows for the fields of many objects
+
+    Args:
+        objects: Object metadata with a fields list
+        custom: Only custom (True) or standard (False) fields, None for all
+
+    Returns:
+        List of rows in FIELD_COLUMNS order
+    """
+    rows = []
+    for obj in objects:
+        for field in obj.get("fields") or []:
+            if custom is not None and _field_name(field).endswith("__c") != custom:
+                continue
+            rows.append([value(obj, field) for _, _, value in FIELD_COLUMNS])
+    return rows
+
+
+def field_usage_rows(objects: Sequence[Dict]) -> List[List[Any]]:
+    """Field usage rows in FIELD_USAGE_COLUMNS order"""
+    return [
+        [value(obj, usage) for _, _, value in FIELD_USAGE_COLUMNS]
+        for obj in objects
+        for usage in (obj.get("field_usage") or {}).items()
+    ]
+
+
+def write_table(
+    page_path: str,
+    table_id: str,
+    columns: Sequence[Column],
+    rows: List[List[Any]],
+    docs_dir: str = "docs",
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> str:
+    """
+    Write table rows next to a page and return the placeholder for the page
+
+    Args:
+        page_path: Markdown page the table belongs to
+        table_id: Name of the table, unique within the page
+        columns: Column definitions (header, type, value function)
+        rows: Table rows
+        docs_dir: MkDocs docs_dir, data paths are stored relative to it
+        page_size: Rows per page in the client-side table
+
+    Returns:
+        HTML placeholder to put in the markdown instead of the table
+    """
+    stem = os.path.splitext(page_path)[0]
+    data_path = f"{stem}.{table_id}.json"
+    data = {
+        "columns": [{"name": name, "type": kind} for name, kind, _ in columns],
+        "rows": rows,
+    }
+    get_writer().write(data_path, json.dumps(data, separators=(",", ":"), default=str))
+
+    # Resolved by the script against the site root, so it works with and
+    # without use_directory_urls
+    src = os.path.relpath(data_path, docs_dir).replace(os.sep, "/")
+    return (
+        f'<div class="sf-data-table" data-src="{html.escape(src)}" '
+        f'data-page-size="{page_size}">\n'
+        f"<noscript>{len(rows)} rows, see <code>{html.escape(src)}</code></noscript>\n"
+        "</div>\n"
+    )
+
+
+# Tables templates can request with data_table(name)
+TABLES: Dict[str, Tuple[List[Column], Callable[[Sequence[Dict]], List[List[Any]]]]] = {
+    "standard_fields": (FIELD_COLUMNS, lambda objects: field_rows(objects, custom=False)),
+    "custom_fields": (FIELD_COLUMNS, lambda objects: field_rows(objects, custom=True)),
+    "fields": (FIELD_COLUMNS, field_rows),
+    "field_usage": (FIELD_USAGE_COLUMNS, field_usage_rows),
+}
+
+
+def table_function(
+    page_path: str, objects: Sequence[Dict], docs_dir: str = "docs"
+) -> Callable[[str], str]:
+    """
+    Build the data_table(name) template function for one page
+
+    Only the tables a template actually calls for are written.
+
+    Args:
+        page_path: Markdown page being rendered
+        objects: Object metadata passed to the template
+        docs_dir: MkDocs docs_dir
+
+    Returns:
+        Function returning the placeholder for a table in TABLES
+    """
+
+    def data_table(name: str) -> str:
+        columns, rows = TABLES[name]
+        return write_table(page_path, name.replace("_", "-"), columns, rows(objects), docs_dir)
+
+    return data_table
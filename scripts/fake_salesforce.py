@@ -0,0 +1,1194 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Salesforce REST, Tooling and Metadata API endpoints.
+
+The server generates a synthetic org (standard and custom objects, fields,
+record types, validation rules, layouts, profiles, permission sets, flows,
+roles and territories) and answers the describe, SOQL, Tooling and Metadata API requests made by the
+documentation generators. Latency and rate limits are configurable so the
+generators can be exercised under realistic conditions without API access.
+
+Usage:
+    python fake_salesforce.py --port 8765 --objects 50 --latency-ms 40
+"""
+
+import argparse
+import base64
+import io
+import json
+import logging
+import random
+import re
+import threading
+import time
+import zipfile
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.etree import ElementTree as ET
+from xml.sax.saxutils import escape
+
+from requests.adapters import HTTPAdapter
+
+from instrumentation import classify_endpoint
+
+logger = logging.getLogger(__name__)
+
+API_VERSION = "57.0"
+QUERY_BATCH_SIZE = 2000
+
+FIELD_TYPES = [
+    "string",
+    "picklist",
+    "boolean",
+    "date",
+    "datetime",
+    "double",
+    "currency",
+    "email",
+    "phone",
+    "url",
+    "textarea",
+    "reference",
+]
+
+STANDARD_OBJECT_NAMES = [
+    "Account",
+    "Contact",
+    "Lead",
+    "Opportunity",
+    "Campaign",
+    "Case",
+    "Product2",
+    "User",
+]
+
+PROFILE_NAMES = [
+    "Admin",
+    "Standard User",
+    "Read Only",
+    "Marketing User",
+    "Contract Manager",
+    "Solution Manager",
+]
+
+USER_PERMISSIONS = [
+    "ApiEnabled",
+    "ModifyAllData",
+    "ViewAllData",
+    "ManageUsers",
+    "RunReports",
+    "ExportReport",
+]
+
+METADATA_NS = "http://soap.sforce.com/2006/04/metadata"
+SOAP_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+
+# Folder and file suffix of each metadata type in a retrieve zip
+ZIP_LAYOUT = {
+    "Flow": ("flows", ".flow"),
+    "Layout": ("layouts", ".layout"),
+    "PermissionSet": ("permissionsets", ".permissionset"),
+    "Profile": ("profiles", ".profile"),
+}
+
+
+# Object keys that are not part of a describe result
+ORG_ONLY_KEYS = ("record_count", "durable_id", "created_date", "modified_date", "unfilterable")
+
+
+class FakeQueryError(Exception):
+    """A query the org rejects, answered with HTTP 400"""
+
+    def __init__(self, error_code, message):
+        super().__init__(message)
+        self.error_code = error_code
+
+
+class FakeOrg:
+    """Deterministic synthetic org metadata"""
+
+    def __init__(
+        self,
+        standard_objects=8,
+        custom_objects=8,
+        fields_per_object=40,
+        records_per_object=5000,
+        record_types_per_object=2,
+        validation_rules_per_object=3,
+        profiles=4,
+        permission_sets=4,
+        flows=6,
+        roles=30,
+        territories=20,
+        apex_classes=40,
+        apex_triggers=10,
+        unfilterable_fields=0,
+        seed=0,
+    ):
+        """
+        Build the synthetic org
+
+        Args:
+            standard_objects (int): Number of standard objects to generate
+            custom_objects (int): Number of custom objects to generate
+            fields_per_object (int): Number of fields on every object
+            records_per_object (int): Upper bound for per-object record counts
+            record_types_per_object (int): Record types on every object
+            validation_rules_per_object (int): Validation rules on every object
+            profiles (int): Number of profiles
+            permission_sets (int): Number of permission sets
+            flows (int): Number of record-triggered flows
+            roles (int): Number of roles, three children per role
+            territories (int): Number of territories, 0 disables territories
+            apex_classes (int): Number of Apex classes, every fourth a test class
+            apex_triggers (int): Number of Apex triggers
+            unfilterable_fields (int): Fields per object that describe as
+                filterable but are rejected in WHERE clauses
+            seed (int): Seed for the random generator
+        """
+        self.random = random.Random(seed)
+        self.objects = {}
+
+        names = list(STANDARD_OBJECT_NAMES[:standard_objects])
+        names += [
+            f"Standard{i}" for i in range(len(names), standard_objects)
+        ]
+        for name in names:
+            self.objects[name] = self._make_object(
+                name, False, fields_per_object, records_per_object
+            )
+        for i in range(custom_objects):
+            name = f"Custom{i}__c"
+            self.objects[name] = self._make_object(
+                name, True, fields_per_object, records_per_object
+            )
+
+        self.record_types_per_object = record_types_per_object
+        self.validation_rules_per_object = validation_rules_per_object
+        self.profiles = list(PROFILE_NAMES[:profiles])
+        self.profiles += [f"Profile {i}" for i in range(len(self.profiles), profiles)]
+        self.permission_sets = [f"Permission_Set_{i}" for i in range(permission_sets)]
+        self.flows = [f"Flow_{i}" for i in range(flows)]
+        self.roles = self._make_tree("00E", "Role", roles)
+        self.territories = self._make_tree("0MI", "Territory", territories)
+        self.apex_classes = [self._make_apex_class(i) for i in range(apex_classes)]
+        self.audit_trail = []
+        self.apex_triggers = [
+            self._make_apex_trigger(i, list(self.objects)[i % len(self.objects)])
+            for i in range(apex_triggers)
+        ]
+        # Own generator, so the rest of the org stays the same
+        hidden = random.Random(seed + 1)
+        for obj in self.objects.values():
+            candidates = [f["name"] for f in obj["fields"][1:] if f["filterable"]]
+            obj["unfilterable"] = set(
+                hidden.sample(candidates, min(unfilterable_fields, len(candidates)))
+            )
+
+    def record_setup_change(self, section, action, display, created_date=None):
+        """Append a SetupAuditTrail row, as an admin change in Setup would"""
+        created_date = created_date or datetime.now(timezone.utc).strftime(
+            "%Y-%m-%dT%H:%M:%S.000+0000"
+        )
+        self.audit_trail.append(
+            {
+                "attributes": {"type": "SetupAuditTrail"},
+                "Id": f"0Ym{len(self.audit_trail):015d}",
+                "Action": action,
+                "Section": section,
+                "Display": display,
+                "CreatedDate": created_date,
+                "CreatedBy": {"Username": "admin@example.com"},
+            }
+        )
+
+    def _make_apex_class(self, i):
+        is_test = i % 4 == 3
+        name = f"Class{i}Test" if is_test else f"Class{i}"
+        if is_test:
+            methods = "".join(f"    @isTest static void test{m}() {{}}\n" for m in range(i % 5))
+            body = f"@isTest\nprivate class {name} {{\n{methods}}}\n"
+        else:
+            body = f"public with sharing class {name} {{\n    public void run() {{}}\n}}\n"
+        lines = self.random.randint(10, 400)
+        return {
+            "Id": f"01p{i:015d}",
+            "Name": name,
+            "NamespacePrefix": None,
+            "ApiVersion": 58.0,
+            "Status": "Active",
+            "IsValid": True,
+            "LengthWithoutComments": len(body),
+            "LastModifiedDate": "2024-01-15T10:30:00.000+0000",
+            "Body": body,
+            "Covered": 0 if is_test else self.random.randint(0, lines),
+            "Lines": 0 if is_test else lines,
+        }
+
+    def _make_apex_trigger(self, i, object_name):
+        lines = self.random.randint(5, 80)
+        record = {
+            "Id": f"01q{i:015d}",
+            "Name": f"{object_name.replace('__c', '')}Trigger{i}",
+            "NamespacePrefix": None,
+            "TableEnumOrId": object_name,
+            "ApiVersion": 58.0,
+            "Status": "Active" if i % 5 else "Inactive",
+            "IsValid": True,
+            "LengthWithoutComments": 200,
+            "LastModifiedDate": "2024-01-15T10:30:00.000+0000",
+            "Covered": self.random.randint(0, lines),
+            "Lines": lines,
+        }
+        for event in ("BeforeInsert", "AfterInsert", "BeforeUpdate", "AfterUpdate",
+                      "BeforeDelete", "AfterDelete", "AfterUndelete"):
+            record[f"Usage{event}"] = self.random.random() < 0.4
+        return record
+
+    def _make_tree(self, prefix, kind, count):
+        """Nodes of a hierarchy with three children per node"""
+        return [
+            {
+                "Id": f"{prefix}{i:015d}",
+                "Name": f"{kind} {i}",
+                "DeveloperName": f"{kind}_{i}",
+                "ParentId": f"{prefix}{(i - 1) // 3:015d}" if i else None,
+                "Users": self.random.randint(0, 25) if i else 1,
+            }
+            for i in range(count)
+        ]
+
+    def _make_object(self, name, custom, field_count, max_records):
+        object_names = list(self.objects) or [name]
+        fields = [
+            {
+                "name": "Id",
+                "label": "Record ID",
+                "type": "id",
+                "nillable": False,
+                "unique": True,
+                "externalId": False,
+                "filterable": True,
+                "aggregatable": True,
+                "referenceTo": [],
+                "relationshipName": None,
+                "picklistValues": [],
+            }
+        ]
+        for i in range(field_count - 1):
+            field_type = self.random.choice(FIELD_TYPES)
+            field_name = f"Field{i}__c" if custom or i % 3 == 0 else f"Field{i}"
+            field = {
+                "name": field_name,
+                "label": f"Field {i}",
+                "type": field_type,
+                "nillable": self.random.random() > 0.2,
+                "unique": False,
+                "externalId": False,
+                "filterable": field_type != "textarea",
+                "aggregatable": field_type != "textarea",
+                "description": f"Synthetic {field_type} field",
+                "inlineHelpText": None,
+                "referenceTo": [],
+                "relationshipName": None,
+                "picklistValues": [],
+            }
+            if field_type == "reference":
+                field["referenceTo"] = [self.random.choice(object_names)]
+                field["relationshipName"] = field_name.replace("__c", "__r")
+            elif field_type == "picklist":
+                field["picklistValues"] = [
+                    {"value": f"Value {v}", "label": f"Value {v}", "active": True}
+                    for v in range(self.random.randint(2, 12))
+                ]
+            fields.append(field)
+
+        return {
+            "name": name,
+            "label": name.replace("__c", "").replace("_", " "),
+            "labelPlural": name.replace("__c", "") + "s",
+            "custom": custom,
+            "queryable": True,
+            "searchable": True,
+            "deletable": True,
+            "feedEnabled": False,
+            "sharingModel": "ReadWrite",
+            "fields": fields,
+            "childRelationships": [],
+            "record_count": self.random.randint(0, max_records),
+            "durable_id": f"01I{len(self.objects):015d}" if custom else name,
+            "created_date": f"2021-{len(self.objects) % 12 + 1:02d}-01T09:00:00.000+0000",
+            "modified_date": f"2024-{len(self.objects) % 12 + 1:02d}-15T10:30:00.000+0000",
+        }
+
+    def describe_global(self):
+        return {
+            "encoding": "UTF-8",
+            "maxBatchSize": 200,
+            "sobjects": [
+                {
+                    "name": obj["name"],
+                    "label": obj["label"],
+                    "custom": obj["custom"],
+                    "queryable": obj["queryable"],
+                }
+                for obj in self.objects.values()
+            ],
+        }
+
+    def describe(self, object_name):
+        obj = self.objects.get(object_name)
+        if obj is None:
+            return None
+        describe = {k: v for k, v in obj.items() if k not in ORG_ONLY_KEYS}
+        describe["childRelationships"] = [
+            {
+                "childSObject": child["name"],
+                "field": field["name"],
+                "relationshipName": field["relationshipName"],
+            }
+            for child in self.objects.values()
+            for field in child["fields"]
+            if object_name in field.get("referenceTo", [])
+        ]
+        return describe
+
+    def query(self, soql):
+        """
+        Answer the subset of SOQL used by the generators
+
+        Args:
+            soql (str): SOQL query text
+
+        Returns:
+            tuple: (totalSize, list of records) or None for unknown objects
+        """
+        match = re.search(r"\bFROM\s+(\w+)", soql, re.IGNORECASE)
+        if not match:
+            return None
+        object_name = match.group(1)
+
+        if object_name == "RecordType":
+            target = re.search(r"SObjectType\s*=\s*'(\w+)'", soql)
+            if not target or target.group(1) not in self.objects:
+                return 0, []
+            records = [
+                {
+                    "attributes": {"type": "RecordType"},
+                    "Id": f"012{i:015d}",
+                    "Name": f"{target.group(1)} Type {i}",
+                    "DeveloperName": f"{target.group(1)}_Type_{i}",
+                    "Description": None,
+                    "IsActive": i % 2 == 0,
+                }
+                for i in range(self.record_types_per_object)
+            ]
+            return len(records), records
+
+        if object_name == "SetupAuditTrail":
+            since = re.search(r"CreatedDate\s*>=?\s*(\S+)", soql)
+            records = [
+                row
+                for row in self.audit_trail
+                if not since or row["CreatedDate"][:19] >= since.group(1)[:19]
+            ]
+            return len(records), records
+
+        if object_name in ("UserRole", "Territory2"):
+            if object_name == "Territory2" and not self.territories:
+                return None
+            parent_key = "ParentRoleId" if object_name == "UserRole" else "ParentTerritory2Id"
+            nodes = self.roles if object_name == "UserRole" else self.territories
+            records = [
+                {
+                    "attributes": {"type": object_name},
+                    "Id": node["Id"],
+                    "Name": node["Name"],
+                    "DeveloperName": node["DeveloperName"],
+                    parent_key: node["ParentId"],
+                }
+                for node in nodes
+            ]
+            return len(records), records
+
+        group_by = re.search(r"GROUP BY\s+(\w+)", soql, re.IGNORECASE)
+        if group_by and group_by.group(1) in ("UserRoleId", "Territory2Id"):
+            if object_name == "UserTerritory2Association" and not self.territories:
+                return None
+            nodes = self.roles if group_by.group(1) == "UserRoleId" else self.territories
+            records = [
+                {"attributes": {"type": "AggregateResult"}, group_by.group(1): node["Id"], "total": node["Users"]}
+                for node in nodes
+                if node["Users"]
+            ]
+            return len(records), records
+
+        if object_name in ("PermissionSet", "ObjectPermissions", "FieldPermissions"):
+            records = self.permission_records(object_name)
+            return len(records), records
+
+        obj = self.objects.get(object_name)
+        if obj is None:
+            return None
+
+        if re.search(r"SELECT\s+COUNT\(\)", soql, re.IGNORECASE):
+            filtered = set(re.findall(r"(\w+)\s*!=\s*null", soql, re.IGNORECASE))
+            for field in obj["fields"]:
+                if field["name"] in filtered and (
+                    not field["filterable"] or field["name"] in obj["unfilterable"]
+                ):
+                    raise FakeQueryError(
+                        "INVALID_FIELD",
+                        f"field '{field['name']}' can not be filtered in a query call",
+                    )
+            total = obj["record_count"]
+            if " WHERE " in soql.upper():
+                total = int(total * 0.6)
+            return total, []
+
+        if "LastModifiedDate" in soql and "LIMIT 1" in soql.upper():
+            if not obj["record_count"]:
+                return 0, []
+            record = {
+                "attributes": {"type": object_name},
+                "LastModifiedDate": "2024-01-15T10:30:00.000+0000",
+            }
+            return 1, [record]
+
+        return 0, []
+
+    def tooling_query(self, soql):
+        match = re.search(r"\bFROM\s+(\w+)", soql, re.IGNORECASE)
+        if match and match.group(1) == "EntityDefinition":
+            records = [
+                {
+                    "attributes": {"type": "EntityDefinition"},
+                    "DurableId": obj["durable_id"],
+                    "QualifiedApiName": obj["name"],
+                    "LastModifiedDate": obj["modified_date"],
+                }
+                for obj in self.objects.values()
+            ]
+            return len(records), records
+        if match and match.group(1) == "CustomObject":
+            records = [
+                {
+                    "attributes": {"type": "CustomObject"},
+                    "Id": obj["durable_id"],
+                    "CreatedDate": obj["created_date"],
+                    "LastModifiedDate": obj["modified_date"],
+                }
+                for obj in self.objects.values()
+                if obj["custom"]
+            ]
+            return len(records), records
+        if match and match.group(1) in ("ApexClass", "ApexTrigger"):
+            components = self.apex_classes if match.group(1) == "ApexClass" else self.apex_triggers
+            ids = re.search(r"\bId\s+IN\s*\(([^)]*)\)", soql, re.IGNORECASE)
+            if ids:
+                wanted = set(re.findall(r"'(\w+)'", ids.group(1)))
+                components = [c for c in components if c["Id"] in wanted]
+            selected = re.search(r"SELECT\s+(.*?)\s+FROM", soql, re.IGNORECASE | re.DOTALL)
+            columns = [c.strip() for c in selected.group(1).split(",")]
+            records = [
+                dict(
+                    {"attributes": {"type": match.group(1)}},
+                    **{column: c.get(column) for column in columns},
+                )
+                for c in components
+            ]
+            return len(records), records
+        if match and match.group(1) == "ApexCodeCoverageAggregate":
+            records = [
+                {
+                    "attributes": {"type": "ApexCodeCoverageAggregate"},
+                    "ApexClassOrTriggerId": c["Id"],
+                    "NumLinesCovered": c["Covered"],
+                    "NumLinesUncovered": c["Lines"] - c["Covered"],
+                }
+                for c in self.apex_classes + self.apex_triggers
+                if c["Lines"]
+            ]
+            return len(records), records
+        if not match or match.group(1) != "ValidationRule":
+            return 0, []
+        target = re.search(r"QualifiedApiName\s*=\s*'(\w+)'", soql)
+        if not target or target.group(1) not in self.objects:
+            return 0, []
+        records = [
+            {
+                "attributes": {"type": "ValidationRule"},
+                "Id": f"03d{i:015d}",
+                "ValidationName": f"{target.group(1)}_Rule_{i}",
+                "Active": i % 3 != 0,
+                "Description": f"Synthetic rule {i}",
+                "ErrorDisplayField": f"Field{i}",
+                "ErrorMessage": f"Field {i} is invalid",
+            }
+            for i in range(self.validation_rules_per_object)
+        ]
+        return len(records), records
+
+
+    def metadata_names(self, metadata_type):
+        """Full names of the Metadata API components of a type"""
+        if metadata_type == "Layout":
+            return [f"{name}-{obj['label']} Layout" for name, obj in self.objects.items()]
+        if metadata_type == "Profile":
+            return list(self.profiles)
+        if metadata_type == "PermissionSet":
+            return list(self.permission_sets)
+        if metadata_type == "Flow":
+            return list(self.flows)
+        return []
+
+    def _object_permissions(self, index, objects):
+        return [
+            {
+                "object": name,
+                "allowRead": True,
+                "allowCreate": index % 3 != 2,
+                "allowEdit": index % 3 != 2,
+                "allowDelete": index == 0,
+                "viewAllRecords": index == 0,
+                "modifyAllRecords": index == 0,
+            }
+            for name in objects
+        ]
+
+    def _field_permissions(self, index, objects):
+        return [
+            {
+                "field": f"{name}.{field['name']}",
+                "readable": True,
+                "editable": (index + i) % 3 != 2,
+            }
+            for name in objects
+            for i, field in enumerate(self.objects[name]["fields"][1:])
+        ]
+
+    def _user_permissions(self, index):
+        return [
+            {"name": permission, "enabled": True}
+            for i, permission in enumerate(USER_PERMISSIONS)
+            if index == 0 or (i + index) % 3 == 0
+        ]
+
+    def _permission_parents(self):
+        """(Id, permission set component, owning profile or None)"""
+        parents = [
+            (f"0PS{i:015d}", self.read_metadata("Profile", name), name)
+            for i, name in enumerate(self.profiles)
+        ]
+        parents += [
+            (f"0PS{len(parents) + i:015d}", self.read_metadata("PermissionSet", name), None)
+            for i, name in enumerate(self.permission_sets)
+        ]
+        return parents
+
+    def permission_records(self, object_name):
+        """PermissionSet, ObjectPermissions or FieldPermissions rows"""
+        records = []
+        for parent_id, component, profile in self._permission_parents():
+            if object_name == "PermissionSet":
+                enabled = {p["name"] for p in component["userPermissions"]}
+                record = {
+                    "attributes": {"type": "PermissionSet"},
+                    "Id": parent_id,
+                    "Name": component["fullName"].replace(" ", "_"),
+                    "Label": component.get("label", component["fullName"]),
+                    "Description": component.get("description"),
+                    "IsOwnedByProfile": profile is not None,
+                    "Profile": {"Name": profile} if profile else None,
+                }
+                for permission in USER_PERMISSIONS:
+                    record[f"Permissions{permission}"] = permission in enabled
+                records.append(record)
+            elif object_name == "ObjectPermissions":
+                for permission in component["objectPermissions"]:
+                    records.append(
+                        {
+                            "attributes": {"type": "ObjectPermissions"},
+                            "ParentId": parent_id,
+                            "SobjectType": permission["object"],
+                            "PermissionsCreate": permission["allowCreate"],
+                            "PermissionsRead": permission["allowRead"],
+                            "PermissionsEdit": permission["allowEdit"],
+                            "PermissionsDelete": permission["allowDelete"],
+                            "PermissionsViewAllRecords": permission["viewAllRecords"],
+                            "PermissionsModifyAllRecords": permission["modifyAllRecords"],
+                        }
+                    )
+            else:
+                for permission in component["fieldPermissions"]:
+                    records.append(
+                        {
+                            "attributes": {"type": "FieldPermissions"},
+                            "ParentId": parent_id,
+                            "SobjectType": permission["field"].split(".", 1)[0],
+                            "Field": permission["field"],
+                            "PermissionsRead": permission["readable"],
+                            "PermissionsEdit": permission["editable"],
+                        }
+                    )
+        return records
+
+    def read_metadata(self, metadata_type, full_name):
+        """
+        Contents of one Metadata API component
+
+        Args:
+            metadata_type (str): Metadata type (Layout, Profile, ...)
+            full_name (str): Component full name
+
+        Returns:
+            dict: Component as nested dicts and lists, None if it does not exist
+        """
+        if full_name not in self.metadata_names(metadata_type):
+            return None
+        names = list(self.objects)
+
+        if metadata_type == "Layout":
+            obj = self.objects[full_name.split("-", 1)[0]]
+            fields = [field["name"] for field in obj["fields"][1:]]
+            half = len(fields) // 2
+            return {
+                "fullName": full_name,
+                "layoutSections": [
+                    {
+                        "label": "Information",
+                        "style": "TwoColumnsTopToBottom",
+                        "layoutColumns": [
+                            {
+                                "layoutItems": [
+                                    {"behavior": "Edit", "field": name}
+                                    for name in column
+                                ]
+                            }
+                            for column in (fields[:half], fields[half:])
+                        ],
+                    },
+                    {
+                        "label": "System Information",
+                        "style": "OneColumn",
+                        "layoutColumns": [
+                            {
+                                "layoutItems": [
+                                    {"behavior": "Readonly", "field": "CreatedById"},
+                                    {"behavior": "Readonly", "field": "LastModifiedById"},
+                                ]
+                            }
+                        ],
+                    },
+                ],
+                "relatedLists": [
+                    {"relatedList": f"RelatedHistoryList{i}"} for i in range(2)
+                ],
+            }
+
+        if metadata_type == "Profile":
+            index = self.profiles.index(full_name)
+            return {
+                "fullName": full_name,
+                "custom": index >= len(PROFILE_NAMES) // 2,
+                "userLicense": "Salesforce",
+                "objectPermissions": self._object_permissions(index, names),
+                "fieldPermissions": self._field_permissions(index, names),
+                "userPermissions": self._user_permissions(index),
+                "layoutAssignments": [
+                    {"layout": layout} for layout in self.metadata_names("Layout")
+                ],
+            }
+
+        if metadata_type == "PermissionSet":
+            index = self.permission_sets.index(full_name)
+            objects = names[index % len(names) :][:3]
+            return {
+                "fullName": full_name,
+                "label": full_name.replace("_", " "),
+                "description": f"Synthetic permission set {index}",
+                "hasActivationRequired": False,
+                "objectPermissions": self._object_permissions(index + 1, objects),
+                "fieldPermissions": self._field_permissions(index + 1, objects),
+                "userPermissions": self._user_permissions(index + 1),
+            }
+
+        index = self.flows.index(full_name)
+        target = names[index % len(names)]
+        return {
+            "fullName": full_name,
+            "label": full_name.replace("_", " "),
+            "description": f"Synthetic record-triggered flow on {target}",
+            "processType": "AutoLaunchedFlow",
+            "status": "Active" if index % 4 else "Draft",
+            "start": {
+                "object": target,
+                "recordTriggerType": ("Create", "Update", "CreateAndUpdate")[index % 3],
+                "triggerType": "RecordAfterSave" if index % 2 else "RecordBeforeSave",
+            },
+            "decisions": [{"name": f"Check_{i}", "label": f"Check {i}"} for i in range(index % 3)],
+            "recordLookups": [{"name": "Get_Owner", "object": "User"}] if index % 2 else [],
+            "recordUpdates": [{"name": f"Update_{target}", "object": target}],
+        }
+
+
+def metadata_xml(tag, value):
+    """Serialize a component dict the way the Metadata API does"""
+    if isinstance(value, list):
+        return "".join(metadata_xml(tag, item) for item in value)
+    if isinstance(value, dict):
+        inner = "".join(metadata_xml(key, item) for key, item in value.items())
+        return f"<{tag}>{inner}</{tag}>"
+    if isinstance(value, bool):
+        value = "true" if value else "false"
+    return f"<{tag}>{escape(str(value))}</{tag}>"
+
+
+def soap_envelope(body):
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<soapenv:Envelope xmlns:soapenv="{SOAP_NS}" xmlns="{METADATA_NS}" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+        f"<soapenv:Body>{body}</soapenv:Body></soapenv:Envelope>"
+    )
+
+
+class _RateLimiter:
+    """Token bucket shared by all request handler threads"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.rate, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class _FakeSalesforceHandler(BaseHTTPRequestHandler):
+    server_version = "FakeSalesforce/1.0"
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def _admit(self, endpoint):
+        """Count the call and apply rate limit and latency; False if rejected"""
+        server = self.server
+        with server.stats_lock:
+            server.calls[endpoint] += 1
+            server.api_usage += 1
+
+        if not server.limiter.acquire():
+            with server.stats_lock:
+                server.rejected += 1
+            self._send_json(
+                403,
+                [
+                    {
+                        "errorCode": "REQUEST_LIMIT_EXCEEDED",
+                        "message": "TotalRequests Limit exceeded.",
+                    }
+                ],
+            )
+            return False
+
+        if server.latency:
+            time.sleep(
+                max(0.0, server.latency + server.random.uniform(-1, 1) * server.jitter)
+            )
+        return True
+
+    def do_GET(self):
+        server = self.server
+        endpoint = classify_endpoint(self.path)
+        if not self._admit(endpoint):
+            return
+
+        parsed = urlparse(self.path)
+        params = parse_qs(parsed.query)
+
+        if endpoint == "describe_global":
+            self._send_json(200, server.org.describe_global())
+        elif endpoint == "describe":
+            object_name = parsed.path.rstrip("/").split("/")[-2]
+            describe = server.org.describe(object_name)
+            if describe is None:
+                self._send_not_found(object_name)
+            else:
+                self._send_json(200, describe)
+        elif endpoint in ("query", "tooling_query"):
+            soql = params.get("q", [""])[0]
+            try:
+                if endpoint == "query":
+                    result = server.org.query(soql)
+                else:
+                    result = server.org.tooling_query(soql)
+            except FakeQueryError as e:
+                self._send_json(400, [{"errorCode": e.error_code, "message": str(e)}])
+                return
+            if result is None:
+                self._send_json(
+                    400,
+                    [{"errorCode": "INVALID_TYPE", "message": f"Unsupported: {soql}"}],
+                )
+                return
+            self._send_query_page(*result, offset=0)
+        elif endpoint == "query_more":
+            locator, _, offset = parsed.path.rsplit("/", 1)[-1].partition("-")
+            with server.stats_lock:
+                pending = server.cursors.get(locator)
+            if pending is None:
+                self._send_json(
+                    400,
+                    [{"errorCode": "INVALID_QUERY_LOCATOR", "message": locator}],
+                )
+                return
+            self._send_query_page(len(pending), pending, int(offset), locator)
+        elif endpoint == "limits":
+            self._send_json(
+                200,
+                {
+                    "DailyApiRequests": {
+                        "Max": server.daily_limit,
+                        "Remaining": max(0, server.daily_limit - server.api_usage),
+                    }
+                },
+            )
+        elif endpoint == "record_count":
+            params = parse_qs(parsed.query)
+            wanted = set(",".join(params.get("sObjects", [])).split(",")) - {""}
+            objects = server.org.objects
+            self._send_json(
+                200,
+                {
+                    "sObjects": [
+                        {"name": name, "count": objects[name]["record_count"]}
+                        for name in sorted(objects)
+                        if not wanted or name in wanted
+                    ]
+                },
+            )
+        else:
+            self._send_not_found(parsed.path)
+
+    def do_POST(self):
+        endpoint = classify_endpoint(self.path)
+        if endpoint != "metadata":
+            self._send_not_found(self.path)
+            return
+        if not self._admit(endpoint):
+            return
+
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        request = ET.fromstring(body).find(f"{{{SOAP_NS}}}Body")[0]
+        action = request.tag.rsplit("}", 1)[-1]
+        handler = getattr(self, f"_metadata_{action}", None)
+        if handler is None:
+            self._send_soap(
+                500,
+                "<soapenv:Fault><faultcode>sf:INVALID_OPERATION</faultcode>"
+                f"<faultstring>Unsupported operation {action}</faultstring></soapenv:Fault>",
+            )
+            return
+        self._send_soap(200, handler(request))
+
+    def _metadata_listMetadata(self, request):
+        org = self.server.org
+        results = []
+        for query in request.iter(f"{{{METADATA_NS}}}queries"):
+            metadata_type = query.findtext(f"{{{METADATA_NS}}}type")
+            folder, suffix = ZIP_LAYOUT.get(metadata_type, ("", ""))
+            for name in org.metadata_names(metadata_type):
+                results.append(
+                    metadata_xml(
+                        "result",
+                        {
+                            "fileName": f"{folder}/{name}{suffix}",
+                            "fullName": name,
+                            "type": metadata_type,
+                        },
+                    )
+                )
+        return f"<listMetadataResponse>{''.join(results)}</listMetadataResponse>"
+
+    def _metadata_readMetadata(self, request):
+        org = self.server.org
+        metadata_type = request.findtext(f"{{{METADATA_NS}}}type")
+        records = []
+        for full_name in request.iter(f"{{{METADATA_NS}}}fullNames"):
+            component = org.read_metadata(metadata_type, full_name.text)
+            if component is None:
+                records.append(f'<records xsi:type="{metadata_type}"/>')
+                continue
+            inner = metadata_xml("records", component)[len("<records>") :]
+            records.append(f'<records xsi:type="{metadata_type}">{inner}')
+        return (
+            "<readMetadataResponse><result>"
+            f"{''.join(records)}</result></readMetadataResponse>"
+        )
+
+    def _metadata_retrieve(self, request):
+        org = self.server.org
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            for types in request.iter(f"{{{METADATA_NS}}}types"):
+                metadata_type = types.findtext(f"{{{METADATA_NS}}}name")
+                folder, suffix = ZIP_LAYOUT.get(metadata_type, ("", ""))
+                for member in types.iter(f"{{{METADATA_NS}}}members"):
+                    component = org.read_metadata(metadata_type, member.text)
+                    if component is None:
+                        continue
+                    inner = metadata_xml(metadata_type, component)
+                    inner = inner.replace(f"<{metadata_type}>", f'<{metadata_type} xmlns="{METADATA_NS}">', 1)
+                    archive.writestr(
+                        f"{folder}/{member.text}{suffix}",
+                        f'<?xml version="1.0" encoding="UTF-8"?>\n{inner}',
+                    )
+        with self.server.stats_lock:
+            process_id = f"09S{len(self.server.retrieves):015d}"
+            self.server.retrieves[process_id] = buffer.getvalue()
+        return (
+            "<retrieveResponse><result>"
+            f"<done>false</done><id>{process_id}</id><state>Queued</state>"
+            "</result></retrieveResponse>"
+        )
+
+    def _metadata_checkRetrieveStatus(self, request):
+        process_id = request.findtext(f"{{{METADATA_NS}}}asyncProcessId")
+        with self.server.stats_lock:
+            data = self.server.retrieves.get(process_id)
+        if data is None:
+            return (
+                "<checkRetrieveStatusResponse><result><done>true</done>"
+                f"<id>{process_id}</id><status>Failed</status>"
+                "<errorMessage>Unknown retrieve</errorMessage>"
+                "</result></checkRetrieveStatusResponse>"
+            )
+        zip_file = base64.b64encode(data).decode("ascii")
+        return (
+            "<checkRetrieveStatusResponse><result><done>true</done>"
+            f"<id>{process_id}</id><status>Succeeded</status>"
+            f"<zipFile>{zip_file}</zipFile></result></checkRetrieveStatusResponse>"
+        )
+
+    def _send_query_page(self, total_size, records, offset, locator=None):
+        server = self.server
+        page = records[offset : offset + QUERY_BATCH_SIZE]
+        result = {"totalSize": total_size, "done": True, "records": page}
+        next_offset = offset + QUERY_BATCH_SIZE
+        if next_offset < len(records):
+            if locator is None:
+                with server.stats_lock:
+                    locator = f"01g{len(server.cursors):015d}"
+                    server.cursors[locator] = records
+            result["done"] = False
+            api = "tooling/" if "/tooling/" in urlparse(self.path).path else ""
+            result["nextRecordsUrl"] = (
+                f"/services/data/v{API_VERSION}/{api}query/{locator}-{next_offset}"
+            )
+        self._send_json(200, result)
+
+    def _send_not_found(self, what):
+        self._send_json(
+            404,
+            [{"errorCode": "NOT_FOUND", "message": f"The requested resource does not exist: {what}"}],
+        )
+
+    def _send_soap(self, status, body):
+        payload = soap_envelope(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/xml;charset=UTF-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header(
+            "Sforce-Limit-Info",
+            f"api-usage={self.server.api_usage}/{self.server.daily_limit}",
+        )
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeSalesforceServer:
+    """Threaded HTTP server answering Salesforce REST and Tooling requests"""
+
+    def __init__(
+        self,
+        org=None,
+        host="127.0.0.1",
+        port=0,
+        latency_ms=0,
+        jitter_ms=0,
+        rate_limit=0,
+        daily_limit=15000,
+    ):
+        """
+        Configure the server
+
+        Args:
+            org (FakeOrg): Synthetic org to serve (default: FakeOrg())
+            host (str): Interface to bind
+            port (int): Port to bind, 0 picks a free port
+            latency_ms (float): Added latency per request in milliseconds
+            jitter_ms (float): Maximum random deviation from the latency
+            rate_limit (float): Requests per second before 403s, 0 disables
+            daily_limit (int): Value reported as the daily API request limit
+        """
+        self.httpd = ThreadingHTTPServer((host, port), _FakeSalesforceHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.org = org or FakeOrg()
+        self.httpd.latency = latency_ms / 1000.0
+        self.httpd.jitter = jitter_ms / 1000.0
+        self.httpd.random = random.Random(0)
+        self.httpd.limiter = _RateLimiter(rate_limit)
+        self.httpd.daily_limit = daily_limit
+        self.httpd.stats_lock = threading.Lock()
+        self.httpd.calls = Counter()
+        self.httpd.cursors = {}
+        self.httpd.retrieves = {}
+        self.httpd.api_usage = 0
+        self.httpd.rejected = 0
+        self._thread = None
+
+    @property
+    def org(self):
+        return self.httpd.org
+
+    @property
+    def instance_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stats(self):
+        """Return server-side request counters"""
+        with self.httpd.stats_lock:
+            return {
+                "calls": dict(self.httpd.calls),
+                "total_calls": sum(self.httpd.calls.values()),
+                "rejected": self.httpd.rejected,
+            }
+
+    def reset_stats(self):
+        with self.httpd.stats_lock:
+            self.httpd.calls.clear()
+            self.httpd.cursors.clear()
+            self.httpd.retrieves.clear()
+            self.httpd.api_usage = 0
+            self.httpd.rejected = 0
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, name="fake-salesforce", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Fake Salesforce listening on {self.instance_url}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class LocalTransportAdapter(HTTPAdapter):
+    """
+    Send https:// requests to a plain-HTTP local server
+
+    simple_salesforce always builds https:// URLs from the instance name;
+    the fake server speaks plain HTTP, so the scheme is rewritten here.
+    """
+
+    def send(self, request, **kwargs):
+        request.url = "http://" + request.url[len("https://") :]
+        return super().send(request, **kwargs)
+
+
+def connect(instance_url, session=None):
+    """
+    Create a Salesforce connection to a fake server
+
+    Args:
+        instance_url (str): URL returned by FakeSalesforceServer.instance_url
+        session (requests.Session, optional): Session to route requests through
+
+    Returns:
+        simple_salesforce.Salesforce: Connection with a fake session id
+    """
+    import requests
+    from simple_salesforce import Salesforce
+
+    session = session or requests.Session()
+    netloc = urlparse(instance_url).netloc
+    session.mount(f"https://{netloc}", LocalTransportAdapter())
+    return Salesforce(
+        instance_url=f"https://{netloc}",
+        session_id="00DFAKE0000000000!fake-session",
+        session=session,
+        version=API_VERSION,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Salesforce server")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8765, help="Port to bind")
+    parser.add_argument("--objects", type=int, default=16, help="Total objects")
+    parser.add_argument("--fields", type=int, default=40, help="Fields per object")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Added latency")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Latency jitter")
+    parser.add_argument(
+        "--rate-limit", type=float, default=0, help="Requests per second (0: off)"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    org = FakeOrg(
+        standard_objects=args.objects // 2,
+        custom_objects=args.objects - args.objects // 2,
+        fields_per_object=args.fields,
+    )
+    server = FakeSalesforceServer(
+        org=org,
+        host=args.host,
+        port=args.port,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_limit=args.rate_limit,
+    )
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
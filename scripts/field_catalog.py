@@ -0,0 +1,384 @@
+"""
+Local field catalog with full-text search
+
+Questions like "which objects have a field labelled Region" or "where is
+picklist value Prospect used" should not need a grep through rendered
+markdown. build_catalog() reads the cached object describes
+(object_metadata_<Object>.pkl of every cache namespace, see cache_bundle) and
+the picklist value sets they refer to (see value_sets) in one pass and writes
+them to a SQLite database:
+
+    objects           org_id, name, label, description, record_count, custom
+    fields            org_id, object, name, label, type, length, custom,
+                      required, reference_to, help_text, description
+    picklist_values   org_id, object, field, value, label, active, is_default
+    field_references  org_id, object, field, target
+    search            FTS5 index of all of the above
+
+The tables are indexed on the columns looked up (names, labels, values,
+reference targets, all case-insensitive), and search() ranks full-text
+matches with bm25, so a query takes milliseconds even for thousands of
+objects. The database is rebuilt next to the old one and moved over it, so
+readers never see a half-built catalog.
+
+export_catalog() writes each table as a CSV file, or as a Parquet file when
+pyarrow is installed.
+"""
+
+import csv
+import logging
+import os
+import pickle
+import re
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from cache_bundle import namespace_dirs, parse_namespace
+from instrumentation import span
+from value_sets import cache_key as value_set_cache_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB = os.path.join(".sf_cache", "catalog.sqlite")
+EXPORT_FORMATS = ("csv", "parquet")
+SEARCH_KINDS = ("object", "field", "picklist_value")
+
+OBJECT_ENTRY_PATTERN = re.compile(r"^object_metadata_(?P<object>.+)\.pkl$")
+
+TABLES = {
+    "objects": ["org_id", "name", "label", "description", "record_count", "custom"],
+    "fields": [
+        "org_id",
+        "object",
+        "name",
+        "label",
+        "type",
+        "length",
+        "custom",
+        "required",
+        "reference_to",
+        "help_text",
+        "description",
+    ],
+    "picklist_values": ["org_id", "object", "field", "value", "label", "active", "is_default"],
+    "field_references": ["org_id", "object", "field", "target"],
+}
+
+SCHEMA = """
+CREATE TABLE catalog_info (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE objects (
+    org_id TEXT, name TEXT COLLATE NOCASE, label TEXT COLLATE NOCASE,
+    description TEXT, record_count INTEGER, custom INTEGER
+);
+CREATE TABLE fields (
+    org_id TEXT, object TEXT COLLATE NOCASE, name TEXT COLLATE NOCASE,
+    label TEXT COLLATE NOCASE, type TEXT, length INTEGER, custom INTEGER,
+    required INTEGER, reference_to TEXT, help_text TEXT, description TEXT
+);
+CREATE TABLE picklist_values (
+    org_id TEXT, object TEXT COLLATE NOCASE, field TEXT COLLATE NOCASE,
+    value TEXT COLLATE NOCASE, label TEXT COLLATE NOCASE, active INTEGER, is_default INTEGER
+);
+CREATE TABLE field_references (
+    org_id TEXT, object TEXT COLLATE NOCASE, field TEXT COLLATE NOCASE, target TEXT COLLATE NOCASE
+);
+CREATE VIRTUAL TABLE search USING fts5(
+    kind UNINDEXED, org_id UNINDEXED, object, field, value, text,
+    tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+);
+"""
+
+INDEXES = """
+CREATE INDEX objects_name ON objects (name);
+CREATE INDEX objects_label ON objects (label);
+CREATE INDEX fields_object ON fields (object, name);
+CREATE INDEX fields_name ON fields (name);
+CREATE INDEX fields_label ON fields (label);
+CREATE INDEX fields_type ON fields (type);
+CREATE INDEX picklist_values_value ON picklist_values (value);
+CREATE INDEX picklist_values_label ON picklist_values (label);
+CREATE INDEX picklist_values_field ON picklist_values (object, field);
+CREATE INDEX field_references_target ON field_references (target);
+"""
+
+
+class CatalogError(Exception):
+    """Raised when the catalog cannot be built, read or exported"""
+
+
+def _load_entry(directory: str, name: str):
+    with open(os.path.join(directory, name), "rb") as f:
+        return pickle.load(f)["data"]
+
+
+def _cached_objects(cache_dir: str) -> Iterator[Tuple[str, str, Dict, Dict[str, List[Dict]]]]:
+    """
+    (org id, object, metadata, value sets) of every cached object describe,
+    expired ones included; value sets are shared by the objects of a namespace
+    """
+    for path in namespace_dirs(cache_dir):
+        org_id = parse_namespace(os.path.basename(path))["org_id"]
+        directory = os.path.join(cache_dir, path)
+        with os.scandir(directory) as entries:
+            names = sorted(entry.name for entry in entries if entry.is_file())
+        value_sets: Dict[str, List[Dict]] = {}
+        for name in names:
+            match = OBJECT_ENTRY_PATTERN.match(name)
+            if not match:
+                continue
+            try:
+                metadata = _load_entry(directory, name)
+            except Exception as e:
+                logger.warning(f"Skipping unreadable cache entry {path}/{name}: {str(e)}")
+                continue
+            if not metadata:
+                continue
+            for field in metadata.get("fields") or []:
+                key = field.get("valueSet")
+                if key and key not in value_sets:
+                    try:
+                        value_sets[key] = _load_entry(directory, value_set_cache_key(key))
+                    except Exception as e:
+                        logger.warning(f"Missing value set {key} of {path}/{name}: {str(e)}")
+                        value_sets[key] = []
+            yield org_id, match.group("object"), metadata, value_sets
+
+
+def _text(*parts) -> str:
+    return " ".join(str(part) for part in parts if part)
+
+
+def _rows(
+    org_id: str, object_name: str, metadata: Dict, value_sets: Dict[str, List[Dict]]
+) -> Dict[str, List[tuple]]:
+    """Table rows of one object describe, search rows under "search" """
+    name = metadata.get("api_name") or object_name
+    rows = {table: [] for table in TABLES}
+    rows["search"] = []
+    rows["objects"].append(
+        (
+            org_id,
+            name,
+            metadata.get("label"),
+            metadata.get("description"),
+            metadata.get("record_count"),
+            int(name.endswith("__c")),
+        )
+    )
+    rows["search"].append(
+        ("object", org_id, name, None, None, _text(metadata.get("label"), metadata.get("description")))
+    )
+    for field in metadata.get("fields") or []:
+        field_name = field.get("name")
+        references = field.get("referenceTo") or []
+        rows["fields"].append(
+            (
+                org_id,
+                name,
+                field_name,
+                field.get("label"),
+                field.get("type"),
+                field.get("length"),
+                int(field.get("custom", (field_name or "").endswith("__c"))),
+                int(not field.get("nillable", True) and field.get("createable", True)),
+                ",".join(references),
+                field.get("inlineHelpText"),
+                field.get("description"),
+            )
+        )
+        rows["search"].append(
+            (
+                "field",
+                org_id,
+                name,
+                field_name,
+                None,
+                _text(
+                    field.get("label"),
+                    field.get("type"),
+                    " ".join(references),
+                    field.get("inlineHelpText"),
+                    field.get("description"),
+                ),
+            )
+        )
+        rows["field_references"] += [(org_id, name, field_name, target) for target in references]
+        values = field.get("picklistValues") or value_sets.get(field.get("valueSet"), [])
+        default = field.get("picklistDefault")
+        for value in values:
+            is_default = value.get("defaultValue") or (
+                default is not None and value.get("value") == default
+            )
+            rows["picklist_values"].append(
+                (
+                    org_id,
+                    name,
+                    field_name,
+                    value.get("value"),
+                    value.get("label"),
+                    int(value.get("active", True)),
+                    int(bool(is_default)),
+                )
+            )
+            rows["search"].append(
+                ("picklist_value", org_id, name, field_name, value.get("value"), value.get("label"))
+            )
+    return rows
+
+
+def build_catalog(cache_dir: str = ".sf_cache", db_path: str = DEFAULT_DB) -> Dict[str, int]:
+    """
+    Build the catalog database from the cached object describes
+
+    Args:
+        cache_dir: Cache directory (run-all caches with one directory per org work too)
+        db_path: Catalog database to write
+
+    Returns:
+        Rows per table
+    """
+    tmp_path = f"{db_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    counts = {table: 0 for table in TABLES}
+    conn = sqlite3.connect(tmp_path)
+    try:
+        with span("catalog_build", cache_dir=cache_dir):
+            try:
+                conn.executescript(SCHEMA)
+            except sqlite3.OperationalError as e:
+                raise CatalogError(f"SQLite without FTS5 support: {str(e)}")
+            inserts = {
+                table: f"INSERT INTO {table} VALUES ({', '.join('?' * len(columns))})"
+                for table, columns in TABLES.items()
+            }
+            inserts["search"] = "INSERT INTO search VALUES (?, ?, ?, ?, ?, ?)"
+            with conn:
+                for org_id, object_name, metadata, value_sets in _cached_objects(cache_dir):
+                    for table, rows in _rows(org_id, object_name, metadata, value_sets).items():
+                        conn.executemany(inserts[table], rows)
+                        if table in counts:
+                            counts[table] += len(rows)
+                conn.executemany(
+                    "INSERT INTO catalog_info VALUES (?, ?)",
+                    [
+                        ("built", datetime.now().isoformat(timespec="seconds")),
+                        ("cache_dir", os.path.abspath(cache_dir)),
+                    ],
+                )
+            # Indexes are cheaper to build once over all rows than to maintain per insert
+            conn.executescript(INDEXES)
+            conn.execute("INSERT INTO search(search) VALUES ('optimize')")
+            conn.commit()
+    except BaseException:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+    os.replace(tmp_path, db_path)
+    return counts
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    if not os.path.exists(db_path):
+        raise CatalogError(f"No catalog at {db_path}, build it first")
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _match_query(text: str) -> str:
+    """FTS5 query matching every word of text, the last one as a prefix"""
+    words = re.findall(r"\w+", text)
+    if not words:
+        raise CatalogError("Search text has no words")
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search(
+    text: str,
+    db_path: str = DEFAULT_DB,
+    kind: Optional[str] = None,
+    org_id: Optional[str] = None,
+    limit: int = 50,
+) -> List[Dict]:
+    """
+    Objects, fields and picklist values matching text, best matches first
+
+    Args:
+        text: Words to find in names, labels, types, reference targets,
+            help texts, descriptions and picklist values
+        kind: Only "object", "field" or "picklist_value" matches
+        org_id: Only matches of this org
+
+    Returns:
+        Matches with kind, org_id, object, field, value and the matched text
+    """
+    conditions = ["search MATCH ?"]
+    params: List = [_match_query(text)]
+    if kind:
+        conditions.append("kind = ?")
+        params.append(kind)
+    if org_id:
+        conditions.append("org_id = ?")
+        params.append(org_id)
+    params.append(limit)
+    with closing(_connect(db_path)) as conn:
+        rows = conn.execute(
+            "SELECT kind, org_id, object, field, value, text FROM search "
+            f"WHERE {' AND '.join(conditions)} ORDER BY bm25(search) LIMIT ?",
+            params,
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def query(sql: str, params: tuple = (), db_path: str = DEFAULT_DB) -> List[Dict]:
+    """Rows of a read-only SQL query against the catalog tables"""
+    with closing(_connect(db_path)) as conn:
+        try:
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+        except sqlite3.Error as e:
+            raise CatalogError(f"Catalog query failed: {str(e)}")
+
+
+def export_catalog(out_dir: str, db_path: str = DEFAULT_DB, fmt: str = "csv") -> List[str]:
+    """
+    Write every catalog table to out_dir as <table>.csv or <table>.parquet
+
+    Returns:
+        Paths written
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise CatalogError(f"Unknown export format {fmt!r}, expected one of {EXPORT_FORMATS}")
+    if fmt == "parquet":
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise CatalogError("Parquet export needs pyarrow: pip install pyarrow")
+
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    with closing(_connect(db_path)) as conn:
+        for table, columns in TABLES.items():
+            path = os.path.join(out_dir, f"{table}.{fmt}")
+            tmp_path = f"{path}.tmp"
+            cursor = conn.execute(f"SELECT {', '.join(columns)} FROM {table}")
+            if fmt == "csv":
+                with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(columns)
+                    writer.writerows(cursor)
+            else:
+                rows = cursor.fetchall()
+                arrays = {column: [row[i] for row in rows] for i, column in enumerate(columns)}
+                pyarrow.parquet.write_table(pyarrow.table(arrays), tmp_path)
+            os.replace(tmp_path, path)
+            written.append(path)
+    return written
+
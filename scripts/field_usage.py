@@ -0,0 +1,173 @@
+"""
+Field usage counts with adaptive bisection
+
+Field usage is counted with one COUNT() query per batch of fields:
+
+    SELECT COUNT() FROM Account WHERE Field1 != null OR Field2 != null OR ...
+
+A single field that cannot be filtered on makes Salesforce reject the whole
+query. Fields are therefore pre-filtered by their describe flags
+(filterable), by types that cannot be filtered and by the fields known not
+to work. A batch that is still rejected is split in halves until the
+offending fields are isolated. Those fields are recorded in the
+NonQueryableRegistry, which is kept in the cache namespace of the org and API
+version (see cache_bundle), so the next run leaves them out up front and
+rejected queries trend to zero over runs.
+
+Only errors naming a field or filter (FIELD_ERROR_CODES) are bisected. Other
+errors (network, API limits, query timeouts on large objects, ...) say
+nothing about the fields; the fields of such a batch are left out of the
+result instead of being reported as unused, and nothing is learned.
+"""
+
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from simple_salesforce.exceptions import SalesforceMalformedRequest
+
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 3
+
+REGISTRY_CACHE_KEY = "non_queryable_fields.pkl"
+
+# Field types that cannot be used in a WHERE clause
+NON_QUERYABLE_TYPES = {
+    "address",
+    "location",
+    "encrypted",
+    "textarea",
+    "calculated",
+    "complexvalue",
+    "datacategorygroupreference",
+}
+
+# Error codes of queries rejected because of one of their fields
+FIELD_ERROR_CODES = {
+    "INVALID_FIELD",
+    "INVALID_QUERY_FILTER_OPERATOR",
+    "INVALID_TYPE_FOR_OPERATION",
+    "MALFORMED_QUERY",
+}
+
+
+class NonQueryableRegistry:
+    """Fields that cannot be filtered on: known up front and learned from rejected queries"""
+
+    def __init__(self, cache, known: Optional[Dict[str, Set[str]]] = None):
+        """
+        Args:
+            cache: SalesforceCache of the org; learned fields are saved in it
+            known: object -> field names excluded without asking Salesforce
+        """
+        self.cache = cache
+        self.known = known or {}
+        # object -> field -> error message of the query that rejected it
+        self.learned: Dict[str, Dict[str, str]] = (
+            cache.load(REGISTRY_CACHE_KEY, ttl=float("inf")) or {}
+        )
+        self._lock = threading.Lock()
+
+    def excludes(self, object_name: str, field_name: str) -> bool:
+        return field_name in self.known.get(object_name, set()) or field_name in self.learned.get(
+            object_name, {}
+        )
+
+    def learn(self, object_name: str, field_name: str, reason: str):
+        """Exclude a field from now on, in this run and the next ones"""
+        with self._lock:
+            self.learned.setdefault(object_name, {})[field_name] = reason
+            self.cache.save(self.learned, REGISTRY_CACHE_KEY)
+        logger.info(f"Excluding {object_name}.{field_name} from usage queries: {reason}")
+
+    def filterable_fields(self, object_name: str, fields: List[Dict]) -> List[str]:
+        """Names of the described fields worth putting in a usage query"""
+        return [
+            field["name"]
+            for field in fields
+            if field.get("filterable", True)
+            and (field.get("type") or "").lower() not in NON_QUERYABLE_TYPES
+            and not self.excludes(object_name, field["name"])
+        ]
+
+
+def _error_code(error: SalesforceMalformedRequest) -> Optional[str]:
+    content = error.content
+    if isinstance(content, list) and content and isinstance(content[0], dict):
+        return content[0].get("errorCode")
+    return None
+
+
+def is_query_error(error: Exception) -> bool:
+    """
+    Whether Salesforce rejected the query because of its fields
+
+    Other 400 responses (QUERY_TIMEOUT, ...) are failed requests: retrying
+    with fewer fields would not tell which field is at fault.
+    """
+    return isinstance(error, SalesforceMalformedRequest) and _error_code(error) in FIELD_ERROR_CODES
+
+
+def _error_message(error: SalesforceMalformedRequest) -> str:
+    """The Salesforce error message of a rejected query, without the request URL"""
+    content = error.content
+    if isinstance(content, list) and content and isinstance(content[0], dict):
+        return f"{content[0].get('errorCode')}: {content[0].get('message')}"
+    return str(error)
+
+
+def count_usage(
+    count: Callable[[str], int],
+    object_name: str,
+    fields: List[Dict],
+    record_count: int,
+    registry: NonQueryableRegistry,
+    batch_size: int = BATCH_SIZE,
+) -> Tuple[Dict[str, float], Dict[str, int]]:
+    """
+    Usage percentage of the fields of one object
+
+    Args:
+        count: Function running a COUNT() query and returning the count
+        object_name: Object API name
+        fields: Field describes of the object
+        record_count: Records of the object
+        registry: Fields to leave out; rejected fields are added to it
+        batch_size: Fields per query
+
+    Returns:
+        (field -> usage percent, {"queries", "rejected", "learned"}); fields
+        that could not be counted are missing from the usage
+    """
+    usage: Dict[str, float] = {}
+    stats = {"queries": 0, "rejected": 0, "learned": 0}
+
+    def run(batch: List[str]):
+        conditions = " OR ".join(f"{field} != null" for field in batch)
+        stats["queries"] += 1
+        try:
+            total = count(f"SELECT COUNT() FROM {object_name} WHERE {conditions}")
+        except Exception as e:
+            if not is_query_error(e):
+                print(f"Error in batch query for {object_name}: {str(e)}")
+                return
+            stats["rejected"] += 1
+            if len(batch) == 1:
+                registry.learn(object_name, batch[0], _error_message(e))
+                stats["learned"] += 1
+                return
+            middle = len(batch) // 2
+            run(batch[:middle])
+            run(batch[middle:])
+            return
+        for field in batch:
+            usage[field] = (total / record_count * 100) if record_count > 0 else 0
+
+    names = registry.filterable_fields(object_name, fields)
+    with span("field_usage", object=object_name, fields=len(names)):
+        for i in range(0, len(names), batch_size):
+            run(names[i : i + batch_size])
+    return usage, stats
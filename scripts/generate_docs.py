@@ -7,6 +7,20 @@ It calls the SalesforceDocGenerator class to do the actual work.
 
 Usage:
     python generate_docs.py --username your_username --password your_password --token your_token
+
+    # Record the Salesforce traffic once, then iterate on templates offline
+    python generate_docs.py --username ... --cassette org.cassette --cassette-mode record
+    python generate_docs.py --cassette org.cassette --cassette-mode strict
+
+    # Fetch once into a snapshot, render anywhere from it
+    python generate_docs.py snapshot --username ... --snapshot org.sfsnap
+    python generate_docs.py render --snapshot org.sfsnap
+
+    # Changelog of the metadata changes between two snapshots
+    python generate_docs.py diff --baseline yesterday.sfsnap --snapshot org.sfsnap
+
+    # Navigation for the generated pages, as awesome-pages .pages files
+    python generate_docs.py --username ... --nav pages
 """
 
 import os
@@ -16,10 +30,22 @@ from datetime import datetime
 from dotenv import load_dotenv
 
 # Add the scripts directory to the Python path
-sys.path.append(os.path.join(os.path.dirname(__file__), "scripts"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import our documentation generator
-from scripts.salesforce_docs_generator import SalesforceDocGenerator
+from salesforce_docs_generator import SalesforceDocGenerator
+from org_snapshot import (
+    SnapshotError,
+    create_snapshot,
+    diff_snapshots,
+    render_snapshot,
+    write_changelog,
+)
+from instrumentation import finish_run
+from nav_builder import DEFAULT_PAGE_SIZE, NAV_MODES, update_nav
+from pipeline import DEFAULT_WORKERS, parse_workers
+from query_iterator import DEFAULT_PREFETCH, set_prefetch_depth
+from sf_session import is_replaying
 
 
 def main():
@@ -31,6 +57,29 @@ def main():
     parser = argparse.ArgumentParser(
         description="Generate Salesforce org documentation"
     )
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="generate",
+        choices=["generate", "snapshot", "render", "diff"],
+        help="generate: fetch and render (default), snapshot: fetch into a "
+        "snapshot file, render: render from a snapshot file only, diff: "
+        "changelog of the metadata changes from --baseline to --snapshot",
+    )
+    parser.add_argument(
+        "--snapshot",
+        default="org.sfsnap",
+        help="Snapshot file for the snapshot, render and diff commands (default: org.sfsnap)",
+    )
+    parser.add_argument(
+        "--baseline",
+        help="Snapshot the diff command compares against (a previous run, production, ...)",
+    )
+    parser.add_argument(
+        "--changes-page",
+        default="docs/admin/data/data_changes.md",
+        help="Page the diff command writes (default: docs/admin/data/data_changes.md)",
+    )
 
     # Authentication options
     parser.add_argument("--username", help="Salesforce username")
@@ -61,16 +110,88 @@ def main():
         "--custom", action="store_true", help="Document custom objects only"
     )
 
+    # Record/replay options
+    parser.add_argument(
+        "--cassette",
+        help="Cassette file to record Salesforce traffic to or replay from",
+    )
+    parser.add_argument(
+        "--cassette-mode",
+        choices=["record", "replay", "strict"],
+        help="record, replay, or strict replay that fails on unrecorded requests "
+        "(default: replay if the cassette exists, record otherwise)",
+    )
+
+    # Query options
+    parser.add_argument(
+        "--query-prefetch",
+        type=int,
+        default=DEFAULT_PREFETCH,
+        help="Query result pages loaded ahead on a background thread, 0 disables "
+        f"prefetching (default: {DEFAULT_PREFETCH})",
+    )
+
+    # Pipeline options
+    parser.add_argument(
+        "--pipeline-workers",
+        type=parse_workers,
+        default=dict(DEFAULT_WORKERS),
+        help="Workers per pipeline stage, e.g. fetch=8,render=2 (default: "
+        + ",".join(f"{k}={v}" for k, v in DEFAULT_WORKERS.items())
+        + ")",
+    )
+
+    # Navigation options
+    parser.add_argument(
+        "--nav",
+        choices=NAV_MODES,
+        help="Build the navigation of the pages written: pages writes awesome-pages "
+        ".pages files, mkdocs the nav section of mkdocs.yml (default: leave it alone)",
+    )
+    parser.add_argument(
+        "--nav-page-size",
+        type=int,
+        default=DEFAULT_PAGE_SIZE,
+        help=f"Pages per navigation section before it is split (default: {DEFAULT_PAGE_SIZE})",
+    )
+    parser.add_argument(
+        "--docs-dir", default="docs", help="MkDocs docs_dir (default: docs)"
+    )
+
+    # Instrumentation options
+    parser.add_argument("--trace", help="Write a JSON trace of the run to this file")
+    parser.add_argument(
+        "--metrics", help="Write run metrics as a Prometheus textfile to this file"
+    )
+
     # Parse the arguments
     args = parser.parse_args()
+    set_prefetch_depth(args.query_prefetch)
 
     # Get credentials from environment variables if not provided as arguments
     username = args.username or os.environ.get("SALESFORCE_USERNAME")
     password = args.password or os.environ.get("SALESFORCE_PASSWORD")
     token = args.token or os.environ.get("SALESFORCE_TOKEN")
 
-    # Check if credentials are available
-    if not (username and password):
+    if args.command == "render":
+        try:
+            render_from_snapshot(args)
+            build_nav(args)
+        finally:
+            finish_run(args.trace, args.metrics)
+        return
+
+    if args.command == "diff":
+        try:
+            diff_from_snapshots(args)
+        finally:
+            finish_run(args.trace, args.metrics)
+        return
+
+    # Check if credentials are available (not needed when replaying a cassette)
+    if not (username and password) and not is_replaying(
+        args.cassette, args.cassette_mode
+    ):
         print("Error: Salesforce credentials are required.")
         print("Provide them as command-line arguments or in a .env file.")
         print("Example .env file:")
@@ -92,8 +213,23 @@ def main():
             security_token=token,
             domain=args.domain,
             template_dir=args.template_dir,
+            cassette=args.cassette,
+            cassette_mode=args.cassette_mode,
+            pipeline_workers=args.pipeline_workers,
         )
 
+        if args.command == "snapshot":
+            if args.object:
+                objects = [args.object]
+            else:
+                custom = True if args.custom else False if args.standard else None
+                objects = doc_generator.list_objects(custom=custom)
+            print(f"Writing snapshot of {len(objects)} objects to {args.snapshot}...")
+            written = create_snapshot(doc_generator, args.snapshot, objects)
+            print(f"Snapshot of {len(written)} objects saved to {args.snapshot}")
+            print(f"Run 'generate_docs.py render --snapshot {args.snapshot}' to render it.")
+            return
+
         # Generate documentation based on arguments
         if args.object:
             print(f"Generating documentation for {args.object}...")
@@ -123,6 +259,7 @@ def main():
             print(
                 f"Documented {len(std_objects)} standard objects and {len(custom_objects)} custom objects"
             )
+        build_nav(args)
 
         print(
             f"Documentation generation completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
@@ -136,6 +273,54 @@ def main():
 
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        finish_run(args.trace, args.metrics)
+
+
+def build_nav(args):
+    """Update the navigation with the pages written in this run, if --nav is given"""
+    if not args.nav:
+        return
+    pages = update_nav(args.nav, args.docs_dir, page_size=args.nav_page_size)
+    target = "mkdocs.yml" if args.nav == "mkdocs" else ".pages files"
+    print(f"Navigation of {pages} pages written to {target}")
+
+
+def render_from_snapshot(args):
+    """Render documentation from a snapshot without connecting to Salesforce"""
+    print(f"Rendering documentation from snapshot {args.snapshot}")
+    try:
+        doc_generator = SalesforceDocGenerator(template_dir=args.template_dir)
+        custom = True if args.custom else False if args.standard else None
+        objects = render_snapshot(
+            doc_generator,
+            args.snapshot,
+            args.output_dir,
+            object_names=[args.object] if args.object else None,
+            custom=custom,
+        )
+    except SnapshotError as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Rendered {len(objects)} objects to {args.output_dir}")
+
+
+def diff_from_snapshots(args):
+    """Write the changelog between two snapshots without connecting to Salesforce"""
+    if not args.baseline:
+        print("Error: the diff command needs --baseline", file=sys.stderr)
+        sys.exit(1)
+    try:
+        diff = diff_snapshots(args.baseline, args.snapshot)
+    except SnapshotError as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+    write_changelog(diff, args.changes_page, args.template_dir)
+    counts = diff["counts"]
+    print(
+        f"{counts['added']} added, {counts['removed']} removed, {counts['changed']} changed; "
+        f"changelog saved to {args.changes_page}"
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,177 @@
+"""
+Role and territory hierarchies
+
+A hierarchy is loaded with two queries, all nodes (UserRole or Territory2
+rows) and one aggregate query for the number of users per node, and built
+in memory. Depth, subtree size and the users of each subtree are computed
+once while building, so rendering never has to walk a subtree again.
+
+Large hierarchies are rendered as depth-limited pages: the page shows the
+first levels as collapsible lists and every node at the depth limit that
+still has children links to a sub-page with its subtree.
+"""
+
+import logging
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from instrumentation import span
+from query_iterator import iter_query
+
+logger = logging.getLogger(__name__)
+
+ROLE_QUERY = "SELECT Id, Name, DeveloperName, ParentRoleId, RollupDescription FROM UserRole"
+ROLE_USERS_QUERY = (
+    "SELECT UserRoleId, COUNT(Id) total FROM User "
+    "WHERE IsActive = true AND UserRoleId != null GROUP BY UserRoleId"
+)
+TERRITORY_QUERY = (
+    "SELECT Id, Name, DeveloperName, ParentTerritory2Id, Description FROM Territory2 "
+    "WHERE Territory2Model.State = 'Active'"
+)
+TERRITORY_USERS_QUERY = (
+    "SELECT Territory2Id, COUNT(Id) total FROM UserTerritory2Association "
+    "WHERE IsActive = true GROUP BY Territory2Id"
+)
+
+
+@dataclass
+class HierarchyNode:
+    id: str
+    name: str
+    parent_id: Optional[str] = None
+    developer_name: str = ""
+    description: str = ""
+    users: int = 0
+    children: List["HierarchyNode"] = field(default_factory=list)
+    depth: int = 0
+    # Including the node itself
+    subtree_size: int = 1
+    subtree_users: int = 0
+
+    @property
+    def slug(self) -> str:
+        return re.sub(r"[^a-z0-9]+", "-", (self.developer_name or self.id).lower()).strip("-")
+
+
+class Hierarchy:
+    """Tree of roles or territories with precomputed subtree figures"""
+
+    def __init__(self, nodes: Iterable[HierarchyNode]):
+        self.nodes: Dict[str, HierarchyNode] = {node.id: node for node in nodes}
+        self.roots: List[HierarchyNode] = []
+        for node in self.nodes.values():
+            parent = self.nodes.get(node.parent_id) if node.parent_id else None
+            if parent is None or parent is node:
+                self.roots.append(node)
+            else:
+                parent.children.append(node)
+        for node in self.nodes.values():
+            node.children.sort(key=lambda child: child.name.lower())
+        self.roots.sort(key=lambda node: node.name.lower())
+
+        # Breadth-first from the roots; nodes caught in a parent cycle are
+        # never reached and become roots of their own
+        order = self._breadth_first(self.roots)
+        if len(order) < len(self.nodes):
+            reached = {node.id for node in order}
+            for node in self.nodes.values():
+                if node.id not in reached:
+                    self.roots.append(node)
+                    order.extend(self._breadth_first([node], reached))
+        for node in reversed(order):
+            node.subtree_size = 1 + sum(child.subtree_size for child in node.children)
+            node.subtree_users = node.users + sum(child.subtree_users for child in node.children)
+
+    @staticmethod
+    def _breadth_first(roots, reached=None) -> List[HierarchyNode]:
+        """Set depths; links back to nodes already in the tree are dropped"""
+        reached = set() if reached is None else reached
+        queue = deque()
+        for root in roots:
+            if root.id not in reached:
+                reached.add(root.id)
+                root.depth = 0
+                queue.append(root)
+        order = []
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            node.children = [child for child in node.children if child.id not in reached]
+            for child in node.children:
+                reached.add(child.id)
+                child.depth = node.depth + 1
+                queue.append(child)
+        return order
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def max_depth(self) -> int:
+        return max((node.depth for node in self.nodes.values()), default=0)
+
+    @property
+    def total_users(self) -> int:
+        return sum(root.subtree_users for root in self.roots)
+
+    def walk(self, root: Optional[HierarchyNode] = None) -> Iterator[HierarchyNode]:
+        """Nodes in depth-first order, below root or of the whole tree"""
+        stack = list(reversed(root.children if root else self.roots))
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    def largest(self, count: int = 10) -> List[HierarchyNode]:
+        """Nodes with the most users in their subtree, leaves excluded"""
+        branches = [node for node in self.nodes.values() if node.children]
+        return sorted(branches, key=lambda node: -node.subtree_users)[:count]
+
+
+def _users_by_node(sf, query: str, key: str) -> Dict[str, int]:
+    return {
+        record[key]: record.get("total") or record.get("expr0") or 0
+        for record in iter_query(sf, query)
+    }
+
+
+def load_role_hierarchy(sf) -> Hierarchy:
+    """Load all roles and their active user counts"""
+    with span("hierarchy", table="UserRole"):
+        users = _users_by_node(sf, ROLE_USERS_QUERY, "UserRoleId")
+        return Hierarchy(
+            HierarchyNode(
+                id=record["Id"],
+                name=record.get("Name") or record["Id"],
+                parent_id=record.get("ParentRoleId"),
+                developer_name=record.get("DeveloperName") or "",
+                description=record.get("RollupDescription") or "",
+                users=users.get(record["Id"], 0),
+            )
+            for record in iter_query(sf, ROLE_QUERY)
+        )
+
+
+def load_territory_hierarchy(sf) -> Hierarchy:
+    """Load the territories of the active territory model, empty without one"""
+    try:
+        with span("hierarchy", table="Territory2"):
+            users = _users_by_node(sf, TERRITORY_USERS_QUERY, "Territory2Id")
+            return Hierarchy(
+                HierarchyNode(
+                    id=record["Id"],
+                    name=record.get("Name") or record["Id"],
+                    parent_id=record.get("ParentTerritory2Id"),
+                    developer_name=record.get("DeveloperName") or "",
+                    description=record.get("Description") or "",
+                    users=users.get(record["Id"], 0),
+                )
+                for record in iter_query(sf, TERRITORY_QUERY)
+            )
+    except Exception as e:
+        # Territory Management is not enabled in every org
+        logger.info(f"No territories loaded: {str(e)}")
+        return Hierarchy([])
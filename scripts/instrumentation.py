@@ -0,0 +1,404 @@
+"""
+Phase-level tracing and API-call instrumentation
+
+The generators wrap each phase (login, describes, queries, cache access,
+template rendering, file writes) in span() and the shared Salesforce session
+reports every HTTP response, so a run can be broken down afterwards.
+
+Results are available as:
+    - a JSON trace in Chrome trace event format (open in chrome://tracing
+      or https://ui.perfetto.dev)
+    - a Prometheus textfile for the node_exporter textfile collector
+    - a summary table printed at the end of the run
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+
+def classify_endpoint(path):
+    """
+    Map a request path to the Salesforce endpoint it targets
+
+    Args:
+        path (str): URL path of the request, with or without a query string
+
+    Returns:
+        str: Endpoint name such as "describe", "query" or "tooling_query"
+    """
+    path = urlparse(path).path
+    if "/Soap/u/" in path:
+        return "login"
+    if "/Soap/m/" in path:
+        return "metadata"
+    # Follow-up pages of REST and Tooling queries alike
+    if re.search(r"/(query|queryAll)/[^/]+$", path):
+        return "query_more"
+    if "/tooling/query" in path:
+        return "tooling_query"
+    if re.search(r"/(query|queryAll)/?$", path):
+        return "query"
+    if path.rstrip("/").endswith("/describe"):
+        return "describe"
+    if path.rstrip("/").endswith("/sobjects"):
+        return "describe_global"
+    if path.rstrip("/").endswith("/limits"):
+        return "limits"
+    if path.rstrip("/").endswith("/limits/recordCount"):
+        return "record_count"
+    return "other"
+
+
+class Tracer:
+    """Collects timing spans and counters for one run"""
+
+    def __init__(self):
+        self.started = time.time()
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.spans = []
+        self.api_calls = defaultdict(int)
+        self.api_bytes = defaultdict(int)
+        self.api_seconds = defaultdict(float)
+        self.api_errors = defaultdict(int)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.stages = {}
+        self.output = {"written": 0, "skipped": 0, "bytes_written": 0, "bytes_skipped": 0}
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """
+        Time a phase of the run
+
+        Args:
+            name (str): Phase name, e.g. "describe" or "render"
+            **attrs: Extra attributes stored with the span (object name, ...)
+        """
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+            with self._lock:
+                self.spans.append(
+                    {
+                        "name": name,
+                        "start": start - self._origin,
+                        "duration": duration,
+                        "thread": threading.get_ident(),
+                        "parent": stack[-1] if stack else None,
+                        "attrs": attrs,
+                    }
+                )
+
+    def record_response(self, response, *args, **kwargs):
+        """requests response hook counting API calls and bytes by endpoint"""
+        endpoint = classify_endpoint(response.request.path_url)
+        size = len(response.content or b"")
+        with self._lock:
+            self.api_calls[endpoint] += 1
+            self.api_bytes[endpoint] += size
+            self.api_seconds[endpoint] += response.elapsed.total_seconds()
+            if response.status_code >= 300:
+                self.api_errors[endpoint] += 1
+
+    def record_cache(self, hit):
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def record_output(self, written, size):
+        """Count a file the output writer wrote, or skipped as unchanged"""
+        with self._lock:
+            if written:
+                self.output["written"] += 1
+                self.output["bytes_written"] += size
+            else:
+                self.output["skipped"] += 1
+                self.output["bytes_skipped"] += size
+
+    def record_stage(self, name, stats):
+        """Add the metrics of one pipeline stage run (see pipeline.Pipeline)"""
+        with self._lock:
+            entry = self.stages.setdefault(
+                name,
+                {
+                    "workers": 0,
+                    "items": 0,
+                    "errors": 0,
+                    "busy_seconds": 0.0,
+                    "blocked_seconds": 0.0,
+                    "seconds": 0.0,
+                },
+            )
+            entry["workers"] = max(entry["workers"], stats["workers"])
+            for key in ("items", "errors", "busy_seconds", "blocked_seconds", "seconds"):
+                entry[key] += stats[key]
+
+    def instrument_session(self, session):
+        """Attach the response hook to a requests session"""
+        if self.record_response not in session.hooks["response"]:
+            session.hooks["response"].append(self.record_response)
+        return session
+
+    def phase_totals(self):
+        """
+        Aggregate spans by name
+
+        Returns:
+            dict: {name: {"count", "total", "max"}} with times in seconds
+        """
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            entry = totals.setdefault(span["name"], {"count": 0, "total": 0.0, "max": 0.0})
+            entry["count"] += 1
+            entry["total"] += span["duration"]
+            entry["max"] = max(entry["max"], span["duration"])
+        return totals
+
+    def write_trace(self, path):
+        """Write the spans and counters as a Chrome trace event JSON file"""
+        with self._lock:
+            spans = list(self.spans)
+        events = [
+            {
+                "name": span["name"],
+                "ph": "X",
+                "ts": round(span["start"] * 1e6),
+                "dur": round(span["duration"] * 1e6),
+                "pid": os.getpid(),
+                "tid": span["thread"],
+                "args": {k: str(v) for k, v in span["attrs"].items()},
+            }
+            for span in spans
+        ]
+        trace = {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "metadata": {
+                "started": self.started,
+                "elapsed_seconds": time.perf_counter() - self._origin,
+                "api_calls": dict(self.api_calls),
+                "api_bytes": dict(self.api_bytes),
+                "api_errors": dict(self.api_errors),
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "phases": self.phase_totals(),
+                "stages": self.stages,
+                "output": self.output,
+            },
+        }
+        _write_atomic(path, json.dumps(trace))
+
+    def write_prometheus(self, path, prefix="sfdocs"):
+        """Write counters in Prometheus text exposition format"""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(
+                    f"{prefix}_{name}{{{label_text}}} {value}" if label_text
+                    else f"{prefix}_{name} {value}"
+                )
+
+        phases = self.phase_totals()
+        metric(
+            "phase_seconds_total",
+            "counter",
+            "Time spent per phase.",
+            [({"phase": n}, f"{p['total']:.6f}") for n, p in sorted(phases.items())],
+        )
+        metric(
+            "phase_count_total",
+            "counter",
+            "Number of spans per phase.",
+            [({"phase": n}, p["count"]) for n, p in sorted(phases.items())],
+        )
+        metric(
+            "api_calls_total",
+            "counter",
+            "Salesforce API calls by endpoint.",
+            [({"endpoint": e}, c) for e, c in sorted(self.api_calls.items())],
+        )
+        metric(
+            "api_errors_total",
+            "counter",
+            "Salesforce API responses with an error status by endpoint.",
+            [({"endpoint": e}, c) for e, c in sorted(self.api_errors.items())],
+        )
+        metric(
+            "api_bytes_total",
+            "counter",
+            "Response bytes received by endpoint.",
+            [({"endpoint": e}, c) for e, c in sorted(self.api_bytes.items())],
+        )
+        stages = sorted(self.stages.items())
+        metric(
+            "stage_items_total",
+            "counter",
+            "Items processed per pipeline stage.",
+            [({"stage": n}, s["items"]) for n, s in stages],
+        )
+        metric(
+            "stage_errors_total",
+            "counter",
+            "Items a pipeline stage failed on.",
+            [({"stage": n}, s["errors"]) for n, s in stages],
+        )
+        metric(
+            "stage_busy_seconds_total",
+            "counter",
+            "Time pipeline stage workers spent processing items.",
+            [({"stage": n}, f"{s['busy_seconds']:.6f}") for n, s in stages],
+        )
+        metric(
+            "stage_blocked_seconds_total",
+            "counter",
+            "Time pipeline stage workers waited on a full queue.",
+            [({"stage": n}, f"{s['blocked_seconds']:.6f}") for n, s in stages],
+        )
+        metric(
+            "output_files_total",
+            "counter",
+            "Output files written, or skipped as unchanged.",
+            [
+                ({"result": "written"}, self.output["written"]),
+                ({"result": "skipped"}, self.output["skipped"]),
+            ],
+        )
+        metric(
+            "output_bytes_written_total",
+            "counter",
+            "Bytes of output files written.",
+            [({}, self.output["bytes_written"])],
+        )
+        metric("cache_hits_total", "counter", "Cache hits.", [({}, self.cache_hits)])
+        metric("cache_misses_total", "counter", "Cache misses.", [({}, self.cache_misses)])
+        metric(
+            "run_seconds",
+            "gauge",
+            "Wall time of the run.",
+            [({}, f"{time.perf_counter() - self._origin:.3f}")],
+        )
+        metric("last_run_timestamp_seconds", "gauge", "Start of the run.", [({}, int(self.started))])
+        _write_atomic(path, "\n".join(lines) + "\n")
+
+    def summary_table(self):
+        """Return a plain text summary of phases, API calls and cache use"""
+        elapsed = time.perf_counter() - self._origin
+        lines = [f"Run time: {elapsed:.2f}s", ""]
+        phases = self.phase_totals()
+        if phases:
+            lines.append(f"{'Phase':<20}{'Count':>8}{'Total s':>11}{'Mean ms':>11}{'Max ms':>11}")
+            for name, p in sorted(phases.items(), key=lambda i: -i[1]["total"]):
+                lines.append(
+                    f"{name:<20}{p['count']:>8}{p['total']:>11.2f}"
+                    f"{p['total'] / p['count'] * 1000:>11.1f}{p['max'] * 1000:>11.1f}"
+                )
+            lines.append("")
+        if self.api_calls:
+            lines.append(f"{'Endpoint':<20}{'Calls':>8}{'Errors':>8}{'KB':>11}{'Total s':>11}")
+            for endpoint, calls in sorted(self.api_calls.items(), key=lambda i: -i[1]):
+                lines.append(
+                    f"{endpoint:<20}{calls:>8}{self.api_errors.get(endpoint, 0):>8}"
+                    f"{self.api_bytes[endpoint] / 1024:>11.1f}{self.api_seconds[endpoint]:>11.2f}"
+                )
+            lines.append(
+                f"{'total':<20}{sum(self.api_calls.values()):>8}"
+                f"{sum(self.api_errors.values()):>8}"
+                f"{sum(self.api_bytes.values()) / 1024:>11.1f}"
+                f"{sum(self.api_seconds.values()):>11.2f}"
+            )
+            lines.append("")
+        if self.stages:
+            lines.append(
+                f"{'Stage':<20}{'Workers':>8}{'Items':>8}{'Errors':>8}"
+                f"{'Busy s':>11}{'Blocked s':>11}{'Items/s':>11}"
+            )
+            for name, s in self.stages.items():
+                rate = s["items"] / s["seconds"] if s["seconds"] else 0.0
+                lines.append(
+                    f"{name:<20}{s['workers']:>8}{s['items']:>8}{s['errors']:>8}"
+                    f"{s['busy_seconds']:>11.2f}{s['blocked_seconds']:>11.2f}{rate:>11.1f}"
+                )
+            lines.append("")
+        if self.output["written"] or self.output["skipped"]:
+            lines.append(
+                f"Output: {self.output['written']} files written "
+                f"({self.output['bytes_written'] / 1024:.1f} KB), "
+                f"{self.output['skipped']} unchanged skipped"
+            )
+        lookups = self.cache_hits + self.cache_misses
+        if lookups:
+            lines.append(
+                f"Cache: {self.cache_hits} hits, {self.cache_misses} misses "
+                f"({self.cache_hits / lookups:.0%} hit rate)"
+            )
+        return "\n".join(lines)
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+_tracer = Tracer()
+
+
+def get_tracer():
+    """Return the process-wide tracer"""
+    return _tracer
+
+
+def reset_tracer():
+    """Start a fresh tracer, e.g. between runs in one process"""
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def span(name, **attrs):
+    """Time a phase on the process-wide tracer"""
+    return _tracer.span(name, **attrs)
+
+
+def finish_run(trace_path=None, metrics_path=None, print_summary=True):
+    """
+    Print the summary table and write the trace and metrics files
+
+    Args:
+        trace_path (str, optional): JSON trace output path
+        metrics_path (str, optional): Prometheus textfile output path
+        print_summary (bool): Print the summary table to stdout
+    """
+    tracer = get_tracer()
+    if trace_path:
+        tracer.write_trace(trace_path)
+    if metrics_path:
+        tracer.write_prometheus(metrics_path)
+    if print_summary:
+        print(tracer.summary_table())
@@ -20,6 +20,7 @@ metadata_type_to_docs_path = {
     "object_metadata": "docs/data-model/objects/standard-objects.md",
     "license_usage": "docs/administration/licenses/license-usage.md",
     "profile_permissions": "docs/security/profiles/profile-matrix.md",
+    "profile_matrix": "docs/admin/profiles/profile_matrix.md",
     "permission_sets": "docs/security/permissions/permission-sets.md",
     "user_permissions": "docs/security/permissions/permission-sets.md",
     "record_types": "docs/customization/layouts/record-types.md",
@@ -67,6 +68,7 @@ metadata_type_to_template_path = {
     # Security Templates
     "license_usage": "backend/templates/license_usage.j2",
     "profile_permissions": "backend/templates/profile_permissions.j2",
+    "profile_matrix": "backend/templates/profile_matrix.j2",
     "permission_sets": "backend/templates/permission_sets.j2",
     "user_permissions": "backend/templates/user_permissions.j2",
     "sharing_rules": "backend/templates/sharing_rules.j2",
@@ -113,16 +115,29 @@ import pickle
 from datetime import datetime
 from simple_salesforce import Salesforce
 from typing import Optional, List, Dict, Any
+from apex_inventory import load_apex_inventory
+from cache_bundle import cache_namespace
+from cache_warmer import DEFAULT_WORKERS, CacheWarmer
+from data_tables import TABLE_MODES, table_function
+from field_usage import NonQueryableRegistry, count_usage
+from hierarchy import Hierarchy, load_role_hierarchy, load_territory_hierarchy
+from instrumentation import get_tracer, span
+from metadata_api import MetadataClient
+from object_dates import fetch_object_dates, front_matter, page_dates
+from output_writer import get_writer
+from page_assembler import PageAssembler
+from permissions_matrix import PermissionMatrix, load_permission_matrix
+from pipeline import DEFAULT_WORKERS as PIPELINE_WORKERS, Pipeline, Stage
+from query_iterator import query_all, query_count
+from sf_session import ApiBudget, connect
+from value_sets import cache_value_sets
 
 
 def ensure_map_paths_exist(docs_paths: Dict[str, str], template_paths: Dict[str, str]):
     print("creating paths")
-    for path in set(docs_paths.values()):
-        Path(path).parent.mkdir(parents=True, exist_ok=True)
-        os.system(f"touch {path}")
-    for path in set(template_paths.values()):
-        Path(path).parent.mkdir(parents=True, exist_ok=True)
-        os.system(f"touch {path}")
+    paths = set(docs_paths.values()) | set(template_paths.values())
+    created = get_writer().touch_many(sorted(paths))
+    print(f"created {len(created)} of {len(paths)} paths")
 
 
 class JinjaRenderer:
@@ -169,20 +184,58 @@ class CacheConfig:
 class SalesforceCache:
     def __init__(self, config: CacheConfig):
         self.config = config
+        self.namespace: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
         self._ensure_cache_dir()
 
+    def set_namespace(self, namespace: Optional[str]):
+        """Keep entries in a subdirectory per org, API version and schema version (see cache_bundle)"""
+        self.namespace = namespace
+        self._ensure_cache_dir()
+
+    def _cache_dir(self) -> str:
+        if self.namespace:
+            return os.path.join(self.config.cache_dir, self.namespace)
+        return self.config.cache_dir
+
     def _ensure_cache_dir(self):
-        Path(self.config.cache_dir).mkdir(parents=True, exist_ok=True)
+        Path(self._cache_dir()).mkdir(parents=True, exist_ok=True)
 
     def _get_cache_path(self, filename: str) -> str:
-        return os.path.join(self.config.cache_dir, filename)
+        return os.path.join(self._cache_dir(), filename)
 
     def save(self, data: Any, filename: str):
         cache_path = self._get_cache_path(filename)
+        with span("cache_save", key=filename):
+            with open(cache_path, "wb") as f:
+                pickle.dump({"timestamp": datetime.now().timestamp(), "data": data}, f)
+
+    def load(self, filename: str, ttl: Optional[float] = None) -> Optional[Any]:
+        """Cached data, or None when missing or older than ttl (default: cache_ttl)"""
+        with span("cache_load", key=filename):
+            data = self._load(filename, self.config.cache_ttl if ttl is None else ttl)
+        hit = data is not None
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        get_tracer().record_cache(hit)
+        return data
+
+    def invalidate(self, filename: str):
+        """Mark cached data as expired; it stays readable with load(ttl=float("inf"))"""
+        cache_path = self._get_cache_path(filename)
+        try:
+            with open(cache_path, "rb") as f:
+                cache_data = pickle.load(f)
+        except Exception:
+            return
+        cache_data["timestamp"] = 0
         with open(cache_path, "wb") as f:
-            pickle.dump({"timestamp": datetime.now().timestamp(), "data": data}, f)
+            pickle.dump(cache_data, f)
 
-    def load(self, filename: str) -> Optional[Any]:
+    def _load(self, filename: str, ttl: float) -> Optional[Any]:
         cache_path = self._get_cache_path(filename)
         if not os.path.exists(cache_path):
             return None
@@ -192,7 +245,7 @@ class SalesforceCache:
                 cache_data = pickle.load(f)
                 if (
                     datetime.now().timestamp() - cache_data["timestamp"]
-                ) > self.config.cache_ttl:
+                ) > ttl:
                     return None
                 return cache_data["data"]
             except:
@@ -200,7 +253,7 @@ class SalesforceCache:
 
 
 class SalesforceMetadata:
-    # Set of known non-queryable fields by object
+    # Known non-queryable fields by object; the rest is learned (see field_usage)
     NON_QUERYABLE_FIELDS: Dict[str, Set[str]] = {
         "Account": {
             "ChannelProgramName",
@@ -220,15 +273,136 @@ class SalesforceMetadata:
     def __init__(self, sf_connection: Salesforce, cache: SalesforceCache):
         self.sf = sf_connection
         self.cache = cache
+        if cache.namespace is None and sf_connection is not None:
+            cache.set_namespace(cache_namespace(sf_connection))
+        self._object_dates: Optional[Dict[str, Dict]] = None
+        # Fields left out of usage queries, learned per org and API version
+        self.non_queryable = NonQueryableRegistry(cache, self.NON_QUERYABLE_FIELDS)
+
+    def get_object_dates(self) -> Dict[str, Dict]:
+        """Get created/last-modified dates of all object definitions with caching"""
+        if self._object_dates is None:
+            cache_key = "object_dates.pkl"
+            self._object_dates = self.cache.load(cache_key)
+            if self._object_dates is None:
+                self._object_dates = fetch_object_dates(self.sf)
+                self.cache.save(self._object_dates, cache_key)
+        return self._object_dates
+
+    def clear_object_dates(self):
+        """Reload the object dates on next use"""
+        self._object_dates = None
+        self.cache.invalidate("object_dates.pkl")
+
+    def get_custom_object_names(self) -> List[str]:
+        """Get API names of the queryable custom objects with caching"""
+        cache_key = "custom_object_names.pkl"
+        cached_data = self.cache.load(cache_key)
+        if cached_data is not None:
+            return cached_data
+
+        try:
+            with span("describe_global"):
+                sobjects = self.sf.describe().get("sobjects", [])
+        except Exception as e:
+            print(f"Error listing custom objects: {str(e)}")
+            return []
+        names = sorted(
+            obj["name"]
+            for obj in sobjects
+            if obj.get("custom") and obj.get("queryable") and obj["name"].endswith("__c")
+        )
+        self.cache.save(names, cache_key)
+        return names
+
+    def get_metadata_components(
+        self, metadata_types: List[str], mode: str = "read"
+    ) -> Dict[str, List[Dict]]:
+        """Get Metadata API components of several types with caching per type"""
+        components = {}
+        missing = []
+        for metadata_type in metadata_types:
+            cached_data = self.cache.load(f"metadata_api_{metadata_type}.pkl")
+            if cached_data is None:
+                missing.append(metadata_type)
+            else:
+                components[metadata_type] = cached_data
+
+        if missing:
+            try:
+                fetched = MetadataClient(self.sf).fetch(missing, mode=mode)
+            except Exception as e:
+                print(f"Error retrieving {', '.join(missing)}: {str(e)}")
+                fetched = {}
+            for metadata_type in missing:
+                components[metadata_type] = fetched.get(metadata_type, [])
+                if metadata_type in fetched:
+                    self.cache.save(fetched[metadata_type], f"metadata_api_{metadata_type}.pkl")
+        return components
+
+    def get_permission_matrix(self) -> PermissionMatrix:
+        """Get the profile/permission set access matrix with caching"""
+        cache_key = "permission_matrix.pkl"
+        cached_data = self.cache.load(cache_key)
+        if cached_data is not None:
+            return cached_data
+
+        matrix = load_permission_matrix(self.sf)
+        self.cache.save(matrix, cache_key)
+        return matrix
+
+    def get_role_hierarchy(self) -> Hierarchy:
+        """Get the role hierarchy with user counts with caching"""
+        cache_key = "role_hierarchy.pkl"
+        cached_data = self.cache.load(cache_key)
+        if cached_data is not None:
+            return cached_data
+
+        hierarchy = load_role_hierarchy(self.sf)
+        self.cache.save(hierarchy, cache_key)
+        return hierarchy
+
+    def get_territory_hierarchy(self) -> Hierarchy:
+        """Get the territory hierarchy of the active model with caching"""
+        cache_key = "territory_hierarchy.pkl"
+        cached_data = self.cache.load(cache_key)
+        if cached_data is not None:
+            return cached_data
+
+        hierarchy = load_territory_hierarchy(self.sf)
+        self.cache.save(hierarchy, cache_key)
+        return hierarchy
+
+    def get_apex_inventory(self) -> Dict:
+        """
+        Get Apex classes, triggers, tests and coverage with caching
+
+        An expired inventory is still used to look up the class analysis, so
+        only classes modified since the last run have their body fetched.
+        """
+        cache_key = "apex_inventory.pkl"
+        cached_data = self.cache.load(cache_key)
+        if cached_data is not None:
+            return cached_data
+
+        previous = self.cache.load(cache_key, ttl=float("inf"))
+        try:
+            inventory = load_apex_inventory(self.sf, previous)
+        except Exception as e:
+            print(f"Error getting Apex inventory: {str(e)}")
+            return previous or {}
+        self.cache.save(inventory, cache_key)
+        return inventory
 
     def get_last_modified_date(self, object_name: str) -> Optional[str]:
         """Get the last modified date for any record in the object"""
         try:
-            result = self.sf.query(
-                f"SELECT LastModifiedDate FROM {object_name} "
-                "ORDER BY LastModifiedDate DESC LIMIT 1"
-            )
-            records = result.get("records", [])
+            with span("soql_query", object=object_name):
+                records = query_all(
+                    self.sf,
+                    f"SELECT LastModifiedDate FROM {object_name} "
+                    "ORDER BY LastModifiedDate DESC LIMIT 1",
+                )
             if records:
                 return records[0].get("LastModifiedDate")
         except Exception as e:
@@ -238,68 +412,48 @@ class SalesforceMetadata:
     def get_record_count(self, object_name: str) -> int:
         """Get total number of records for an object"""
         try:
-            result = self.sf.query(f"SELECT COUNT() FROM {object_name}")
-            return result.get("totalSize", 0)
+            with span("soql_query", object=object_name):
+                return query_count(self.sf, f"SELECT COUNT() FROM {object_name}")
         except Exception as e:
             print(f"Error getting record count for {object_name}: {str(e)}")
             return 0
 
-    def _is_queryable_field(
-        self, object_name: str, field_name: str, field_type: str
-    ) -> bool:
-        """Determine if a field can be queried"""
-        # Check if field is in non-queryable set for this object
-        if field_name in self.NON_QUERYABLE_FIELDS.get(object_name, set()):
-            return False
-
-        non_queryable_types = {
-            "address",
-            "location",
-            "encrypted",
-            "textarea",
-            "calculated",
-            "complexvalue",
-            "datacategorygroupreference",
-        }
-
-        return field_type.lower() not in non_queryable_types
-
     def _get_field_usage_batch(
-        self, object_name: str, fields: List[Dict]
+        self, object_name: str, fields: List[Dict], record_count: Optional[int] = None
     ) -> Dict[str, float]:
-        """Get field usage statistics in optimized batches"""
-        usage_stats = {}
-        queryable_fields = [
-            f["name"]
-            for f in fields
-            if self._is_queryable_field(object_name, f["name"], f.get("type", ""))
-        ]
-
-        # Process fields in smaller batches to avoid query limits
-        batch_size = 3  # Reduced batch size
-        for i in range(0, len(queryable_fields), batch_size):
-            batch = queryable_fields[i : i + batch_size]
-            if not batch:
-                continue
-
-            query_conditions = " OR ".join([f"{field} != null" for field in batch])
+        """Get field usage statistics in batches, isolating fields Salesforce rejects"""
+        if record_count is None:
+            record_count = self.get_record_count(object_name)
+        usage_stats, stats = count_usage(
+            lambda query: query_count(self.sf, query),
+            object_name,
+            fields,
+            record_count,
+            self.non_queryable,
+        )
+        if stats["learned"]:
+            print(
+                f"Excluded {stats['learned']} fields of {object_name} that cannot be "
+                "filtered on from future usage queries"
+            )
+        return usage_stats
 
-            try:
-                query = f"SELECT COUNT() FROM {object_name} WHERE {query_conditions}"
-                result = self.sf.query(query)
-                total_records = result.get("totalSize", 0)
-                record_count = self.get_record_count(object_name)
-
-                for field in batch:
-                    usage_stats[field] = (
-                        (total_records / record_count * 100) if record_count > 0 else 0
-                    )
-            except Exception as e:
-                print(f"Error in batch query for {object_name}: {str(e)}")
-                for field in batch:
-                    usage_stats[field] = 0
+    def get_field_usage(
+        self, object_name: str, fields: Optional[List[Dict]] = None, record_count: Optional[int] = None
+    ) -> Dict[str, float]:
+        """Get usage percentage of the fields of an object with caching"""
+        cache_key = f"field_usage_{object_name}.pkl"
+        cached_data = self.cache.load(cache_key)
+        if cached_data is not None:
+            return cached_data
 
-        return usage_stats
+        if fields is None:
+            metadata = self.get_object_metadata(object_name) or {}
+            fields = metadata.get("fields") or []
+            record_count = metadata.get("record_count", record_count)
+        usage = self._get_field_usage_batch(object_name, fields, record_count)
+        self.cache.save(usage, cache_key)
+        return usage
 
     def _get_relationships(self, describe_result: Dict) -> List[Dict]:
         """Extract relationship information"""
@@ -320,19 +474,20 @@ class SalesforceMetadata:
     def _get_validation_rules(self, object_name: str) -> List[Dict]:
         """Fetch validation rules for the object"""
         try:
-            tooling_query = f"""
-                SELECT Id, Active, Description, ErrorDisplayField, ErrorMessage
-                FROM ValidationRule 
-                WHERE EntityDefinition.QualifiedApiName = '{object_name}'
-            """
-            result = self.sf.restful(f"tooling/query/?q={tooling_query}")
+            tooling_query = (
+                "SELECT Id, Active, Description, ErrorDisplayField, ErrorMessage "
+                "FROM ValidationRule "
+                f"WHERE EntityDefinition.QualifiedApiName = '{object_name}'"
+            )
+            with span("tooling_query", object=object_name):
+                records = query_all(self.sf, tooling_query, tooling=True)
             return [
                 {
                     "name": rule.get("ErrorDisplayField", ""),
                     "message": rule.get("ErrorMessage", ""),
                     "active": rule.get("Active", False),
                 }
-                for rule in result.get("records", [])
+                for rule in records
             ]
         except Exception as e:
             print(f"Error getting validation rules for {object_name}: {str(e)}")
@@ -347,15 +502,21 @@ class SalesforceMetadata:
             return cached_data
 
         try:
-            describe_result = self.sf.__getattr__(object_name).describe()
+            with span("describe", object=object_name):
+                describe_result = self.sf.__getattr__(object_name).describe()
 
+            dates = self.get_object_dates().get(object_name) or {}
             metadata = {
                 "label": describe_result.get("label", object_name),
                 "api_name": describe_result.get("name", object_name),
                 "description": describe_result.get("description", ""),
                 "record_count": self.get_record_count(object_name),
+                # Latest record change, unlike modified_date which is the
+                # last change to the object definition
                 "last_modified_date": self.get_last_modified_date(object_name),
-                "fields": describe_result.get("fields", []),
+                "created_date": dates.get("created"),
+                "modified_date": dates.get("modified"),
+                "fields": cache_value_sets(self.cache, describe_result.get("fields", [])),
                 "relationships": self._get_relationships(describe_result),
                 "validation_rules": self._get_validation_rules(object_name),
             }
@@ -375,37 +536,63 @@ class SalesforceDocGenerator:
         security_token: str,
         cache_config: Optional[CacheConfig] = None,
         template_path: Optional[str] = None,
+        sf_connection: Optional[Salesforce] = None,
+        cassette: Optional[str] = None,
+        cassette_mode: Optional[str] = None,
+        table_mode: str = "markdown",
+        docs_dir: str = "docs",
+        pipeline_workers: Optional[Dict[str, int]] = None,
     ):
-        self.sf = Salesforce(
-            username=username, password=password, security_token=security_token
+        if table_mode not in TABLE_MODES:
+            raise ValueError(f"Unknown table mode {table_mode!r}, expected one of {TABLE_MODES}")
+        self.sf = sf_connection or connect(
+            username=username,
+            password=password,
+            security_token=security_token,
+            cassette=cassette,
+            cassette_mode=cassette_mode,
         )
         self.cache = SalesforceCache(cache_config or CacheConfig())
         self.metadata = SalesforceMetadata(self.sf, self.cache)
         self.template_path = template_path or "templates/standard_objects.md"
         self.env = Environment()
-
-    def generate_documentation(self, objects: Optional[List[str]] = None) -> str:
+        self.table_mode = table_mode
+        self.docs_dir = docs_dir
+        self.pipeline_workers = dict(PIPELINE_WORKERS, **(pipeline_workers or {}))
+
+    def generate_documentation(
+        self, objects: Optional[List[str]] = None, output_path: Optional[str] = None
+    ) -> str:
+        """Render the template; in json table mode large tables go to files next to output_path"""
         try:
             if not objects:
                 objects = self._get_core_sales_objects()
 
-            metadata_list = []
-            for obj in objects:
-                try:
-                    if metadata := self.metadata.get_object_metadata(obj):
-                        metadata_list.append(metadata)
-                except Exception as e:
-                    print(f"Error processing {obj}: {str(e)}")
-                    continue
+            # The objects of the one page are fetched on the pipeline's fetch
+            # workers; the dates are loaded first so the workers share them
+            self.metadata.get_object_dates()
+            metadata_list = Pipeline(
+                [Stage("fetch", self.metadata.get_object_metadata, self.pipeline_workers["fetch"])]
+            ).run(objects)
 
             data = {
                 "generation_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 "objects": metadata_list,
             }
+            if self.table_mode == "json" and output_path:
+                data["data_table"] = table_function(output_path, metadata_list, self.docs_dir)
+
+            created, modified = page_dates(
+                [
+                    {"created": m.get("created_date"), "modified": m.get("modified_date")}
+                    for m in metadata_list
+                ]
+            )
 
-            with open(self.template_path) as f:
-                template = Template(f.read())
-            return template.render(**data)
+            with span("render", template=self.template_path):
+                with open(self.template_path) as f:
+                    template = Template(f.read())
+                return front_matter(created, modified) + template.render(**data)
         except Exception as e:
             print(f"Error generating documentation: {str(e)}")
             return f"Error generating documentation: {str(e)}"
@@ -422,13 +609,35 @@ class SalesforceDocGenerator:
             "User",
         ]
 
+    def warm_cache(
+        self, api_budget: Optional[int] = None, workers: int = DEFAULT_WORKERS
+    ) -> Dict[str, int]:
+        """
+        Fetch object metadata into the cache, core objects first
+
+        Args:
+            api_budget: API requests the warm-up may use (default: unlimited)
+            workers: Objects fetched at the same time
+
+        Returns:
+            Number of objects warmed, already cached, failed and not started
+        """
+        budget = ApiBudget(api_budget)
+        budget.attach(self.sf.session)
+        warmer = CacheWarmer(self.metadata, self._get_core_sales_objects(), budget, workers)
+        try:
+            with span("warm_cache", workers=workers):
+                return warmer.run()
+        finally:
+            budget.detach(self.sf.session)
+
     def save_documentation(self, output_path: str):
         try:
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            documentation = self.generate_documentation()
-            with open(output_path, "w", encoding="utf-8") as f:
-                f.write(documentation)
-            print(f"Documentation saved to {output_path}")
+            documentation = self.generate_documentation(output_path=output_path)
+            if get_writer().write(output_path, documentation):
+                print(f"Documentation saved to {output_path}")
+            else:
+                print(f"Documentation unchanged at {output_path}")
             return documentation
         except Exception as e:
             print(f"Error saving documentation: {str(e)}")
@@ -441,6 +650,9 @@ def setup_documentation_generator(
     security_token: str,
     cache_dir: Optional[str] = None,
     template_path: Optional[str] = None,
+    cassette: Optional[str] = None,
+    cassette_mode: Optional[str] = None,
+    table_mode: str = "markdown",
 ) -> SalesforceDocGenerator:
     config = CacheConfig(cache_dir=cache_dir) if cache_dir else CacheConfig()
     return SalesforceDocGenerator(
@@ -449,6 +661,9 @@ def setup_documentation_generator(
         security_token=security_token,
         cache_config=config,
         template_path=template_path,
+        cassette=cassette,
+        cassette_mode=cassette_mode,
+        table_mode=table_mode,
     )
 
 
@@ -462,4 +677,12 @@ if __name__ == "__main__":
     )
     ensure_map_paths_exist(metadata_type_to_docs_path, metadata_type_to_template_path)
 
+    # Pages shared by several metadata types are rendered in one pass
+    PageAssembler(
+        generator.metadata,
+        metadata_type_to_docs_path,
+        metadata_type_to_template_path,
+        table_mode=generator.table_mode,
+    ).assemble()
     generator.save_documentation("output/salesforce_documentation.md")
+    print(get_tracer().summary_table())
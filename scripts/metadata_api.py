@@ -0,0 +1,331 @@
+"""
+Metadata API retrieval
+
+Layouts, profiles, flows and permission sets are not available through the
+REST describe calls, so they are read through the SOAP Metadata API:
+
+    1. listMetadata enumerates the components of each type (up to three
+       types per call).
+    2. The components are read either with readMetadata in batches of the
+       maximum size (10 per call) or with one zip retrieve per type. The
+       retrieved zip is kept in memory and every file is parsed as a stream
+       straight from the archive, nothing is extracted to disk.
+
+Each metadata type is retrieved on its own worker thread. Components are
+returned as plain dicts (XML elements converted to dicts, repeated elements
+to lists) keyed by metadata type.
+"""
+
+import base64
+import io
+import logging
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree as ET
+from xml.sax.saxutils import escape
+
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+METADATA_NS = "http://soap.sforce.com/2006/04/metadata"
+SOAP_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+XSI_NS = "http://www.w3.org/2001/XMLSchema-instance"
+
+RETRIEVE_MODES = ("read", "retrieve")
+
+# API limits
+LIST_METADATA_QUERIES = 3
+READ_METADATA_BATCH = 10
+
+# Seconds a retrieve may take before it is given up
+DEFAULT_RETRIEVE_TIMEOUT = 600.0
+
+# Retrieve states after which checkRetrieveStatus will not change anymore
+FINISHED_STATES = ("Succeeded", "Failed", "Canceled")
+
+# Folder and file suffix of each type inside a retrieved zip
+ZIP_LAYOUT = {
+    "ApexClass": ("classes", ".cls-meta.xml"),
+    "ApexTrigger": ("triggers", ".trigger-meta.xml"),
+    "CustomObject": ("objects", ".object"),
+    "Flow": ("flows", ".flow"),
+    "Layout": ("layouts", ".layout"),
+    "PermissionSet": ("permissionsets", ".permissionset"),
+    "Profile": ("profiles", ".profile"),
+}
+
+# Elements that can repeat; always lists, even with a single entry
+LIST_ELEMENTS = {
+    "actionCalls",
+    "applicationVisibilities",
+    "assignments",
+    "classAccesses",
+    "customPermissions",
+    "decisions",
+    "fieldPermissions",
+    "fields",
+    "layoutAssignments",
+    "layoutColumns",
+    "layoutItems",
+    "layoutSections",
+    "listViews",
+    "objectPermissions",
+    "pageAccesses",
+    "platformActionListItems",
+    "quickActionListItems",
+    "recordCreates",
+    "recordDeletes",
+    "recordLookups",
+    "recordTypeVisibilities",
+    "recordTypes",
+    "recordUpdates",
+    "relatedLists",
+    "rules",
+    "screens",
+    "subflows",
+    "tabSettings",
+    "tabVisibilities",
+    "userPermissions",
+    "validationRules",
+    "webLinks",
+}
+
+ENVELOPE = """<?xml version="1.0" encoding="utf-8"?>
+<soapenv:Envelope xmlns:soapenv="{soap}" xmlns:met="{ns}" xmlns:xsi="{xsi}">
+<soapenv:Header>
+<met:SessionHeader><met:sessionId>{session_id}</met:sessionId></met:SessionHeader>
+</soapenv:Header>
+<soapenv:Body>{body}</soapenv:Body>
+</soapenv:Envelope>"""
+
+
+class MetadataApiError(Exception):
+    """SOAP fault or failed retrieve returned by the Metadata API"""
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _value(text: Optional[str]):
+    if text == "true":
+        return True
+    if text == "false":
+        return False
+    return text
+
+
+def element_to_dict(element: ET.Element):
+    """Convert a metadata XML element to dicts, lists and scalars"""
+    children = list(element)
+    if not children:
+        return _value(element.text)
+    result: Dict = {}
+    for child in children:
+        key = _local(child.tag)
+        value = element_to_dict(child)
+        if key in LIST_ELEMENTS:
+            result.setdefault(key, []).append(value)
+        elif key in result:
+            if not isinstance(result[key], list):
+                result[key] = [result[key]]
+            result[key].append(value)
+        else:
+            result[key] = value
+    return result
+
+
+def iter_zip_components(
+    data: bytes, metadata_type: str
+) -> Iterator[Tuple[str, Dict]]:
+    """
+    Yield (full name, component) for every file of a type in a retrieve zip
+
+    Args:
+        data: Zip file returned by checkRetrieveStatus
+        metadata_type: Metadata type the zip was retrieved for
+
+    Yields:
+        Component full name and its contents as a dict
+    """
+    folder, suffix = ZIP_LAYOUT.get(metadata_type, ("", ""))
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            directory, _, file_name = name.rpartition("/")
+            if info.is_dir() or not file_name.endswith(suffix or ".xml"):
+                continue
+            if folder and directory.rsplit("/", 1)[-1] != folder:
+                continue
+            # Decompressed and parsed chunk by chunk, straight from the archive
+            with archive.open(info) as stream:
+                root = ET.parse(stream).getroot()
+            component = element_to_dict(root)
+            if not isinstance(component, dict):
+                component = {}
+            full_name = file_name[: -len(suffix)] if suffix else file_name
+            component.setdefault("fullName", full_name)
+            yield full_name, component
+
+
+class MetadataClient:
+    """Minimal SOAP client for listMetadata, readMetadata and retrieve"""
+
+    def __init__(
+        self,
+        sf,
+        max_workers: int = 4,
+        poll_interval: float = 2.0,
+        retrieve_timeout: float = DEFAULT_RETRIEVE_TIMEOUT,
+    ):
+        """
+        Args:
+            sf: simple_salesforce connection
+            max_workers: Metadata types retrieved at the same time
+            poll_interval: Seconds between checkRetrieveStatus calls
+            retrieve_timeout: Seconds to wait for a retrieve to finish
+        """
+        self.sf = sf
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.retrieve_timeout = retrieve_timeout
+        self.url = f"https://{sf.sf_instance}/services/Soap/m/{sf.sf_version}"
+
+    def _call(self, action: str, body: str) -> ET.Element:
+        envelope = ENVELOPE.format(
+            soap=SOAP_NS, ns=METADATA_NS, xsi=XSI_NS, session_id=self.sf.session_id, body=body
+        )
+        with span("metadata_api", action=action):
+            response = self.sf.session.post(
+                self.url,
+                data=envelope.encode("utf-8"),
+                headers={"Content-Type": "text/xml; charset=UTF-8", "SOAPAction": action},
+            )
+        root = ET.fromstring(response.content)
+        fault = root.find(f"{{{SOAP_NS}}}Body/{{{SOAP_NS}}}Fault")
+        if fault is not None:
+            raise MetadataApiError(fault.findtext("faultstring") or response.text)
+        if response.status_code >= 400:
+            raise MetadataApiError(f"{action} failed with HTTP {response.status_code}")
+        return root.find(f"{{{SOAP_NS}}}Body")[0]
+
+    def list_metadata(self, metadata_types: List[str]) -> Dict[str, List[str]]:
+        """
+        Enumerate the components of metadata types
+
+        Returns:
+            Metadata type -> sorted component full names
+        """
+        names: Dict[str, List[str]] = {t: [] for t in metadata_types}
+        for i in range(0, len(metadata_types), LIST_METADATA_QUERIES):
+            batch = metadata_types[i : i + LIST_METADATA_QUERIES]
+            queries = "".join(
+                f"<met:queries><met:type>{escape(t)}</met:type></met:queries>" for t in batch
+            )
+            result = self._call(
+                "listMetadata",
+                f"<met:listMetadata>{queries}"
+                f"<met:asOfVersion>{self.sf.sf_version}</met:asOfVersion></met:listMetadata>",
+            )
+            for item in result.findall(f"{{{METADATA_NS}}}result"):
+                metadata_type = item.findtext(f"{{{METADATA_NS}}}type")
+                full_name = item.findtext(f"{{{METADATA_NS}}}fullName")
+                if metadata_type in names and full_name:
+                    names[metadata_type].append(full_name)
+        return {t: sorted(n) for t, n in names.items()}
+
+    def read_metadata(self, metadata_type: str, full_names: List[str]) -> List[Dict]:
+        """Read components with readMetadata in batches of the maximum size"""
+        components = []
+        for i in range(0, len(full_names), READ_METADATA_BATCH):
+            batch = full_names[i : i + READ_METADATA_BATCH]
+            names = "".join(f"<met:fullNames>{escape(n)}</met:fullNames>" for n in batch)
+            result = self._call(
+                "readMetadata",
+                f"<met:readMetadata><met:type>{escape(metadata_type)}</met:type>"
+                f"{names}</met:readMetadata>",
+            )
+            for record in result.iter(f"{{{METADATA_NS}}}records"):
+                component = element_to_dict(record)
+                # Components that do not exist come back without a fullName
+                if isinstance(component, dict) and component.get("fullName"):
+                    components.append(component)
+        return components
+
+    def retrieve(self, metadata_type: str, full_names: List[str]) -> List[Dict]:
+        """Retrieve components as one zip and parse it in memory"""
+        members = "".join(f"<met:members>{escape(n)}</met:members>" for n in full_names)
+        result = self._call(
+            "retrieve",
+            "<met:retrieve><met:retrieveRequest>"
+            f"<met:apiVersion>{self.sf.sf_version}</met:apiVersion>"
+            "<met:singlePackage>true</met:singlePackage>"
+            f"<met:unpackaged><met:types>{members}<met:name>{escape(metadata_type)}</met:name>"
+            "</met:types></met:unpackaged>"
+            "</met:retrieveRequest></met:retrieve>",
+        )
+        process_id = result.findtext(f"{{{METADATA_NS}}}result/{{{METADATA_NS}}}id")
+
+        deadline = time.monotonic() + self.retrieve_timeout
+        while True:
+            status = self._call(
+                "checkRetrieveStatus",
+                f"<met:checkRetrieveStatus><met:asyncProcessId>{process_id}</met:asyncProcessId>"
+                "<met:includeZip>true</met:includeZip></met:checkRetrieveStatus>",
+            ).find(f"{{{METADATA_NS}}}result")
+            state = status.findtext(f"{{{METADATA_NS}}}status")
+            done = status.findtext(f"{{{METADATA_NS}}}done") == "true"
+            if done or state in FINISHED_STATES:
+                break
+            if time.monotonic() + self.poll_interval > deadline:
+                raise MetadataApiError(
+                    f"Retrieve of {metadata_type} still {state or 'pending'} after "
+                    f"{self.retrieve_timeout:g}s"
+                )
+            time.sleep(self.poll_interval)
+        if state != "Succeeded":
+            raise MetadataApiError(
+                status.findtext(f"{{{METADATA_NS}}}errorMessage")
+                or f"Retrieve of {metadata_type} {(state or 'failed').lower()}"
+            )
+
+        data = base64.b64decode(status.findtext(f"{{{METADATA_NS}}}zipFile") or "")
+        return [component for _, component in iter_zip_components(data, metadata_type)]
+
+    def fetch(self, metadata_types: List[str], mode: str = "read") -> Dict[str, List[Dict]]:
+        """
+        Enumerate and read all components of several metadata types
+
+        Args:
+            metadata_types: Metadata API type names (Layout, Profile, ...)
+            mode: "read" for readMetadata batches, "retrieve" for zip retrieves
+
+        Returns:
+            Metadata type -> components; types that failed are left out
+        """
+        if mode not in RETRIEVE_MODES:
+            raise ValueError(f"Unknown retrieve mode {mode!r}, expected one of {RETRIEVE_MODES}")
+        names = self.list_metadata(list(metadata_types))
+        read = self.read_metadata if mode == "read" else self.retrieve
+
+        def fetch_type(metadata_type: str) -> Optional[List[Dict]]:
+            if not names[metadata_type]:
+                return []
+            try:
+                return read(metadata_type, names[metadata_type])
+            except Exception as e:
+                logger.error(f"Error retrieving {metadata_type}: {str(e)}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = {
+                metadata_type: components
+                for metadata_type, components in zip(names, executor.map(fetch_type, names))
+                if components is not None
+            }
+        for metadata_type, components in results.items():
+            logger.info(f"Retrieved {len(components)} {metadata_type} components")
+        return results
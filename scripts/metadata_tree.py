@@ -0,0 +1,152 @@
+"""
+Hashed metadata trees and their diff
+
+Org metadata is seen as a tree of hashes:
+
+    org                 hash of its (object, object hash) pairs
+      object            hash of its (group, group hash) pairs
+        group           properties, fields, record_types, validation_rules,
+                        child_relationships; hash of its (item, item hash) pairs
+          item          hash of one field, rule, ... (canonical JSON)
+
+Equal hashes mean equal subtrees, so a diff compares the object hashes and
+only descends into the objects, and then the groups, whose hashes differ.
+Snapshots store the object and group hashes in their index (see
+org_snapshot), so unchanged objects are never loaded; item hashes are
+computed only for the groups that changed.
+
+Record counts and the created/modified dates are left out of the hashes,
+they change without the metadata changing.
+"""
+
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
+
+# Object properties compared in the "properties" group
+OBJECT_PROPERTIES = (
+    "label",
+    "plural_label",
+    "custom",
+    "description",
+    "sharing_model",
+    "searchable",
+    "deletable",
+    "feed_enabled",
+)
+
+GROUPS = ("properties", "fields", "record_types", "validation_rules", "child_relationships")
+
+CHANGE_KINDS = ("added", "removed", "changed")
+
+
+def digest(value) -> str:
+    """Hash of a JSON-serializable value, independent of dict key order"""
+    data = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def combine(hashes: Dict[str, str]) -> str:
+    """Hash of a node from the names and hashes of its children"""
+    return digest(sorted(hashes.items()))
+
+
+def group_items(metadata: Dict, group: str) -> Dict[str, object]:
+    """Items of one group of an object, keyed by a name unique in the group"""
+    if group == "properties":
+        return {name: metadata.get(name) for name in OBJECT_PROPERTIES}
+    if group == "child_relationships":
+        relationships = (metadata.get("relationships") or {}).get("child_relationships") or []
+        return {f"{r.get('label')}.{r.get('api_name')}": r for r in relationships}
+    return {item.get("api_name"): item for item in metadata.get(group) or []}
+
+
+def item_hashes(metadata: Dict, group: str) -> Dict[str, str]:
+    return {name: digest(item) for name, item in group_items(metadata, group).items()}
+
+
+def object_hashes(metadata: Dict) -> Tuple[str, Dict[str, str]]:
+    """(object hash, group -> group hash) of one object's metadata"""
+    groups = {group: combine(item_hashes(metadata, group)) for group in GROUPS}
+    return combine(groups), groups
+
+
+class MetadataTree:
+    """
+    Object and group hashes of an org, with the object metadata loaded on demand
+
+    Args:
+        hashes: object -> (object hash, group -> group hash)
+        load: Function returning the metadata of one object
+    """
+
+    def __init__(self, hashes: Dict[str, Tuple[str, Dict[str, str]]], load):
+        self.hashes = hashes
+        self.load = load
+        self.root = combine({name: object_hash for name, (object_hash, _) in hashes.items()})
+
+
+def _attribute_changes(old, new) -> List[Tuple[str, object, object]]:
+    """(attribute, old, new) of the attributes that differ, attribute None for plain values"""
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return [(None, old, new)]
+    return [
+        (key, old.get(key), new.get(key))
+        for key in sorted(set(old) | set(new))
+        if old.get(key) != new.get(key)
+    ]
+
+
+def diff_trees(old: MetadataTree, new: MetadataTree) -> List[Dict]:
+    """
+    Changes between two metadata trees
+
+    Returns:
+        Changes sorted by object, group and item; each is a dict with
+        object, group (None for whole objects), item, kind and, for changed
+        items, the (attribute, old, new) list under "attributes"
+    """
+    changes: List[Dict] = []
+    if old.root == new.root:
+        return changes
+
+    for name in sorted(set(old.hashes) | set(new.hashes)):
+        before, after = old.hashes.get(name), new.hashes.get(name)
+        if before is None or after is None:
+            kind = "added" if before is None else "removed"
+            changes.append({"object": name, "group": None, "item": None, "kind": kind})
+            continue
+        if before[0] == after[0]:
+            continue
+
+        old_metadata: Optional[Dict] = None
+        new_metadata: Optional[Dict] = None
+        for group in GROUPS:
+            if before[1].get(group) == after[1].get(group):
+                continue
+            # Only objects with a changed group are ever loaded
+            old_metadata = old_metadata if old_metadata is not None else old.load(name)
+            new_metadata = new_metadata if new_metadata is not None else new.load(name)
+            old_items = group_items(old_metadata, group)
+            new_items = group_items(new_metadata, group)
+            for item in sorted(set(old_items) | set(new_items), key=str):
+                change = {"object": name, "group": group, "item": item}
+                if item not in new_items:
+                    change["kind"] = "removed"
+                elif item not in old_items:
+                    change["kind"] = "added"
+                elif old_items[item] != new_items[item]:
+                    change["kind"] = "changed"
+                    change["attributes"] = _attribute_changes(old_items[item], new_items[item])
+                else:
+                    continue
+                changes.append(change)
+    return changes
+
+
+def summarize(changes: List[Dict]) -> Dict[str, int]:
+    """Number of changes of each kind"""
+    counts = {kind: 0 for kind in CHANGE_KINDS}
+    for change in changes:
+        counts[change["kind"]] += 1
+    return counts
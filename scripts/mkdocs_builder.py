@@ -0,0 +1,445 @@
+"""
+In-process, incremental MkDocs builds
+
+MkDocsBuilder loads mkdocs.yml once and keeps the config and plugin instances
+between builds. Each build compares the documentation sources with a content
+hash manifest from the previous build and only reads, renders and writes the
+pages whose source changed. A full build is done when the config or theme
+overrides change, when pages are added or removed, or when the site directory
+is missing.
+
+Every plugin event handler is timed, so the cost of each plugin (minify,
+git-revision-date, mermaid2, search, ...) can be printed after a build.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from functools import wraps
+from urllib.parse import urlsplit
+
+import mkdocs.commands.build
+import mkdocs.config
+from mkdocs.livereload import LiveReloadServer
+from mkdocs.plugins import BasePlugin, event_priority
+
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+
+class _DirtyWarningFilter(logging.Filter):
+    """
+    Drop MkDocs' warning about dirty builds
+
+    Unlike a plain --dirty build, navigation stays correct here because any
+    added or removed page triggers a full rebuild. The warning would also
+    abort builds in strict mode.
+    """
+
+    def filter(self, record):
+        return "A 'dirty' build is being performed" not in record.getMessage()
+
+
+logging.getLogger("mkdocs.commands.build").addFilter(_DirtyWarningFilter())
+
+MANIFEST_VERSION = 1
+INCREMENTAL_PLUGIN = "sfdocs/incremental"
+
+
+def _file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class _IncrementalPlugin(BasePlugin):
+    """Internal plugin connecting the MkDocs build to MkDocsBuilder"""
+
+    def __init__(self, builder):
+        super().__init__()
+        self.builder = builder
+
+    # Runs after other plugins so the files they add are seen too
+    @event_priority(-100)
+    def on_files(self, files, config):
+        return self.builder._mark_unchanged(files)
+
+    @event_priority(-100)
+    def on_nav(self, nav, config, files):
+        self.builder._restore_titles(files)
+        return nav
+
+    # Runs before the search plugin writes its index
+    @event_priority(100)
+    def on_post_build(self, config):
+        self.builder._carry_search_entries()
+
+
+class MkDocsBuilder:
+    """Build or serve the MkDocs site without leaving the process"""
+
+    def __init__(
+        self,
+        config_file="mkdocs.yml",
+        site_dir=None,
+        manifest_path=os.path.join(".sf_cache", "mkdocs_manifest.json"),
+    ):
+        """
+        Initialize the builder
+
+        Args:
+            config_file (str): Path to mkdocs.yml
+            site_dir (str, optional): Override the site_dir from the config
+            manifest_path (str): Where the page hash manifest is kept
+        """
+        self.config_file = config_file
+        self.site_dir = site_dir
+        self.manifest_path = manifest_path
+        self.config = None
+        self.manifest = self._load_manifest()
+        self.plugin_timings = defaultdict(lambda: [0, 0.0])
+        self.last_build = {}
+        self._config_mtime = None
+        self._started = False
+        self._incremental = False
+        self._pages = {}
+        self._files = None
+        self._search_entries = {}
+
+    def load(self, command="build"):
+        """
+        Load mkdocs.yml and register the incremental and timing hooks
+
+        Args:
+            command (str): Command passed to the plugins' startup event
+        """
+        kwargs = {"site_dir": self.site_dir} if self.site_dir else {}
+        self.config = mkdocs.config.load_config(self.config_file, **kwargs)
+        self._config_mtime = os.path.getmtime(self.config.config_file_path)
+        self.config.plugins[INCREMENTAL_PLUGIN] = _IncrementalPlugin(self)
+        if not self._started:
+            # Plugins with startup/shutdown events are kept by MkDocs across
+            # config reloads, so they are started only once. dirty is False
+            # because unchanged pages are handled here, not by the plugins.
+            self.config.plugins.on_startup(command=command, dirty=False)
+            self._started = True
+        self._time_plugins()
+        return self.config
+
+    def _config_changed(self):
+        return (
+            self.config is None
+            or os.path.getmtime(self.config.config_file_path) != self._config_mtime
+        )
+
+    def _time_plugins(self):
+        """Wrap every registered event handler to record its run time"""
+        owners = {id(plugin): name for name, plugin in self.config.plugins.items()}
+        for event, handlers in self.config.plugins.events.items():
+            for i, handler in enumerate(handlers):
+                if getattr(handler, "_sfdocs_timed", False):
+                    continue
+                owner = getattr(handler, "__self__", None)
+                name = owners.get(id(owner)) or getattr(handler, "__module__", "unknown")
+                handlers[i] = self._timed(name, event, handler)
+
+    def _timed(self, name, event, handler):
+        timing = self.plugin_timings[(name, event)]
+
+        @wraps(handler)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                timing[0] += 1
+                timing[1] += time.perf_counter() - start
+
+        wrapper._sfdocs_timed = True
+        return wrapper
+
+    def _theme_signature(self):
+        """Hash of mkdocs.yml and the theme override files"""
+        digest = hashlib.sha1()
+        with open(self.config.config_file_path, "rb") as f:
+            digest.update(f.read())
+        custom_dir = self.config.theme.custom_dir
+        if custom_dir and os.path.isdir(custom_dir):
+            for root, dirs, files in os.walk(custom_dir):
+                dirs.sort()
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    digest.update(f"{path}\0{stat.st_mtime_ns}\0{stat.st_size}\0".encode())
+        return digest.hexdigest()
+
+    def build(self, full=False, live_server=None):
+        """
+        Build the site, re-rendering only changed pages when possible
+
+        Args:
+            full (bool): Force a full, clean build
+            live_server (LiveReloadServer, optional): Server when serving
+
+        Returns:
+            dict: Build statistics (pages, rebuilt, incremental, seconds)
+        """
+        if self._config_changed():
+            if self.config is not None:
+                logger.info("mkdocs.yml changed, reloading config")
+            # A changed config also changes the signature checked below
+            self.load(command="serve" if live_server else "build")
+
+        signature = self._theme_signature()
+        site_dir = os.path.abspath(self.config.site_dir)
+        if (
+            self.manifest.get("signature") != signature
+            or self.manifest.get("site_dir") != site_dir
+            or not os.path.isfile(os.path.join(site_dir, "index.html"))
+        ):
+            full = True
+
+        self._incremental = not full
+        self._pages = {}
+        for timing in self.plugin_timings.values():
+            timing[0], timing[1] = 0, 0.0
+        self._files = None
+        start = time.perf_counter()
+        with span("mkdocs_build", incremental=self._incremental):
+            mkdocs.commands.build.build(
+                self.config, live_server=live_server, dirty=self._incremental
+            )
+        elapsed = time.perf_counter() - start
+
+        rebuilt = sum(1 for page in self._pages.values() if page["rebuilt"])
+        self.last_build = {
+            "pages": len(self._pages),
+            "rebuilt": rebuilt,
+            "incremental": self._incremental,
+            "seconds": elapsed,
+        }
+        self._save_manifest(signature, site_dir)
+        logger.info(
+            f"Built {rebuilt} of {len(self._pages)} pages in {elapsed:.2f}s"
+            f" ({'incremental' if self._incremental else 'full'} build)"
+        )
+        return self.last_build
+
+    def _mark_unchanged(self, files):
+        """on_files: hash the sources and flag pages that need rebuilding"""
+        self._files = files
+        previous = self.manifest.get("pages", {})
+        for file in files.documentation_pages():
+            stat = os.stat(file.abs_src_path)
+            old = previous.get(file.src_uri)
+            if old and old["mtime"] == stat.st_mtime_ns and old["size"] == stat.st_size:
+                digest = old["hash"]
+            else:
+                digest = _file_hash(file.abs_src_path)
+            self._pages[file.src_uri] = {
+                "hash": digest,
+                "mtime": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "dest": file.dest_uri,
+                # Same as Page.url, which the search entries are keyed on
+                "url": "" if file.url in (".", "./") else file.url,
+                "title": old.get("title") if old else None,
+                "rebuilt": True,
+            }
+
+        if not self._incremental:
+            return files
+
+        if set(previous) != set(self._pages):
+            # Navigation changes on every page, so render them all again
+            self._remove_stale(previous)
+            logger.info("Pages were added or removed, rebuilding all pages")
+            for file in files.documentation_pages():
+                file.is_modified = lambda: True
+            return files
+
+        for file in files.documentation_pages():
+            page = self._pages[file.src_uri]
+            unchanged = page["hash"] == previous[file.src_uri]["hash"] and os.path.isfile(
+                file.abs_dest_path
+            )
+            page["rebuilt"] = not unchanged
+            file.is_modified = (lambda: False) if unchanged else (lambda: True)
+        return files
+
+    def _remove_stale(self, previous):
+        site_dir = self.config.site_dir
+        for src_uri, page in previous.items():
+            if src_uri not in self._pages:
+                path = os.path.join(site_dir, page["dest"])
+                if os.path.isfile(path):
+                    os.remove(path)
+
+    def _restore_titles(self, files):
+        """on_nav: unchanged pages are not read, so reuse their last title"""
+        if not self._incremental:
+            return
+        for file in files.documentation_pages():
+            page = self._pages.get(file.src_uri)
+            if file.page is not None and page and not page["rebuilt"] and page["title"]:
+                file.page.title = page["title"]
+
+    def _search_plugins(self):
+        return [
+            plugin
+            for plugin in self.config.plugins.values()
+            if hasattr(getattr(plugin, "search_index", None), "generate_search_index")
+        ]
+
+    def _carry_search_entries(self):
+        """
+        on_post_build: keep search entries of pages that were not rebuilt
+
+        The search plugins only index the pages rendered in this build, so
+        entries of unchanged pages are carried over from the previous build.
+        """
+        if self._files is not None:
+            for file in self._files.documentation_pages():
+                page = self._pages.get(file.src_uri)
+                if page and file.page is not None and file.page.title:
+                    page["title"] = file.page.title
+
+        for plugin in self._search_plugins():
+            index = plugin.search_index
+            entries = index.entries if hasattr(index, "entries") else index._entries
+            key = type(plugin).__module__
+            carried = self._search_entries.get(key) or self._read_search_index()
+            if self._incremental and carried:
+                live = {page["url"] for page in self._pages.values()}
+                rebuilt = {page["url"] for page in self._pages.values() if page["rebuilt"]}
+                kept = [
+                    entry
+                    for entry in carried
+                    if entry["location"].split("#")[0] in live - rebuilt
+                ]
+                entries[:0] = kept
+            self._search_entries[key] = list(entries)
+
+    def _read_search_index(self):
+        """
+        Entries of the index written by the previous build, if any
+
+        When the search_shards hook has split the index, search_index.json
+        only holds shortened entries and the full ones are in the shards.
+        """
+        if not self._incremental:
+            return []
+        search_dir = os.path.join(self.config.site_dir, "search")
+        try:
+            with open(os.path.join(search_dir, "shards.json"), "r") as f:
+                shards = json.load(f)["shards"].values()
+        except (OSError, ValueError, KeyError):
+            shards = [{"file": "search_index.json"}]
+        docs = []
+        try:
+            for shard in shards:
+                with open(os.path.join(search_dir, shard["file"]), "r") as f:
+                    docs.extend(json.load(f).get("docs", []))
+        except (OSError, ValueError):
+            return []
+        return docs
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get("version") != MANIFEST_VERSION:
+            return {}
+        return manifest
+
+    def _save_manifest(self, signature, site_dir):
+        self.manifest = {
+            "version": MANIFEST_VERSION,
+            "signature": signature,
+            "site_dir": site_dir,
+            "pages": {
+                src_uri: {k: v for k, v in page.items() if k != "rebuilt"}
+                for src_uri, page in self._pages.items()
+            },
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)), exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, separators=(",", ":"))
+        os.replace(tmp_path, self.manifest_path)
+
+    def serve(self, host=None, port=None):
+        """
+        Build the site and serve it with live reload
+
+        Rebuilds triggered by file changes go through build(), so only the
+        changed pages are rendered again.
+
+        Args:
+            host (str, optional): Override the dev_addr host
+            port (int, optional): Override the dev_addr port
+        """
+        if self._config_changed():
+            self.load(command="serve")
+        dev_host, dev_port = self.config.dev_addr
+        mount_path = urlsplit(self.config.site_url or "/").path
+
+        def builder(config=None):
+            self.build(live_server=server)
+
+        server = LiveReloadServer(
+            builder=builder,
+            host=host or dev_host,
+            port=port or dev_port,
+            root=self.config.site_dir,
+            mount_path=mount_path,
+        )
+        try:
+            builder()
+            server.watch(self.config.docs_dir)
+            server.watch(self.config.config_file_path)
+            if self.config.theme.custom_dir:
+                server.watch(self.config.theme.custom_dir)
+            server = self.config.plugins.on_serve(server, config=self.config, builder=builder)
+            for item in self.config.watch:
+                server.watch(item)
+            try:
+                server.serve()
+            except KeyboardInterrupt:
+                logger.info("Shutting down...")
+            finally:
+                server.shutdown()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """Run the plugins' shutdown event"""
+        if self._started:
+            self.config.plugins.on_shutdown()
+            self._started = False
+
+    def plugin_timing_table(self):
+        """Return a plain text table of time spent per plugin in the last build"""
+        if not self.plugin_timings:
+            return ""
+        per_plugin = defaultdict(float)
+        for (name, _event), (_calls, seconds) in self.plugin_timings.items():
+            per_plugin[name] += seconds
+        lines = [f"{'Plugin':<32}{'Event':<18}{'Calls':>8}{'Total s':>11}{'Mean ms':>11}"]
+        for (name, event), (calls, seconds) in sorted(
+            self.plugin_timings.items(), key=lambda i: (-per_plugin[i[0][0]], -i[1][1])
+        ):
+            if not calls:
+                continue
+            lines.append(
+                f"{name:<32}{event:<18}{calls:>8}{seconds:>11.2f}{seconds / calls * 1000:>11.2f}"
+            )
+        lines.append("")
+        for name, seconds in sorted(per_plugin.items(), key=lambda i: -i[1]):
+            lines.append(f"{name:<32}{'total':<18}{'':>8}{seconds:>11.2f}")
+        return "\n".join(lines)
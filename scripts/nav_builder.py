@@ -0,0 +1,328 @@
+"""
+MkDocs navigation from the pages written in a run
+
+The output writer records every page it writes, or finds unchanged, during a
+run. NavBuilder turns that list into the navigation tree in one pass, without
+walking the docs tree, and writes it either as:
+
+    pages   awesome-pages .pages files, one per directory, listing the
+            generated pages first and "..." for hand-written ones (needs the
+            awesome-pages plugin, enabled in mkdocs.yml)
+    mkdocs  the nav: section of mkdocs.yml, everything else in the file kept.
+            Hand-written entries of the existing nav stay where they are; the
+            generated sections are merged into the sections of the same
+            title. Without a nav yet, the hand-written pages are found by
+            scanning the docs tree once.
+
+Generated pages are remembered in <docs_dir>/.nav.json, so a run that only
+regenerates some pages (watch daemon, single object) keeps the others in the
+navigation. Remembered pages that were deleted since are dropped; that
+checks those files only, not the whole tree. Entries of the existing nav
+that point to generated pages are replaced, so deleted or moved generated
+pages do not linger.
+
+Entries are sorted deterministically: index.md first, then pages, then
+sub-sections, each in natural order (Custom2 before Custom10). A directory
+with more than page_size pages is split into sections of page_size pages,
+titled by their first and last page.
+"""
+
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+import yaml
+
+from output_writer import get_writer
+
+NAV_MODES = ("pages", "mkdocs")
+DEFAULT_PAGE_SIZE = 50
+MANIFEST_NAME = ".nav.json"
+PAGES_NAME = ".pages"
+
+NAV_SECTION_PATTERN = re.compile(r"^nav:.*?(?=^\S|\Z)", re.MULTILINE | re.DOTALL)
+
+# Directory -> {"pages": [file names], "dirs": {name: directory}}
+Tree = Dict[str, Union[List[str], Dict]]
+
+# mkdocs nav entries: "path", {"Title": "path"} or {"Title": [entries]}
+NavEntry = Union[str, Dict[str, Union[str, List]]]
+
+
+def natural_key(name: str):
+    """Sort key ordering embedded numbers by value, case-insensitively"""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", name)]
+
+
+def section_title(name: str) -> str:
+    """Navigation title of a directory or page stem: data-model -> Data Model"""
+    return " ".join(word.capitalize() for word in re.split(r"[-_\s]+", name) if word)
+
+
+def _order(names: Iterable[str]) -> List[str]:
+    return sorted(names, key=lambda name: (name != "index.md", natural_key(name)))
+
+
+def _yaml(value: str) -> str:
+    # JSON strings are valid YAML scalars and need no further escaping
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _nav_lines(entries: List[NavEntry], indent: int) -> List[str]:
+    """YAML lines of nav entries"""
+    pad = "  " * indent
+    lines = []
+    for entry in entries:
+        if isinstance(entry, dict):
+            for title, value in entry.items():
+                if isinstance(value, list):
+                    lines.append(f"{pad}- {_yaml(str(title))}:")
+                    lines += _nav_lines(value, indent + 2)
+                else:
+                    lines.append(f"{pad}- {_yaml(str(title))}: {_yaml(str(value))}")
+        else:
+            lines.append(f"{pad}- {_yaml(str(entry))}")
+    return lines
+
+
+def strip_pages(entries: List[NavEntry], pages: Set[str]) -> List[NavEntry]:
+    """Nav entries without the given pages; sections left empty are dropped"""
+    kept = []
+    for entry in entries:
+        if isinstance(entry, dict):
+            section = {}
+            for title, value in entry.items():
+                if isinstance(value, list):
+                    value = strip_pages(value, pages)
+                    if value:
+                        section[title] = value
+                elif value not in pages:
+                    section[title] = value
+            if section:
+                kept.append(section)
+        elif entry not in pages:
+            kept.append(entry)
+    return kept
+
+
+def merge_nav(existing: List[NavEntry], generated: List[NavEntry]) -> List[NavEntry]:
+    """Add generated entries to a nav, merging sections with the same title"""
+    merged = list(existing)
+    for entry in generated:
+        if isinstance(entry, dict):
+            (title, children), = entry.items()
+            for i, other in enumerate(merged):
+                if not isinstance(other, dict) or len(other) != 1:
+                    continue
+                (other_title, other_children), = other.items()
+                if str(other_title).lower() == title.lower() and isinstance(other_children, list):
+                    merged[i] = {other_title: merge_nav(other_children, children)}
+                    break
+            else:
+                merged.append(entry)
+        else:
+            merged.append(entry)
+    return merged
+
+
+class NavBuilder:
+    """Navigation tree of the generated pages of a docs directory"""
+
+    def __init__(self, docs_dir: str = "docs", page_size: int = DEFAULT_PAGE_SIZE):
+        """
+        Args:
+            docs_dir: MkDocs docs_dir
+            page_size: Pages per navigation section before it is split
+        """
+        self.docs_dir = docs_dir
+        self.page_size = page_size
+        self.manifest_path = os.path.join(docs_dir, MANIFEST_NAME)
+        # Generated pages of earlier runs, read by collect()
+        self.previous: Set[str] = set()
+
+    def _relative(self, paths: Iterable[str]) -> List[str]:
+        """Markdown pages below docs_dir, relative to it with / separators"""
+        root = os.path.abspath(self.docs_dir)
+        pages = []
+        for path in paths:
+            path = os.path.abspath(path)
+            if path.endswith(".md") and path.startswith(root + os.sep):
+                pages.append(os.path.relpath(path, root).replace(os.sep, "/"))
+        return pages
+
+    def _scan(self) -> List[str]:
+        """Every page below docs_dir, relative to it (only for a first mkdocs nav)"""
+        pages = []
+        for root, dirs, files in os.walk(self.docs_dir):
+            dirs[:] = [name for name in dirs if not name.startswith(".")]
+            relative = os.path.relpath(root, self.docs_dir)
+            for name in files:
+                if name.endswith(".md"):
+                    path = name if relative == "." else os.path.join(relative, name)
+                    pages.append(path.replace(os.sep, "/"))
+        return pages
+
+    def _load_manifest(self) -> List[str]:
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f).get("pages", [])
+        except (OSError, ValueError):
+            return []
+
+    def collect(self, written: Iterable[str]) -> List[str]:
+        """
+        Pages of this run plus the still existing pages of earlier runs
+
+        Args:
+            written: Paths of the pages written in this run
+        """
+        pages = set(self._relative(written))
+        self.previous = set(self._load_manifest())
+        for page in self.previous:
+            if page not in pages and os.path.exists(os.path.join(self.docs_dir, page)):
+                pages.add(page)
+        pages = sorted(pages)
+        get_writer().write(
+            self.manifest_path, json.dumps({"pages": pages}, indent=1, ensure_ascii=False) + "\n"
+        )
+        return pages
+
+    @staticmethod
+    def tree(pages: Iterable[str]) -> Tree:
+        """Nest relative page paths into directories"""
+        root: Tree = {"pages": [], "dirs": {}}
+        for page in pages:
+            node = root
+            *directories, name = page.split("/")
+            for directory in directories:
+                node = node["dirs"].setdefault(directory, {"pages": [], "dirs": {}})
+            node["pages"].append(name)
+        return root
+
+    def _chunks(self, names: List[str]) -> List[List[str]]:
+        """Pages of one directory, split into sections past page_size (index.md stays on top)"""
+        names = _order(names)
+        if len(names) <= self.page_size:
+            return [names]
+        head = names[:1] if names[0] == "index.md" else []
+        rest = names[len(head) :]
+        chunks = [rest[i : i + self.page_size] for i in range(0, len(rest), self.page_size)]
+        return [head] + chunks if head else chunks
+
+    def _chunk_title(self, chunk: List[str]) -> str:
+        first, last = (os.path.splitext(name)[0] for name in (chunk[0], chunk[-1]))
+        return f"{first} – {last}" if first != last else first
+
+    def _entries(self, node: Tree, prefix: str = "") -> List[NavEntry]:
+        """mkdocs nav entries of one directory; prefix is prepended to paths"""
+        entries: List[NavEntry] = []
+        chunks = self._chunks(node["pages"])
+        for chunk in chunks:
+            if len(chunks) == 1 or chunk == ["index.md"]:
+                entries += [prefix + name for name in chunk]
+            else:
+                entries.append({self._chunk_title(chunk): [prefix + name for name in chunk]})
+        for name in sorted(node["dirs"], key=natural_key):
+            entries.append(
+                {section_title(name): self._entries(node["dirs"][name], f"{prefix}{name}/")}
+            )
+        return entries
+
+    def write_pages_files(self, pages: List[str]) -> List[str]:
+        """
+        Write one awesome-pages .pages file per directory with generated pages
+
+        Returns:
+            Paths of the .pages files written (unchanged ones are skipped)
+        """
+        files = []
+
+        def visit(node: Tree, directory: str):
+            lines = ["nav:"]
+            chunks = self._chunks(node["pages"])
+            for chunk in chunks:
+                if len(chunks) == 1 or chunk == ["index.md"]:
+                    lines += [f"  - {_yaml(name)}" for name in chunk]
+                else:
+                    lines.append(f"  - {_yaml(self._chunk_title(chunk))}:")
+                    lines += [f"    - {_yaml(name)}" for name in chunk]
+            for name in sorted(node["dirs"], key=natural_key):
+                lines.append(f"  - {_yaml(name)}")
+                visit(node["dirs"][name], os.path.join(directory, name))
+            # Hand-written pages and directories follow the generated ones
+            lines.append("  - ...")
+            files.append((os.path.join(directory, PAGES_NAME), "\n".join(lines) + "\n"))
+
+        visit(self.tree(pages), self.docs_dir)
+        return get_writer().write_many(files)
+
+    def nav_section(self, pages: List[str], existing: Optional[List[NavEntry]] = None) -> str:
+        """
+        The nav: section of mkdocs.yml for the generated pages
+
+        Args:
+            pages: Generated pages, relative to docs_dir
+            existing: Current nav; its entries for other pages are kept
+        """
+        generated = set(pages) | self.previous
+        hand_written = strip_pages(existing or [], generated)
+        nav = merge_nav(hand_written, self._entries(self.tree(pages)))
+        return "\n".join(["nav:"] + _nav_lines(nav, 1)) + "\n"
+
+    def write_mkdocs_nav(self, pages: List[str], config_file: str = "mkdocs.yml") -> bool:
+        """
+        Merge the generated pages into the nav: section of mkdocs.yml, keeping the rest as is
+
+        Returns:
+            True if mkdocs.yml changed
+        """
+        with open(config_file, encoding="utf-8") as f:
+            config = f.read()
+        match = NAV_SECTION_PATTERN.search(config)
+        if match:
+            existing = (yaml.safe_load(match.group(0)) or {}).get("nav") or []
+        else:
+            # No nav yet: the hand-written pages are only known from the tree
+            generated = set(pages) | self.previous
+            existing = self._entries(
+                self.tree(page for page in self._scan() if page not in generated)
+            )
+        section = self.nav_section(pages, existing)
+        if match:
+            config = NAV_SECTION_PATTERN.sub(lambda _: section + "\n", config, count=1)
+            config = config.rstrip("\n") + "\n"
+        else:
+            config = config.rstrip("\n") + "\n\n# Navigation, generated by nav_builder\n" + section
+        return get_writer().write(config_file, config)
+
+    def build(
+        self, written: Iterable[str], mode: str = "pages", config_file: str = "mkdocs.yml"
+    ) -> int:
+        """
+        Update the navigation with the pages written in a run
+
+        Returns:
+            Number of pages in the navigation
+        """
+        if mode not in NAV_MODES:
+            raise ValueError(f"Unknown nav mode {mode!r}, expected one of {NAV_MODES}")
+        pages = self.collect(written)
+        if mode == "pages":
+            self.write_pages_files(pages)
+        else:
+            self.write_mkdocs_nav(pages, config_file)
+        return len(pages)
+
+
+def update_nav(
+    mode: str = "pages",
+    docs_dir: str = "docs",
+    config_file: str = "mkdocs.yml",
+    page_size: int = DEFAULT_PAGE_SIZE,
+    written: Optional[Iterable[str]] = None,
+) -> int:
+    """Build the navigation from the pages the output writer handled in this run"""
+    if written is None:
+        written = get_writer().pages()
+    return NavBuilder(docs_dir, page_size).build(written, mode, config_file)
@@ -0,0 +1,102 @@
+"""
+Created and last-modified dates of object definitions
+
+The dates come from the Tooling API: EntityDefinition has the last-modified
+date of every object and CustomObject adds the created date of custom
+objects. Both are fetched with one query each for the whole org and written
+into the front matter of generated pages as sf_created_date and
+sf_modified_date, where the page_dates MkDocs hook picks them up.
+"""
+
+import logging
+
+from instrumentation import span
+from query_iterator import query_all
+
+logger = logging.getLogger(__name__)
+
+ENTITY_QUERY = "SELECT DurableId, QualifiedApiName, LastModifiedDate FROM EntityDefinition"
+CUSTOM_OBJECT_QUERY = "SELECT Id, CreatedDate, LastModifiedDate FROM CustomObject"
+
+# Front matter keys read by overrides/hooks/page_dates.py
+CREATED_KEY = "sf_created_date"
+MODIFIED_KEY = "sf_modified_date"
+
+
+def fetch_object_dates(sf):
+    """
+    Fetch created and last-modified dates of all object definitions
+
+    Args:
+        sf (simple_salesforce.Salesforce): Salesforce connection
+
+    Returns:
+        dict: {object API name: {"created": str or None, "modified": str}}
+            with ISO 8601 timestamps as returned by Salesforce
+    """
+    dates = {}
+    try:
+        with span("tooling_query", entity="EntityDefinition"):
+            entities = query_all(sf, ENTITY_QUERY, tooling=True)
+    except Exception as e:
+        logger.warning(f"Failed to get object dates: {str(e)}")
+        return dates
+
+    by_durable_id = {}
+    for entity in entities:
+        entry = {"created": None, "modified": entity.get("LastModifiedDate")}
+        dates[entity["QualifiedApiName"]] = entry
+        by_durable_id[entity.get("DurableId")] = entry
+
+    try:
+        with span("tooling_query", entity="CustomObject"):
+            custom_objects = query_all(sf, CUSTOM_OBJECT_QUERY, tooling=True)
+    except Exception as e:
+        logger.warning(f"Failed to get custom object dates: {str(e)}")
+        return dates
+
+    # The DurableId of a custom object's EntityDefinition is its CustomObject Id
+    for custom_object in custom_objects:
+        entry = by_durable_id.get(custom_object.get("Id"))
+        if entry is not None:
+            entry["created"] = custom_object.get("CreatedDate")
+            entry["modified"] = custom_object.get("LastModifiedDate") or entry["modified"]
+    return dates
+
+
+def page_dates(object_dates):
+    """
+    Combine the dates of the objects documented on one page
+
+    Args:
+        object_dates (list): {"created", "modified"} dicts, None entries allowed
+
+    Returns:
+        tuple: (earliest created date, latest modified date), either may be None
+    """
+    created = [d["created"] for d in object_dates if d and d.get("created")]
+    modified = [d["modified"] for d in object_dates if d and d.get("modified")]
+    # Salesforce timestamps share one format and time zone, so they sort as text
+    return (min(created) if created else None, max(modified) if modified else None)
+
+
+def front_matter(created=None, modified=None, extra=()):
+    """
+    Build a front matter block with Salesforce dates
+
+    Args:
+        created (str, optional): Created timestamp
+        modified (str, optional): Last-modified timestamp
+        extra (list, optional): Other front matter lines to keep, in order
+
+    Returns:
+        str: Front matter block, or an empty string when it would be empty
+    """
+    lines = list(extra)
+    if created:
+        lines.append(f'{CREATED_KEY}: "{created}"')
+    if modified:
+        lines.append(f'{MODIFIED_KEY}: "{modified}"')
+    if not lines:
+        return ""
+    return "---\n" + "\n".join(lines) + "\n---\n\n"
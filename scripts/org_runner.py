@@ -0,0 +1,204 @@
+"""
+Headless documentation runs over every configured org
+
+run_all() documents the orgs of ~/.sfdcboss/config.json concurrently, one
+worker process per org. Each org is isolated:
+
+    output    <output_root>/<org>/docs/...  (the docs tree of one org)
+    cache     <cache_root>/<org>/           (SalesforceCache namespace)
+
+The templates are compiled once by the parent into a shared Jinja bytecode
+cache; the workers load the compiled code instead of compiling every
+template again.
+
+Budgets are split fairly between the orgs:
+
+    cpu_budget  worker processes running at the same time; orgs beyond it
+                wait for a free worker in configuration order
+    api_budget  API requests for the whole run; every org may use an equal
+                share, requests past it fail with ApiBudgetExceeded
+"""
+
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+from jinja2 import FileSystemBytecodeCache
+
+from instrumentation import span
+from main import (
+    CacheConfig,
+    SalesforceCache,
+    SalesforceMetadata,
+    metadata_type_to_docs_path,
+    metadata_type_to_template_path,
+)
+from page_assembler import PageAssembler, template_environment
+from sf_session import ApiBudget, connect, create_session
+
+logger = logging.getLogger(__name__)
+
+DOCS_PREFIX = "docs/"
+BYTECODE_DIR = ".templates"
+
+
+def org_slug(org_name: str) -> str:
+    """Directory name of an org's output and cache"""
+    return re.sub(r"[^A-Za-z0-9_.-]+", "-", org_name).strip("-") or "org"
+
+
+def split_budget(total: Optional[int], shares: int) -> List[Optional[int]]:
+    """Split a budget into equal integer shares, the remainder to the first ones"""
+    if total is None:
+        return [None] * shares
+    base, remainder = divmod(total, shares)
+    return [base + (1 if i < remainder else 0) for i in range(shares)]
+
+
+def precompile_templates(template_dir: str, bytecode_dir: str) -> int:
+    """
+    Compile every template into a bytecode cache shared by the workers
+
+    Returns:
+        Number of templates compiled
+    """
+    os.makedirs(bytecode_dir, exist_ok=True)
+    env = template_environment(template_dir, FileSystemBytecodeCache(bytecode_dir))
+    compiled = 0
+    with span("precompile_templates"):
+        for name in env.list_templates(extensions=["j2"]):
+            try:
+                env.get_template(name)
+                compiled += 1
+            except Exception as e:
+                print(f"Error compiling template {name}: {str(e)}")
+    return compiled
+
+
+def connect_org(auth: Dict, session):
+    """Log in to a configured org through the given session"""
+    return connect(
+        username=auth["username"],
+        password=auth["password"],
+        security_token=auth["security_token"],
+        domain="test" if auth.get("environment") == "Sandbox" else "login",
+        session=session,
+    )
+
+
+def document_org(job: Dict) -> Dict:
+    """
+    Document one org; runs in a worker process
+
+    Args:
+        job: org, auth, org_root, cache_dir, template_dir, bytecode_dir,
+            api_calls, table_mode and connect (function taking auth and session)
+
+    Returns:
+        {"org", "pages", "api_calls", "seconds", "error"}
+    """
+    started = time.perf_counter()
+    budget = ApiBudget(job["api_calls"])
+    result = {"org": job["org"], "pages": 0, "api_calls": 0, "seconds": 0.0, "error": None}
+    try:
+        session = budget.attach(create_session())
+        sf = job["connect"](job["auth"], session)
+        metadata = SalesforceMetadata(
+            sf, SalesforceCache(CacheConfig(cache_dir=job["cache_dir"]))
+        )
+        docs_dir = os.path.join(job["org_root"], "docs")
+        docs_paths = {
+            metadata_type: os.path.join(docs_dir, path[len(DOCS_PREFIX) :])
+            for metadata_type, path in metadata_type_to_docs_path.items()
+            if path.startswith(DOCS_PREFIX)
+        }
+        written = PageAssembler(
+            metadata,
+            docs_paths,
+            metadata_type_to_template_path,
+            template_dir=job["template_dir"],
+            table_mode=job["table_mode"],
+            docs_dir=docs_dir,
+            bytecode_cache=FileSystemBytecodeCache(job["bytecode_dir"]),
+        ).assemble()
+        result["pages"] = len(written)
+    except Exception as e:
+        result["error"] = str(e)
+    result["api_calls"] = budget.calls
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def run_all(
+    orgs: Dict[str, Dict],
+    output_root: str = "orgs",
+    cache_root: str = ".sf_cache",
+    template_dir: str = "templates",
+    cpu_budget: Optional[int] = None,
+    api_budget: Optional[int] = None,
+    table_mode: str = "markdown",
+    connector: Callable = connect_org,
+) -> List[Dict]:
+    """
+    Document every org concurrently, one worker process per org
+
+    Args:
+        orgs: org name -> auth details, as stored in ~/.sfdcboss/config.json
+        output_root: Directory holding one docs tree per org
+        cache_root: Directory holding one cache namespace per org
+        template_dir: Directory containing the templates
+        cpu_budget: Worker processes at the same time (default: CPU count)
+        api_budget: API requests for the whole run (default: unlimited)
+        table_mode: "markdown" or "json", see data_tables
+        connector: Picklable function (auth, session) -> Salesforce connection
+
+    Returns:
+        Per-org results in configuration order, see document_org()
+    """
+    if not orgs:
+        return []
+    bytecode_dir = os.path.join(output_root, BYTECODE_DIR)
+    compiled = precompile_templates(template_dir, bytecode_dir)
+    print(f"Compiled {compiled} templates for {len(orgs)} orgs")
+
+    jobs = [
+        {
+            "org": name,
+            "auth": auth,
+            "org_root": os.path.join(output_root, org_slug(name)),
+            "cache_dir": os.path.join(cache_root, org_slug(name)),
+            "template_dir": template_dir,
+            "bytecode_dir": bytecode_dir,
+            "api_calls": api_calls,
+            "table_mode": table_mode,
+            "connect": connector,
+        }
+        for (name, auth), api_calls in zip(orgs.items(), split_budget(api_budget, len(orgs)))
+    ]
+    workers = max(1, min(cpu_budget or os.cpu_count() or 1, len(jobs)))
+
+    results = {}
+    with span("run_all", orgs=len(jobs), workers=workers):
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(document_org, job): job["org"] for job in jobs}
+            for future in as_completed(futures):
+                org = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker process itself died
+                    result = {
+                        "org": org, "pages": 0, "api_calls": 0, "seconds": 0.0, "error": str(e)
+                    }
+                results[org] = result
+                if result["error"]:
+                    print(f"Error documenting {org}: {result['error']}")
+                else:
+                    print(
+                        f"Documented {org}: {result['pages']} pages, "
+                        f"{result['api_calls']} API calls in {result['seconds']:.1f}s"
+                    )
+    return [results[name] for name in orgs]
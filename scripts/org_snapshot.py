@@ -0,0 +1,337 @@
+"""
+Portable org metadata snapshots
+
+A snapshot holds the normalized metadata of every documented object (fields,
+relationships, record types, validation rules and record counts) in one
+compressed, versioned file, so fetching and rendering can run separately.
+
+File layout:
+    MAGIC + 1-byte format version + 8-byte big-endian index offset
+    object block*   zlib(JSON object metadata)
+    index           zlib(JSON {"meta": {...}, "objects": {name: entry},
+                           "value_sets": {key: value set}})
+
+Each index entry records the offset and length of its object block, so a
+single object is loaded by one seek and one decompression. It also holds the
+object and group hashes of the metadata tree (see metadata_tree), so two
+snapshots are compared without loading the objects that did not change.
+"""
+
+import json
+import logging
+import os
+import struct
+import zlib
+from datetime import datetime
+
+from metadata_tree import MetadataTree, diff_trees, object_hashes, summarize
+from object_dates import front_matter
+from output_writer import get_writer
+from page_assembler import kept_front_matter, template_environment
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SFSNAP"
+FORMAT_VERSION = 1
+HEADER = struct.Struct(">6sBQ")
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is missing, corrupt or of another version"""
+
+
+class SnapshotWriter:
+    """Write object metadata to a snapshot file"""
+
+    def __init__(self, path, meta=None):
+        """
+        Create a snapshot file
+
+        Args:
+            path (str): Snapshot file path
+            meta (dict, optional): Org level information stored in the index
+        """
+        self.path = path
+        self.meta = dict(meta or {})
+        self.objects = {}
+        # Picklist value sets the objects' fields refer to (see value_sets)
+        self.value_sets = {}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Written to a temporary name so a failed fetch leaves no partial file
+        self._tmp_path = f"{path}.tmp"
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0))
+
+    def add_object(self, metadata):
+        """
+        Append one object's metadata
+
+        Args:
+            metadata (dict): Normalized object metadata with an api_name key
+        """
+        name = metadata["api_name"]
+        data = zlib.compress(
+            json.dumps(metadata, separators=(",", ":"), default=str).encode("utf-8")
+        )
+        offset = self._file.tell()
+        self._file.write(data)
+        object_hash, group_hashes = object_hashes(metadata)
+        self.objects[name] = {
+            "offset": offset,
+            "length": len(data),
+            "label": metadata.get("label"),
+            "custom": bool(metadata.get("custom")),
+            "field_count": len(metadata.get("fields", [])),
+            "record_count": metadata.get("record_count"),
+            "hash": object_hash,
+            "groups": group_hashes,
+        }
+
+    def close(self):
+        if self._file is None:
+            return
+        self.meta.setdefault("created", datetime.now().isoformat(timespec="seconds"))
+        self.meta["object_count"] = len(self.objects)
+        self.meta["field_count"] = sum(o["field_count"] for o in self.objects.values())
+
+        index_offset = self._file.tell()
+        index = {"meta": self.meta, "objects": self.objects, "value_sets": self.value_sets}
+        self._file.write(
+            zlib.compress(json.dumps(index, separators=(",", ":")).encode("utf-8"))
+        )
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, FORMAT_VERSION, index_offset))
+        self._file.close()
+        self._file = None
+        os.replace(self._tmp_path, self.path)
+        logger.info(f"Snapshot with {len(self.objects)} objects saved to {self.path}")
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class Snapshot:
+    """Read-only, random access view of a snapshot file"""
+
+    def __init__(self, path):
+        """
+        Open a snapshot and read its index
+
+        Args:
+            path (str): Snapshot file path
+
+        Raises:
+            SnapshotError: If the file is missing, corrupt or of another version
+        """
+        self.path = path
+        try:
+            self._file = open(path, "rb")
+        except OSError as e:
+            raise SnapshotError(f"Cannot open snapshot {path}: {e}") from e
+
+        header = self._file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise SnapshotError(f"{path} is not a snapshot file")
+        magic, version, index_offset = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path} is not a snapshot file")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(
+                f"{path} uses snapshot format {version}, expected {FORMAT_VERSION}"
+            )
+        if not index_offset:
+            raise SnapshotError(f"{path} was not closed properly")
+
+        self._file.seek(index_offset)
+        try:
+            index = json.loads(zlib.decompress(self._file.read()))
+        except (zlib.error, ValueError) as e:
+            raise SnapshotError(f"Corrupt snapshot index in {path}: {e}") from e
+        self.meta = index["meta"]
+        self.objects = index["objects"]
+        self.value_sets = index.get("value_sets", {})
+
+    def object_names(self, custom=None):
+        """
+        List the objects in the snapshot
+
+        Args:
+            custom (bool, optional): Only custom (True) or standard (False)
+
+        Returns:
+            list: Sorted object API names
+        """
+        return sorted(
+            name
+            for name, entry in self.objects.items()
+            if custom is None or entry["custom"] == custom
+        )
+
+    def load_object(self, name):
+        """
+        Load a single object without reading the rest of the file
+
+        Args:
+            name (str): Object API name
+
+        Returns:
+            dict: Object metadata, or None if the object is not in the snapshot
+        """
+        entry = self.objects.get(name)
+        if entry is None:
+            return None
+        self._file.seek(entry["offset"])
+        return json.loads(zlib.decompress(self._file.read(entry["length"])))
+
+    def iter_objects(self, names=None):
+        """Yield object metadata in file order"""
+        names = names if names is not None else self.object_names()
+        for name in sorted(names, key=lambda n: self.objects[n]["offset"]):
+            yield self.load_object(name)
+
+    def tree(self):
+        """
+        Hashed metadata tree of the snapshot
+
+        Snapshots written before the hashes were added to the index have
+        them computed from the object blocks.
+        """
+        hashes = {}
+        for name, entry in self.objects.items():
+            if "hash" in entry:
+                hashes[name] = (entry["hash"], entry["groups"])
+            else:
+                hashes[name] = object_hashes(self.load_object(name))
+        return MetadataTree(hashes, self.load_object)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def create_snapshot(generator, path, object_names):
+    """
+    Fetch object metadata from Salesforce and write it to a snapshot
+
+    Args:
+        generator (SalesforceDocGenerator): Connected documentation generator
+        path (str): Snapshot file path
+        object_names (list): Objects to include
+
+    Returns:
+        list: Objects written to the snapshot
+    """
+    meta = {
+        "instance": getattr(generator.sf, "sf_instance", None),
+        "api_version": getattr(generator.sf, "sf_version", None),
+    }
+    with SnapshotWriter(path, meta) as writer:
+        for object_name in object_names:
+            metadata = generator.get_object_metadata(object_name)
+            if not metadata:
+                logger.error(f"Skipping {object_name}: no metadata")
+                continue
+            metadata["record_count"] = generator.get_record_count(object_name)
+            writer.add_object(metadata)
+        writer.value_sets = generator.value_sets.sets
+        written = list(writer.objects)
+    return written
+
+
+def render_snapshot(generator, path, output_dir, object_names=None, custom=None):
+    """
+    Render documentation pages from a snapshot
+
+    Args:
+        generator (SalesforceDocGenerator): Generator used for rendering only
+        path (str): Snapshot file path
+        output_dir (str): Directory to save the documentation
+        object_names (list, optional): Objects to render (default: all)
+        custom (bool, optional): Only custom (True) or standard (False) objects
+
+    Returns:
+        list: Objects rendered
+    """
+    rendered = {True: [], False: []}
+    with Snapshot(path) as snapshot:
+        generator.value_sets.update(snapshot.value_sets, snapshot.object_names())
+        names = object_names or snapshot.object_names(custom)
+        missing = [name for name in names if name not in snapshot.objects]
+        for name in missing:
+            logger.error(f"{name} is not in snapshot {path}")
+        for metadata in snapshot.iter_objects([n for n in names if n not in missing]):
+            output_path = os.path.join(output_dir, f"{metadata['api_name'].lower()}.md")
+            if generator.render_object_documentation(metadata, output_path):
+                rendered[bool(metadata.get("custom"))].append(metadata["api_name"])
+
+    generator.write_value_sets(output_dir)
+    if not object_names:
+        if rendered[False]:
+            generator._create_object_index(
+                rendered[False],
+                os.path.join(output_dir, "standard-objects.md"),
+                "Standard Objects",
+            )
+        if rendered[True]:
+            generator._create_object_index(
+                rendered[True],
+                os.path.join(output_dir, "custom-objects.md"),
+                "Custom Objects",
+            )
+    return rendered[False] + rendered[True]
+
+
+def diff_snapshots(baseline_path, current_path):
+    """
+    Compare two snapshots, e.g. last night's and tonight's or production and a sandbox
+
+    Args:
+        baseline_path (str): Snapshot to compare against
+        current_path (str): Snapshot with the current metadata
+
+    Returns:
+        dict: baseline and current snapshot meta, changes (see
+            metadata_tree.diff_trees) and their counts by kind
+    """
+    with Snapshot(baseline_path) as baseline, Snapshot(current_path) as current:
+        changes = diff_trees(baseline.tree(), current.tree())
+        return {
+            "baseline": dict(baseline.meta, path=baseline_path),
+            "current": dict(current.meta, path=current_path),
+            "changes": changes,
+            "counts": summarize(changes),
+        }
+
+
+def write_changelog(diff, output_path, template_dir="templates"):
+    """
+    Render a snapshot diff to the data changes page
+
+    Args:
+        diff (dict): Result of diff_snapshots()
+        output_path (str): Page to write, its hand-written front matter is kept
+        template_dir (str): Directory containing data_changes.j2
+    """
+    template = template_environment(template_dir).get_template("data_changes.j2")
+    markdown = template.render(
+        generation_date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"), **diff
+    )
+    markdown = front_matter(extra=kept_front_matter(output_path)) + markdown
+    get_writer().write(output_path, markdown)
@@ -0,0 +1,190 @@
+"""
+Atomic, change-aware output writer
+
+Every generated file (pages, sub-pages, table data, indexes) goes through
+OutputWriter:
+
+    - directories are created in-process, each one once
+    - content is written to a temporary file next to the target and renamed
+      over it, so readers (mkdocs serve, a running build) never see half a file
+    - content whose hash matches the file on disk is not written at all, so
+      unchanged pages keep their modification time and incremental MkDocs
+      builds skip them
+
+The hash of every file the writer has written or checked is remembered with
+its size and modification time, so a long-running process (the watch
+daemon) does not read a file again to find it unchanged. write_many() and
+touch_many() batch large sets of files: they create each directory once and
+list it once, instead of checking every file on its own. The paths handled
+are kept, so the navigation can be built without scanning the docs tree.
+
+Bytes written and files skipped are recorded on the tracer and shown in the
+run summary.
+"""
+
+import hashlib
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from instrumentation import get_tracer, span
+
+Content = Union[str, bytes]
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _file_hash(path: str) -> Optional[str]:
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+class OutputWriter:
+    """Write generated files atomically, skipping unchanged content"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dirs = set()
+        # path -> (size, mtime_ns, hash) of files written or checked
+        self._known: Dict[str, Tuple[int, int, str]] = {}
+        # Files written or found unchanged, for the navigation (see nav_builder)
+        self._pages = set()
+
+    def ensure_dir(self, directory: str):
+        """Create a directory, once per writer"""
+        directory = directory or "."
+        if directory in self._dirs:
+            return
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self._dirs.add(directory)
+
+    def _unchanged(self, path: str, data: bytes, stat: Optional[os.stat_result]) -> bool:
+        if stat is None or stat.st_size != len(data):
+            return False
+        new_hash = content_hash(data)
+        known = self._known.get(path)
+        if known and known[:2] == (stat.st_size, stat.st_mtime_ns):
+            return known[2] == new_hash
+        old_hash = _file_hash(path)
+        if old_hash is not None:
+            self._remember(path, stat, old_hash)
+        return old_hash == new_hash
+
+    def _remember(self, path: str, stat: os.stat_result, digest: str):
+        with self._lock:
+            self._known[path] = (stat.st_size, stat.st_mtime_ns, digest)
+
+    def pages(self) -> List[str]:
+        """Paths of the files written or found unchanged so far"""
+        with self._lock:
+            return sorted(self._pages)
+
+    def _write(self, path: str, data: bytes, stat: Optional[os.stat_result]) -> bool:
+        with self._lock:
+            self._pages.add(path)
+        if self._unchanged(path, data, stat):
+            get_tracer().record_output(False, len(data))
+            return False
+        self.ensure_dir(os.path.dirname(path))
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with span("write", path=path):
+            try:
+                try:
+                    f = open(tmp_path, "wb")
+                except FileNotFoundError:
+                    # The directory was removed after it was created
+                    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                    f = open(tmp_path, "wb")
+                with f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        self._remember(path, os.stat(path), content_hash(data))
+        get_tracer().record_output(True, len(data))
+        return True
+
+    def write(self, path: str, content: Content, encoding: str = "utf-8") -> bool:
+        """
+        Write a file unless it already has this content
+
+        Returns:
+            True if the file was written, False if it was unchanged
+        """
+        data = content.encode(encoding) if isinstance(content, str) else content
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stat = None
+        return self._write(path, data, stat)
+
+    def write_many(self, files: Iterable[Tuple[str, Content]], encoding: str = "utf-8") -> List[str]:
+        """
+        Write many files, listing each directory once
+
+        Returns:
+            Paths actually written
+        """
+        by_dir: Dict[str, List[Tuple[str, bytes]]] = defaultdict(list)
+        for path, content in files:
+            data = content.encode(encoding) if isinstance(content, str) else content
+            by_dir[os.path.dirname(path)].append((path, data))
+
+        written = []
+        for directory, entries in by_dir.items():
+            self.ensure_dir(directory)
+            existing = self._list(directory)
+            for path, data in entries:
+                if self._write(path, data, existing.get(os.path.basename(path))):
+                    written.append(path)
+        return written
+
+    def touch_many(self, paths: Iterable[str]) -> List[str]:
+        """
+        Create empty files where none exist, leaving existing files alone
+
+        Returns:
+            Paths created
+        """
+        by_dir: Dict[str, List[str]] = defaultdict(list)
+        for path in paths:
+            by_dir[os.path.dirname(path)].append(path)
+
+        created = []
+        for directory, entries in by_dir.items():
+            self.ensure_dir(directory)
+            existing = self._list(directory)
+            for path in entries:
+                if os.path.basename(path) not in existing:
+                    self._write(path, b"", None)
+                    created.append(path)
+        return created
+
+    @staticmethod
+    def _list(directory: str) -> Dict[str, os.stat_result]:
+        """name -> stat of the files in a directory, from one listing"""
+        try:
+            with os.scandir(directory or ".") as entries:
+                return {entry.name: entry.stat() for entry in entries if entry.is_file()}
+        except OSError:
+            return {}
+
+
+_writer = OutputWriter()
+
+
+def get_writer() -> OutputWriter:
+    """Return the process-wide output writer"""
+    return _writer
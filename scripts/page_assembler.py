@@ -0,0 +1,538 @@
+"""
+Multi-section page assembler
+
+metadata_type_to_docs_path sends several metadata types to the same page
+(record types, list views and the field tables all land in the data
+dictionary; roles, groups, queues, territories and public groups share the
+role hierarchy page). Rendering each type on its own made every render
+overwrite the previous one.
+
+The assembler groups the metadata types by target page, fetches the data
+each type needs once per run, renders all sections of a page in one pass
+with a shared context and writes every page exactly once. Pages with a
+field table also get the picklist value set pages they link to, written to
+value-sets/ next to them from the value lists cached with the describes.
+
+Fetchers:
+    A fetcher returns the template context for one or more metadata types.
+    Register it with @fetcher("type", ...); data shared between fetchers
+    (the object metadata, ...) goes through PageAssembler.source() so it is
+    only loaded once.
+"""
+
+import os
+import re
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from jinja2 import BytecodeCache, Environment, FileSystemLoader, TemplateNotFound
+
+from data_tables import TABLE_MODES, table_function
+from instrumentation import span
+from object_dates import CREATED_KEY, MODIFIED_KEY, front_matter, page_dates
+from output_writer import get_writer
+from permissions_matrix import OBJECT_FLAGS, access_letters
+from value_sets import cached_value_sets, write_value_set_pages
+
+Fetcher = Callable[["PageAssembler"], Dict[str, Any]]
+
+# metadata type -> function returning its template context
+FETCHERS: Dict[str, Fetcher] = {}
+
+# Objects documented on the standard object pages
+CORE_OBJECTS = [
+    "Account",
+    "Contact",
+    "Lead",
+    "Opportunity",
+    "Campaign",
+    "Case",
+    "Product2",
+    "User",
+]
+
+# Page metadata types read through the Metadata API
+METADATA_API_TYPES = {
+    "page_layouts": "Layout",
+    "flow_usage": "Flow",
+}
+
+# Field tables linking picklist fields to their value set pages
+FIELD_TYPES = ("standard_fields", "custom_fields")
+
+# Levels of a hierarchy shown per page, and of those expanded by default
+HIERARCHY_LEVELS = {"page_depth": 4, "open_depth": 2}
+
+HEADING_PATTERN = re.compile(r"^(#{1,5}) ", re.MULTILINE)
+FENCE_PATTERN = re.compile(r"^(```|~~~)")
+
+
+def fetcher(*metadata_types: str):
+    """Register a function as the context fetcher of metadata types"""
+
+    def register(func: Fetcher) -> Fetcher:
+        for metadata_type in metadata_types:
+            FETCHERS[metadata_type] = func
+        return func
+
+    return register
+
+
+def _is_custom(obj: Dict) -> bool:
+    return obj.get("api_name", "").endswith("__c")
+
+
+@fetcher("standard_objects", "object_metadata", "standard_fields", "record_types", "list_views")
+def _standard_objects(assembler: "PageAssembler") -> Dict[str, Any]:
+    return {"objects": [obj for obj in assembler.objects() if not _is_custom(obj)]}
+
+
+@fetcher("custom_objects")
+def _custom_objects(assembler: "PageAssembler") -> Dict[str, Any]:
+    return {"objects": [obj for obj in assembler.objects() if _is_custom(obj)]}
+
+
+# Custom fields also exist on standard objects, so these see every object
+@fetcher("custom_fields", "object_relationships", "validation_rules")
+def _all_objects(assembler: "PageAssembler") -> Dict[str, Any]:
+    return {"objects": assembler.objects()}
+
+
+@fetcher("field_usage")
+def _field_usage(assembler: "PageAssembler") -> Dict[str, Any]:
+    return {
+        "objects": [
+            dict(
+                obj,
+                field_usage=assembler.metadata.get_field_usage(
+                    obj["api_name"], obj.get("fields") or [], obj.get("record_count")
+                ),
+            )
+            for obj in assembler.objects()
+        ]
+    }
+
+
+def _access_rows(matrix, parents: List[int]) -> Dict[str, Any]:
+    """Per-parent summaries and the object x parent access rows"""
+    summaries = []
+    for parent in parents:
+        readable, editable = matrix.field_counts(parent)
+        summaries.append(
+            dict(matrix.parents[parent], readable_fields=readable, editable_fields=editable)
+        )
+    rows = []
+    for object_name in sorted(matrix.objects):
+        flags = matrix.object_parents(object_name, parents)
+        if any(flags):
+            rows.append((object_name, [access_letters(f) for f in flags]))
+    return {"parents": summaries, "access_rows": rows, "access_legend": OBJECT_FLAGS}
+
+
+@fetcher("profile_permissions")
+def _profiles(assembler: "PageAssembler") -> Dict[str, Any]:
+    matrix = assembler.permissions()
+    context = _access_rows(matrix, matrix.profiles())
+    context["profiles"] = context.pop("parents")
+    return context
+
+
+@fetcher("permission_sets")
+def _permission_sets(assembler: "PageAssembler") -> Dict[str, Any]:
+    matrix = assembler.permissions()
+    context = _access_rows(matrix, matrix.permission_sets())
+    context["permission_sets"] = context.pop("parents")
+    return context
+
+
+@fetcher("profile_matrix")
+def _profile_matrix(assembler: "PageAssembler") -> Dict[str, Any]:
+    matrix = assembler.permissions()
+    profiles = matrix.profiles()
+    objects = []
+    for object_name in sorted(matrix.objects):
+        fields = list(matrix.object_fields(object_name, profiles))
+        access = [access_letters(f) for f in matrix.object_parents(object_name, profiles)]
+        if fields or any(access):
+            objects.append({"name": object_name, "access": access, "fields": fields})
+    return {
+        "profiles": [matrix.parents[p] for p in profiles],
+        "matrix_objects": objects,
+        "access_legend": OBJECT_FLAGS,
+    }
+
+
+@fetcher("roles")
+def _roles(assembler: "PageAssembler") -> Dict[str, Any]:
+    return {"hierarchy": assembler.metadata.get_role_hierarchy(), **HIERARCHY_LEVELS}
+
+
+@fetcher("territories")
+def _territories(assembler: "PageAssembler") -> Dict[str, Any]:
+    return {"hierarchy": assembler.metadata.get_territory_hierarchy(), **HIERARCHY_LEVELS}
+
+
+@fetcher("page_layouts")
+def _page_layouts(assembler: "PageAssembler") -> Dict[str, Any]:
+    layouts = []
+    for layout in assembler.components("Layout"):
+        object_name, _, name = layout["fullName"].partition("-")
+        sections = [
+            {
+                "label": section.get("label") or "",
+                "style": section.get("style") or "",
+                "fields": [
+                    item["field"]
+                    for column in section.get("layoutColumns") or []
+                    if isinstance(column, dict)
+                    for item in column.get("layoutItems") or []
+                    if isinstance(item, dict) and item.get("field")
+                ],
+            }
+            for section in layout.get("layoutSections") or []
+        ]
+        layouts.append(
+            {
+                "name": name,
+                "object": object_name,
+                "sections": sections,
+                "field_count": sum(len(s["fields"]) for s in sections),
+                "related_lists": [
+                    r.get("relatedList") for r in layout.get("relatedLists") or []
+                ],
+            }
+        )
+    return {"layouts": sorted(layouts, key=lambda l: (l["object"], l["name"]))}
+
+
+@fetcher("flow_usage")
+def _flows(assembler: "PageAssembler") -> Dict[str, Any]:
+    flows = []
+    for flow in assembler.components("Flow"):
+        start = flow.get("start") or {}
+        flows.append(
+            {
+                "name": flow["fullName"],
+                "label": flow.get("label") or flow["fullName"],
+                "description": flow.get("description") or "",
+                "process_type": flow.get("processType") or "",
+                "status": flow.get("status") or "",
+                "object": start.get("object") or "",
+                "trigger_type": start.get("triggerType") or "",
+                "record_trigger_type": start.get("recordTriggerType") or "",
+                "elements": {
+                    key: len(flow.get(key) or [])
+                    for key in ("decisions", "assignments", "recordLookups", "recordUpdates",
+                                "recordCreates", "recordDeletes", "actionCalls", "subflows")
+                },
+            }
+        )
+    return {"flows": sorted(flows, key=lambda f: (f["object"], f["name"]))}
+
+
+@fetcher("apex_classes", "apex_triggers", "apex_tests")
+def _apex(assembler: "PageAssembler") -> Dict[str, Any]:
+    return dict(
+        {"classes": [], "triggers": [], "tests": [], "totals": {}},
+        **assembler.source("apex", assembler.metadata.get_apex_inventory),
+    )
+
+
+def template_environment(
+    template_dir: str, bytecode_cache: Optional[BytecodeCache] = None
+) -> Environment:
+    """Environment the templates are rendered with, also used to precompile them"""
+    # The templates put one block tag per line and rely on these
+    return Environment(
+        loader=FileSystemLoader(template_dir),
+        trim_blocks=True,
+        lstrip_blocks=True,
+        bytecode_cache=bytecode_cache,
+    )
+
+
+def kept_front_matter(path: str) -> List[str]:
+    """Front matter lines of an existing page, without the generated dates"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+    except OSError:
+        return []
+    if not text.startswith("---\n"):
+        return []
+    block, separator, _ = text[4:].partition("\n---")
+    if not separator:
+        return []
+    return [
+        line
+        for line in block.splitlines()
+        if not line.startswith((f"{CREATED_KEY}:", f"{MODIFIED_KEY}:"))
+    ]
+
+
+def demote_headings(markdown: str, levels: int = 1) -> str:
+    """Push markdown headings down by levels, leaving code blocks alone"""
+    lines = []
+    in_fence = False
+    for line in markdown.splitlines(keepends=True):
+        if FENCE_PATTERN.match(line):
+            in_fence = not in_fence
+        elif not in_fence:
+            line = HEADING_PATTERN.sub(lambda m: "#" * levels + m.group(1) + " ", line)
+        lines.append(line)
+    return "".join(lines)
+
+
+class PageAssembler:
+    """Render every docs page from all metadata types that target it"""
+
+    def __init__(
+        self,
+        metadata,
+        docs_paths: Dict[str, str],
+        template_paths: Dict[str, str],
+        template_dir: str = "templates",
+        object_names: Optional[List[str]] = None,
+        table_mode: str = "markdown",
+        docs_dir: str = "docs",
+        bytecode_cache: Optional[BytecodeCache] = None,
+    ):
+        """
+        Args:
+            metadata: SalesforceMetadata used to fetch object metadata
+            docs_paths: metadata type -> docs page
+            template_paths: metadata type -> template; only the file name is
+                used, templates are looked up in template_dir
+            template_dir: Directory containing the templates
+            object_names: Objects to document (default: core objects plus
+                the org's custom objects)
+            table_mode: "markdown" or "json", see data_tables
+            docs_dir: MkDocs docs_dir
+            bytecode_cache: Jinja bytecode cache with precompiled templates
+        """
+        if table_mode not in TABLE_MODES:
+            raise ValueError(f"Unknown table mode {table_mode!r}, expected one of {TABLE_MODES}")
+        self.metadata = metadata
+        self.docs_paths = docs_paths
+        self.template_paths = template_paths
+        self.template_dir = template_dir
+        self.object_names = object_names
+        self.table_mode = table_mode
+        self.docs_dir = docs_dir
+        self.env = template_environment(template_dir, bytecode_cache)
+        self._sources: Dict[str, Any] = {}
+        self._subpages: List[str] = []
+
+    def source(self, name: str, load: Callable[[], Any]) -> Any:
+        """Load a data source once per run and reuse it for every section"""
+        if name not in self._sources:
+            with span("fetch", source=name):
+                self._sources[name] = load()
+        return self._sources[name]
+
+    def invalidate(self, *names: str):
+        """Drop data sources and every template context, so they load again"""
+        for name in list(self._sources):
+            if name in names or name.startswith("context:"):
+                del self._sources[name]
+
+    def refresh_objects(self, object_names: List[str]):
+        """Reload some objects of the loaded object list, not all of them"""
+        objects = self._sources.get("objects")
+        known = {obj.get("api_name") for obj in objects or []}
+        if objects is None or not set(object_names) <= known:
+            # Nothing loaded yet, or new objects that may have to be added
+            self.invalidate("objects")
+            return
+        reloaded = {name: self.metadata.get_object_metadata(name) for name in object_names}
+        # Objects that failed to reload are dropped
+        self._sources["objects"] = [
+            reloaded.get(obj["api_name"], obj)
+            for obj in objects
+            if reloaded.get(obj["api_name"], obj)
+        ]
+        self.invalidate()
+
+    def objects(self) -> List[Dict]:
+        """Metadata of all documented objects"""
+        return self.source("objects", self._load_objects)
+
+    def _load_objects(self) -> List[Dict]:
+        names = self.object_names
+        if names is None:
+            names = CORE_OBJECTS + self.metadata.get_custom_object_names()
+        objects = []
+        for name in names:
+            try:
+                if metadata := self.metadata.get_object_metadata(name):
+                    objects.append(metadata)
+            except Exception as e:
+                print(f"Error processing {name}: {str(e)}")
+        return objects
+
+    def components(self, metadata_api_type: str) -> List[Dict]:
+        """Metadata API components of a type, all types fetched together"""
+        return self.source("metadata_api", self._load_components).get(metadata_api_type, [])
+
+    def permissions(self):
+        """Profile and permission set access matrix"""
+        return self.source("permissions", self.metadata.get_permission_matrix)
+
+    def _load_components(self) -> Dict[str, List[Dict]]:
+        # Only the types of pages that are rendered, retrieved concurrently
+        metadata_types = sorted(
+            {
+                METADATA_API_TYPES[t]
+                for t in self.docs_paths
+                if t in METADATA_API_TYPES and self._template(t) is not None
+            }
+        )
+        return self.metadata.get_metadata_components(metadata_types)
+
+    def pages(self) -> Dict[str, List[str]]:
+        """Docs page -> metadata types rendered on it, in map order"""
+        pages: Dict[str, List[str]] = {}
+        for metadata_type, path in self.docs_paths.items():
+            pages.setdefault(path, []).append(metadata_type)
+        return pages
+
+    def _template(self, metadata_type: str):
+        name = os.path.basename(
+            self.template_paths.get(metadata_type, f"{metadata_type}.j2")
+        )
+        try:
+            template = self.env.get_template(name)
+        except TemplateNotFound:
+            return None
+        # Placeholder templates are empty files
+        with open(template.filename, encoding="utf-8") as f:
+            if not f.read().strip():
+                return None
+        return template
+
+    def _context(self, metadata_type: str) -> Dict[str, Any]:
+        fetch = FETCHERS.get(metadata_type)
+        if fetch is None:
+            return {}
+        return self.source(f"context:{fetch.__name__}", lambda: fetch(self))
+
+    def render_page(self, path: str, metadata_types: List[str]) -> Optional[str]:
+        """
+        Render all sections of one page
+
+        Args:
+            path: Docs page being rendered
+            metadata_types: Metadata types targeting the page
+
+        Returns:
+            Page markdown, or None if no section has a template and data
+        """
+        shared = {
+            "generation_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "page_path": path,
+        }
+        sections = []
+        page_objects: Dict[str, Dict] = {}
+        for metadata_type in metadata_types:
+            template = self._template(metadata_type)
+            if template is None or metadata_type not in FETCHERS:
+                continue
+            context = dict(shared, **self._context(metadata_type))
+            context["metadata_type"] = metadata_type
+            objects = context.get("objects") or []
+            if self.table_mode == "json":
+                context["data_table"] = table_function(path, objects, self.docs_dir)
+            context["subpage"] = self._subpage_function(path, path, template, context)
+            for obj in objects:
+                page_objects[obj.get("api_name")] = obj
+
+            with span("render", template=template.name):
+                markdown = template.render(context).strip()
+            if markdown:
+                sections.append(markdown if not sections else demote_headings(markdown))
+
+        if not sections:
+            return None
+        created, modified = page_dates(
+            [
+                {"created": obj.get("created_date"), "modified": obj.get("modified_date")}
+                for obj in page_objects.values()
+            ]
+        )
+        # Hand-written front matter (title, tags, ...) survives regeneration
+        header = front_matter(created, modified, kept_front_matter(path))
+        return header + "\n\n".join(sections) + "\n"
+
+    def _subpage_function(
+        self, page_path: str, root_path: str, template, context: Dict[str, Any]
+    ) -> Callable[..., str]:
+        """
+        Build the subpage(name, **values) template function for one page
+
+        subpage() renders the same template, with values added to the
+        context, into <root page without .md>/<name>.md and returns the
+        relative link to it. Templates use it to split large content (deep
+        hierarchies, ...) over several pages.
+        """
+
+        def subpage(name: str, **values) -> str:
+            path = os.path.join(os.path.splitext(root_path)[0], f"{name}.md")
+            sub_context = dict(context, page_path=path, **values)
+            sub_context["subpage"] = self._subpage_function(path, root_path, template, sub_context)
+            with span("render", template=template.name):
+                markdown = template.render(sub_context).strip()
+            self._write(path, markdown + "\n")
+            self._subpages.append(path)
+            return os.path.relpath(path, os.path.dirname(page_path)).replace(os.sep, "/")
+
+        return subpage
+
+    def _write(self, path: str, markdown: str):
+        get_writer().write(path, markdown)
+
+    def _remove_stale_subpages(self):
+        """Delete sub-pages of earlier runs next to the ones written now"""
+        current = set(self._subpages)
+        for directory in {os.path.dirname(path) for path in current}:
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if name.endswith(".md") and path not in current:
+                    os.remove(path)
+
+    def _write_value_sets(self, page_path: str) -> List[str]:
+        """Value set pages next to a field table page, from the cached value lists"""
+        store = cached_value_sets(self.metadata.cache, self.objects())
+        if not store.sets:
+            return []
+        # The object pages are written by the generators, not next to this page
+        return write_value_set_pages(store, os.path.dirname(page_path), self.env, object_links=False)
+
+    def assemble(self, paths: Optional[List[str]] = None) -> List[str]:
+        """
+        Render and write every page that has at least one section
+
+        Args:
+            paths: Only render these pages (default: all)
+
+        Returns:
+            Paths of the pages written, sub-pages included
+        """
+        written = []
+        self._subpages = []
+        for path, metadata_types in self.pages().items():
+            if paths is not None and path not in paths:
+                continue
+            try:
+                markdown = self.render_page(path, metadata_types)
+            except Exception as e:
+                print(f"Error rendering {path}: {str(e)}")
+                continue
+            if markdown is None:
+                continue
+            self._write(path, markdown)
+            written.append(path)
+            if any(t in FIELD_TYPES for t in metadata_types):
+                written += self._write_value_sets(path)
+        self._remove_stale_subpages()
+        print(f"Assembled {len(written)} pages and {len(self._subpages)} sub-pages")
+        return written + self._subpages
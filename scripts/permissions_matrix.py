@@ -0,0 +1,293 @@
+"""
+Compact profile x object x field permission matrix
+
+ObjectPermissions and FieldPermissions have one row per permission set (or
+profile) and object/field; large orgs have millions of them. Kept as dicts
+they take gigabytes, so the rows are streamed into a compact layout instead:
+
+    parents   profiles and permission sets, in load order
+    objects   object API names
+    fields    "Object.Field" names, grouped by object so that the fields of
+              one object are a contiguous index range
+
+    object access   one byte of CREDVM flags per (parent, object)
+    field access    two bit planes (read, edit) with one byte-aligned row of
+                    len(fields) bits per parent
+
+While loading, rows are staged in typed arrays (a few bytes per row); freeze()
+packs them into the final layout. Slicing per parent is a contiguous byte
+range, per object a contiguous bit range of every parent row.
+"""
+
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from instrumentation import span
+from query_iterator import iter_query
+
+# (ObjectPermissions field, letter); the flag bit is the position
+OBJECT_FLAGS = (
+    ("PermissionsCreate", "C"),
+    ("PermissionsRead", "R"),
+    ("PermissionsEdit", "E"),
+    ("PermissionsDelete", "D"),
+    ("PermissionsViewAllRecords", "V"),
+    ("PermissionsModifyAllRecords", "M"),
+)
+
+# System permissions shown next to the matrix
+SYSTEM_PERMISSIONS = (
+    "PermissionsApiEnabled",
+    "PermissionsModifyAllData",
+    "PermissionsViewAllData",
+    "PermissionsManageUsers",
+    "PermissionsRunReports",
+    "PermissionsExportReport",
+)
+
+PARENT_QUERY = (
+    "SELECT Id, Name, Label, Description, IsOwnedByProfile, Profile.Name, "
+    + ", ".join(SYSTEM_PERMISSIONS)
+    + " FROM PermissionSet"
+)
+OBJECT_QUERY = (
+    "SELECT ParentId, SobjectType, "
+    + ", ".join(name for name, _ in OBJECT_FLAGS)
+    + " FROM ObjectPermissions"
+)
+FIELD_QUERY = "SELECT ParentId, Field, PermissionsRead, PermissionsEdit FROM FieldPermissions"
+
+
+def access_letters(flags: int) -> str:
+    """CREDVM letters of an object access byte"""
+    return "".join(letter for bit, (_, letter) in enumerate(OBJECT_FLAGS) if flags >> bit & 1)
+
+
+def _row_flags(record: Dict) -> int:
+    return sum(1 << bit for bit, (name, _) in enumerate(OBJECT_FLAGS) if record.get(name))
+
+
+class PermissionMatrix:
+    """Object and field access of every profile and permission set"""
+
+    def __init__(self):
+        self.parents: List[Dict] = []
+        self.objects: List[str] = []
+        self.fields: List[str] = []
+        self._parent_index: Dict[str, int] = {}
+        self._object_index: Dict[str, int] = {}
+        self._field_index: Dict[str, int] = {}
+        # object -> (first field index, end field index) after freeze()
+        self._field_ranges: Dict[str, Tuple[int, int]] = {}
+        self._object_access = bytearray()
+        self._read = bytearray()
+        self._edit = bytearray()
+        self._row_bytes = 0
+        # Rows staged until freeze(): (parent, object or field, flags)
+        self._staged_objects = (array("I"), array("I"), array("B"))
+        self._staged_fields = (array("I"), array("I"), array("B"))
+        self.frozen = False
+
+    # Loading
+
+    def add_parent(
+        self,
+        parent_id: str,
+        name: str,
+        label: Optional[str] = None,
+        profile: Optional[str] = None,
+        description: str = "",
+        system_permissions: Sequence[str] = (),
+    ) -> int:
+        """Register a permission set; profile is the owning profile's name"""
+        index = self._parent_index.get(parent_id)
+        if index is None:
+            index = self._parent_index[parent_id] = len(self.parents)
+            self.parents.append(
+                {
+                    "id": parent_id,
+                    "name": profile or name,
+                    "label": profile or label or name,
+                    "description": description or "",
+                    "is_profile": profile is not None,
+                    "system_permissions": list(system_permissions),
+                }
+            )
+        return index
+
+    def _intern_object(self, name: str) -> int:
+        index = self._object_index.get(name)
+        if index is None:
+            index = self._object_index[name] = len(self.objects)
+            self.objects.append(name)
+        return index
+
+    def _intern_field(self, name: str) -> int:
+        index = self._field_index.get(name)
+        if index is None:
+            index = self._field_index[name] = len(self.fields)
+            self.fields.append(name)
+            self._intern_object(name.split(".", 1)[0])
+        return index
+
+    def add_object_permission(self, parent_id: str, object_name: str, flags: int):
+        parents, objects, values = self._staged_objects
+        parents.append(self.add_parent(parent_id, parent_id))
+        objects.append(self._intern_object(object_name))
+        values.append(flags)
+
+    def add_field_permission(self, parent_id: str, field: str, read: bool, edit: bool):
+        parents, fields, values = self._staged_fields
+        parents.append(self.add_parent(parent_id, parent_id))
+        fields.append(self._intern_field(field))
+        values.append((1 if read else 0) | (2 if edit else 0))
+
+    def freeze(self) -> "PermissionMatrix":
+        """Pack the staged rows into the final layout"""
+        # Group fields by object so every object is one contiguous range
+        order = sorted(range(len(self.fields)), key=lambda i: self.fields[i])
+        remap = array("I", bytes(4 * len(order)))
+        for new, old in enumerate(order):
+            remap[old] = new
+        self.fields = [self.fields[i] for i in order]
+        self._field_index = {name: i for i, name in enumerate(self.fields)}
+        self._field_ranges = {}
+        for i, name in enumerate(self.fields):
+            object_name = name.split(".", 1)[0]
+            start, _ = self._field_ranges.get(object_name, (i, i))
+            self._field_ranges[object_name] = (start, i + 1)
+
+        n_parents, n_objects = len(self.parents), len(self.objects)
+        self._object_access = bytearray(n_parents * n_objects)
+        for parent, obj, flags in zip(*self._staged_objects):
+            self._object_access[parent * n_objects + obj] |= flags
+
+        self._row_bytes = (len(self.fields) + 7) // 8
+        self._read = bytearray(n_parents * self._row_bytes)
+        self._edit = bytearray(n_parents * self._row_bytes)
+        for parent, field, flags in zip(*self._staged_fields):
+            bit = remap[field]
+            offset = parent * self._row_bytes + (bit >> 3)
+            mask = 1 << (bit & 7)
+            if flags & 1:
+                self._read[offset] |= mask
+            if flags & 2:
+                self._edit[offset] |= mask
+
+        self._staged_objects = (array("I"), array("I"), array("B"))
+        self._staged_fields = (array("I"), array("I"), array("B"))
+        self.frozen = True
+        return self
+
+    # Slicing
+
+    def parent_index(self, parent_id: str) -> int:
+        return self._parent_index[parent_id]
+
+    def profiles(self) -> List[int]:
+        return [i for i, p in enumerate(self.parents) if p["is_profile"]]
+
+    def permission_sets(self) -> List[int]:
+        return [i for i, p in enumerate(self.parents) if not p["is_profile"]]
+
+    def object_access(self, parent: int, object_name: str) -> int:
+        index = self._object_index.get(object_name)
+        if index is None:
+            return 0
+        return self._object_access[parent * len(self.objects) + index]
+
+    def parent_objects(self, parent: int) -> Iterator[Tuple[str, int]]:
+        """(object, flags) of every object a parent has access to"""
+        start = parent * len(self.objects)
+        row = self._object_access[start : start + len(self.objects)]
+        for index, flags in enumerate(row):
+            if flags:
+                yield self.objects[index], flags
+
+    def object_parents(self, object_name: str, parents: Iterable[int]) -> List[int]:
+        """Access flags of one object for each of the given parents"""
+        return [self.object_access(parent, object_name) for parent in parents]
+
+    def _bits(self, plane: bytearray, parent: int, start: int, end: int) -> int:
+        """Bits start..end of a parent row as an int (bit 0 = field start)"""
+        if end <= start:
+            return 0
+        offset = parent * self._row_bytes
+        chunk = plane[offset + (start >> 3) : offset + ((end + 7) >> 3)]
+        value = int.from_bytes(chunk, "little") >> (start & 7)
+        return value & ((1 << (end - start)) - 1)
+
+    def field_counts(self, parent: int, object_name: Optional[str] = None) -> Tuple[int, int]:
+        """(readable, editable) field counts of a parent, optionally for one object"""
+        if object_name is None:
+            start, end = 0, len(self.fields)
+        else:
+            start, end = self._field_ranges.get(object_name, (0, 0))
+        return (
+            self._bits(self._read, parent, start, end).bit_count(),
+            self._bits(self._edit, parent, start, end).bit_count(),
+        )
+
+    def field_access(self, parent: int, field: str) -> Tuple[bool, bool]:
+        index = self._field_index.get(field)
+        if index is None:
+            return False, False
+        return (
+            bool(self._bits(self._read, parent, index, index + 1)),
+            bool(self._bits(self._edit, parent, index, index + 1)),
+        )
+
+    def object_fields(
+        self, object_name: str, parents: Sequence[int]
+    ) -> Iterator[Tuple[str, List[str]]]:
+        """(field, ["R" / "RE" / "" per parent]) for the fields of one object"""
+        start, end = self._field_ranges.get(object_name, (0, 0))
+        reads = [self._bits(self._read, p, start, end) for p in parents]
+        edits = [self._bits(self._edit, p, start, end) for p in parents]
+        for i in range(end - start):
+            yield self.fields[start + i].split(".", 1)[1], [
+                ("R" if read >> i & 1 else "") + ("E" if edit >> i & 1 else "")
+                for read, edit in zip(reads, edits)
+            ]
+
+    def memory_bytes(self) -> int:
+        """Size of the packed access data"""
+        return len(self._object_access) + len(self._read) + len(self._edit)
+
+
+def load_permission_matrix(sf) -> PermissionMatrix:
+    """
+    Stream PermissionSet, ObjectPermissions and FieldPermissions into a matrix
+
+    Args:
+        sf: simple_salesforce connection
+
+    Returns:
+        Frozen PermissionMatrix
+    """
+    matrix = PermissionMatrix()
+    with span("permissions", table="PermissionSet"):
+        for record in iter_query(sf, PARENT_QUERY):
+            profile = record.get("Profile") or {}
+            matrix.add_parent(
+                record["Id"],
+                record.get("Name"),
+                record.get("Label"),
+                profile.get("Name") if record.get("IsOwnedByProfile") else None,
+                record.get("Description") or "",
+                [name[len("Permissions") :] for name in SYSTEM_PERMISSIONS if record.get(name)],
+            )
+    with span("permissions", table="ObjectPermissions"):
+        for record in iter_query(sf, OBJECT_QUERY):
+            matrix.add_object_permission(
+                record["ParentId"], record["SobjectType"], _row_flags(record)
+            )
+    with span("permissions", table="FieldPermissions"):
+        for record in iter_query(sf, FIELD_QUERY):
+            matrix.add_field_permission(
+                record["ParentId"],
+                record["Field"],
+                record.get("PermissionsRead"),
+                record.get("PermissionsEdit"),
+            )
+    return matrix.freeze()
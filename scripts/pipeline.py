@@ -0,0 +1,177 @@
+"""
+Staged object pipeline with bounded queues
+
+Documenting an object is a fetch (network), a normalization and a render
+(CPU) and a write (disk). Run one object at a time, the CPU idles while a
+describe is in flight and the network idles while templates render.
+Pipeline runs every stage on its own worker threads, connected by bounded
+queues:
+
+    items -> fetch (N) -> queue -> normalize (N) -> queue -> render (N) -> queue -> write (N)
+
+A full queue blocks the stage feeding it (backpressure), so a fast stage
+never holds more than queue_size items waiting for a slow one. Results keep
+the input order. An item a stage drops (returns None) or fails on does not
+reach the later stages.
+
+Per-stage metrics (items, errors, busy and blocked time, throughput) are
+recorded on the tracer, which adds them to the run summary and the
+Prometheus metrics.
+"""
+
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from instrumentation import get_tracer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 8
+
+# Worker threads per stage of the object documentation pipelines
+DEFAULT_WORKERS = {"fetch": 4, "normalize": 1, "render": 2, "write": 1}
+
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """One step of a pipeline: a function from an item to the next item, None to drop it"""
+
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+
+
+def parse_workers(text: Optional[str]) -> Dict[str, int]:
+    """
+    Worker counts from a command-line option such as "fetch=8,render=2"
+
+    Stages not mentioned keep their DEFAULT_WORKERS count.
+    """
+    workers = dict(DEFAULT_WORKERS)
+    for part in filter(None, (text or "").split(",")):
+        name, _, count = part.partition("=")
+        name = name.strip()
+        if name not in workers or not count.strip().isdigit() or int(count) < 1:
+            raise ValueError(f"Invalid stage workers {part!r}, expected e.g. fetch=8,render=2")
+        workers[name] = int(count)
+    return workers
+
+
+class Pipeline:
+    """Run items through stages on worker threads with bounded queues between them"""
+
+    def __init__(self, stages: List[Stage], queue_size: int = DEFAULT_QUEUE_SIZE):
+        """
+        Args:
+            stages: Stages in order; each gets the previous stage's output
+            queue_size: Items waiting in front of each stage at most
+        """
+        self.stages = stages
+        self.queue_size = queue_size
+        self.stats: Dict[str, Dict[str, Any]] = {}
+
+    def run(self, items: Iterable) -> List:
+        """
+        Run every item through all stages
+
+        Returns:
+            Outputs of the last stage, in input order
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        results: Dict[int, Any] = {}
+        lock = threading.Lock()
+        running = [stage.workers for stage in self.stages]
+        self.stats = {
+            stage.name: {
+                "workers": stage.workers,
+                "items": 0,
+                "dropped": 0,
+                "errors": 0,
+                "busy_seconds": 0.0,
+                "blocked_seconds": 0.0,
+            }
+            for stage in self.stages
+        }
+
+        def put(index: int, item):
+            """Hand an item to stage index, timing how long a full queue blocks"""
+            started = time.perf_counter()
+            queues[index].put(item)
+            return time.perf_counter() - started
+
+        def work(index: int):
+            stage = self.stages[index]
+            stats = self.stats[stage.name]
+            last = index == len(self.stages) - 1
+            while True:
+                entry = queues[index].get()
+                if entry is _DONE:
+                    with lock:
+                        running[index] -= 1
+                        finished = running[index] == 0
+                    # The last worker of a stage tells every worker of the next
+                    if finished and not last:
+                        for _ in range(self.stages[index + 1].workers):
+                            put(index + 1, _DONE)
+                    return
+                position, item = entry
+                started = time.perf_counter()
+                try:
+                    output = stage.func(item)
+                except Exception as e:
+                    logger.error(f"{stage.name} failed for item {position}: {str(e)}")
+                    output, failed = None, True
+                else:
+                    failed = False
+                busy = time.perf_counter() - started
+                blocked = 0.0
+                if output is not None:
+                    if last:
+                        with lock:
+                            results[position] = output
+                    else:
+                        blocked = put(index + 1, (position, output))
+                with lock:
+                    stats["items"] += 1
+                    stats["busy_seconds"] += busy
+                    stats["blocked_seconds"] += blocked
+                    if failed:
+                        stats["errors"] += 1
+                    elif output is None:
+                        stats["dropped"] += 1
+
+        threads = [
+            threading.Thread(target=work, args=(index,), name=f"{stage.name}-{n}", daemon=True)
+            for index, stage in enumerate(self.stages)
+            for n in range(stage.workers)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        # Feeding blocks too once the first stage falls behind
+        feed_blocked = 0.0
+        for position, item in enumerate(items):
+            feed_blocked += put(0, (position, item))
+        for _ in range(self.stages[0].workers):
+            put(0, _DONE)
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        tracer = get_tracer()
+        for stage in self.stages:
+            stats = self.stats[stage.name]
+            stats["seconds"] = elapsed
+            stats["items_per_second"] = stats["items"] / elapsed if elapsed else 0.0
+            tracer.record_stage(stage.name, stats)
+        logger.info(
+            f"Pipeline of {len(self.stages)} stages: {len(results)} items in {elapsed:.2f}s, "
+            f"feeding blocked {feed_blocked:.2f}s"
+        )
+        return [results[position] for position in sorted(results)]
@@ -0,0 +1,165 @@
+"""
+Lazy SOQL query iteration across result pages
+
+A query result holds at most one batch of records (2,000 by default); the
+rest has to be fetched page by page through nextRecordsUrl. iter_query()
+yields the records of all pages lazily, so callers never read only the
+first batch, and loads the following pages on a background thread while the
+caller is still processing the current one.
+
+The prefetch depth is the number of pages loaded ahead of the caller. 0
+fetches every page on demand in the calling thread; the default comes from
+set_prefetch_depth() (the --query-prefetch option of the CLI).
+"""
+
+import logging
+import queue
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PREFETCH = 2
+
+_prefetch_depth = DEFAULT_PREFETCH
+
+# Queue item that ends the page stream
+_DONE = object()
+
+
+def set_prefetch_depth(depth: int):
+    """Set the number of pages loaded ahead by default, 0 disables prefetching"""
+    global _prefetch_depth
+    if depth < 0:
+        raise ValueError(f"Prefetch depth must be 0 or more, got {depth}")
+    _prefetch_depth = depth
+
+
+def get_prefetch_depth() -> int:
+    return _prefetch_depth
+
+
+class QueryIterator:
+    """Records of a REST or Tooling API query, page by page"""
+
+    def __init__(self, sf, soql: str, tooling: bool = False, prefetch: Optional[int] = None):
+        """
+        Args:
+            sf: simple_salesforce connection
+            soql: Query to run
+            tooling: Run the query against the Tooling API
+            prefetch: Pages loaded ahead of the caller (default: get_prefetch_depth())
+        """
+        self.sf = sf
+        self.soql = soql
+        self.tooling = tooling
+        self.prefetch = get_prefetch_depth() if prefetch is None else prefetch
+        self.total_size: Optional[int] = None
+        self.pages = 0
+        self._first: Optional[Dict] = None
+
+    def _fetch(self, next_url: Optional[str]) -> Dict:
+        if self.tooling:
+            with span("query_page", api="tooling", page=self.pages):
+                if next_url is None:
+                    return self.sf.toolingexecute("query/", params={"q": self.soql})
+                # nextRecordsUrl is absolute, toolingexecute wants it below tooling/
+                return self.sf.toolingexecute(next_url.split("/tooling/", 1)[1])
+        with span("query_page", api="rest", page=self.pages):
+            if next_url is None:
+                return self.sf.query(self.soql)
+            return self.sf.query_more(next_url, identifier_is_url=True)
+
+    def _next_url(self, result: Dict) -> Optional[str]:
+        if result.get("done", True):
+            return None
+        return result.get("nextRecordsUrl")
+
+    def first_page(self) -> Dict:
+        """First result page; sets total_size (the only result of COUNT() queries)"""
+        if self._first is None:
+            self._first = self._fetch(None)
+            self.pages = 1
+            self.total_size = self._first.get("totalSize", 0)
+        return self._first
+
+    def _pages_inline(self, next_url: Optional[str]) -> Iterator[Dict]:
+        while next_url:
+            result = self._fetch(next_url)
+            self.pages += 1
+            yield result
+            next_url = self._next_url(result)
+
+    def _pages_prefetched(self, next_url: str) -> Tuple[Iterator[Dict], Callable[[], None]]:
+        """Start loading pages on a worker thread; returns the pages and a stop function"""
+        pages: queue.Queue = queue.Queue(maxsize=self.prefetch)
+        stopped = threading.Event()
+
+        def produce(url: Optional[str]):
+            try:
+                while url and not stopped.is_set():
+                    result = self._fetch(url)
+                    self.pages += 1
+                    pages.put(result)
+                    url = self._next_url(result)
+            except Exception as e:
+                pages.put(e)
+            pages.put(_DONE)
+
+        worker = threading.Thread(target=produce, args=(next_url,), daemon=True)
+        worker.start()
+
+        def consume() -> Iterator[Dict]:
+            while True:
+                item = pages.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+
+        def stop():
+            # The caller may stop early: unblock the worker and let it finish
+            stopped.set()
+            while worker.is_alive():
+                try:
+                    pages.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+        return consume(), stop
+
+    def __iter__(self) -> Iterator[Dict]:
+        first = self.first_page()
+        next_url = self._next_url(first)
+        if not next_url:
+            yield from first.get("records", [])
+            return
+        # The next pages load while the caller works through the first one
+        if self.prefetch > 0:
+            pages, stop = self._pages_prefetched(next_url)
+        else:
+            pages, stop = self._pages_inline(next_url), lambda: None
+        try:
+            yield from first.get("records", [])
+            for page in pages:
+                yield from page.get("records", [])
+        finally:
+            stop()
+
+
+def iter_query(sf, soql: str, tooling: bool = False, prefetch: Optional[int] = None) -> QueryIterator:
+    """Iterate over all records of a query, see QueryIterator"""
+    return QueryIterator(sf, soql, tooling=tooling, prefetch=prefetch)
+
+
+def query_all(sf, soql: str, tooling: bool = False, prefetch: Optional[int] = None) -> List[Dict]:
+    """All records of a query as a list"""
+    return list(iter_query(sf, soql, tooling=tooling, prefetch=prefetch))
+
+
+def query_count(sf, soql: str, tooling: bool = False) -> int:
+    """totalSize of a query, for SELECT COUNT() queries"""
+    return QueryIterator(sf, soql, tooling=tooling).first_page().get("totalSize", 0)
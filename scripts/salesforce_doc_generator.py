@@ -5,7 +5,14 @@ import json
 import logging
 from datetime import datetime
 from jinja2 import Environment, FileSystemLoader
-from simple_salesforce import Salesforce
+
+from instrumentation import finish_run, span
+from object_dates import fetch_object_dates
+from output_writer import get_writer
+from pipeline import DEFAULT_WORKERS, Pipeline, Stage, parse_workers
+from query_iterator import query_all
+from sf_session import connect, is_replaying
+from value_sets import ValueSetStore, write_value_set_pages
 
 # Configure logging
 logging.basicConfig(
@@ -16,19 +23,31 @@ logger = logging.getLogger(__name__)
 
 class SalesforceDocumentationGenerator:
     def __init__(self, username=None, password=None, security_token=None, 
-                 domain='login', template_path='templates/object_documentation.j2'):
+                 domain='login', template_path='templates/object_documentation.j2',
+                 sf_connection=None, cassette=None, cassette_mode=None,
+                 pipeline_workers=None):
         """
         Initialize the documentation generator with Salesforce credentials
-        and template configuration.
+        and template configuration. An existing connection can be passed as
+        sf_connection instead of credentials, and Salesforce traffic can be
+        recorded to or replayed from a cassette file. pipeline_workers sets
+        the workers per pipeline stage (see pipeline.DEFAULT_WORKERS).
         """
-        self.sf = None
-        if username and password:
+        self.sf = sf_connection
+        self.pipeline_workers = dict(DEFAULT_WORKERS, **(pipeline_workers or {}))
+        self._object_dates = None
+        # Picklist value lists of the normalized objects, each kept once
+        self.value_sets = ValueSetStore()
+        if self.sf is None and (
+                (username and password) or is_replaying(cassette, cassette_mode)):
             try:
-                self.sf = Salesforce(
+                self.sf = connect(
                     username=username,
                     password=password,
                     security_token=security_token,
-                    domain=domain
+                    domain=domain,
+                    cassette=cassette,
+                    cassette_mode=cassette_mode
                 )
                 logger.info(f"Successfully connected to Salesforce as {username}")
             except Exception as e:
@@ -42,6 +61,14 @@ class SalesforceDocumentationGenerator:
         self.template = self.env.get_template(template_file)
         logger.info(f"Using template: {template_path}")
     
+    def _get_object_dates(self):
+        """
+        Created and last-modified dates of all objects, fetched once.
+        """
+        if self._object_dates is None:
+            self._object_dates = fetch_object_dates(self.sf)
+        return self._object_dates
+
     def _get_object_metadata(self, object_name):
         """
         Fetch metadata for a specific Salesforce object.
@@ -52,100 +79,153 @@ class SalesforceDocumentationGenerator:
         Returns:
             dict: Object metadata
         """
+        raw = self._fetch_object_data(object_name)
+        if raw is None:
+            return None
+        try:
+            return self._normalize_object_data(raw)
+        except Exception as e:
+            logger.error(f"Error getting metadata for {object_name}: {str(e)}")
+            return None
+    
+    def _fetch_object_data(self, object_name):
+        """
+        Fetch the raw describe, record types and validation rules of an object,
+        the network part of _get_object_metadata().
+        
+        Args:
+            object_name (str): API name of the Salesforce object
+            
+        Returns:
+            dict: Raw object data, or None if the object could not be described
+        """
         try:
             # Get the object description
-            obj_desc = getattr(self.sf, object_name).describe()
+            with span("describe", object=object_name):
+                obj_desc = getattr(self.sf, object_name).describe()
+        except Exception as e:
+            logger.error(f"Error getting metadata for {object_name}: {str(e)}")
+            return None
+        
+        raw = {
+            "describe": obj_desc,
+            "dates": self._get_object_dates().get(object_name) or {},
+            "record_types": [],
+            "validation_rules": []
+        }
+        
+        # Get record types
+        try:
+            query = f"SELECT Id, Name, DeveloperName, Description, IsActive FROM RecordType WHERE SObjectType = '{object_name}'"
+            with span("soql_query", object=object_name):
+                raw["record_types"] = query_all(self.sf, query)
+        except Exception as e:
+            logger.warning(f"Failed to get record types for {object_name}: {str(e)}")
+        
+        # Get validation rules
+        try:
+            # Using tooling API to get validation rules
+            query = f"SELECT Id, ValidationName, Active, Description, ErrorMessage FROM ValidationRule WHERE EntityDefinition.QualifiedApiName = '{object_name}'"
+            with span("tooling_query", object=object_name):
+                raw["validation_rules"] = query_all(self.sf, query, tooling=True)
+        except Exception as e:
+            logger.warning(f"Failed to get validation rules for {object_name}: {str(e)}")
+        
+        return raw
+    
+    def _normalize_object_data(self, raw):
+        """
+        Turn the raw data of _fetch_object_data() into the template's object data.
+        
+        Args:
+            raw (dict): Output of _fetch_object_data()
             
-            # Basic object info
-            obj_data = {
-                "label": obj_desc["label"],
-                "api_name": obj_desc["name"],
-                "plural_label": obj_desc["labelPlural"],
-                "custom": obj_desc["custom"],
-                "description": obj_desc.get("description", "No description available"),
-                "sharing_model": obj_desc.get("sharingModel", "Unknown"),
-                "searchable": obj_desc.get("searchable", False),
-                "deletable": obj_desc.get("deletable", False),
-                "feed_enabled": obj_desc.get("feedEnabled", False),
-                "fields": [],
-                "relationships": {
-                    "child_relationships": [],
-                    "reference_fields": []
-                },
-                "record_types": [],
-                "validation_rules": []
+        Returns:
+            dict: Object metadata
+        """
+        obj_desc = raw["describe"]
+        dates = raw["dates"]
+        
+        # Basic object info
+        obj_data = {
+            "label": obj_desc["label"],
+            "api_name": obj_desc["name"],
+            "plural_label": obj_desc["labelPlural"],
+            "custom": obj_desc["custom"],
+            "description": obj_desc.get("description", "No description available"),
+            "sharing_model": obj_desc.get("sharingModel", "Unknown"),
+            "searchable": obj_desc.get("searchable", False),
+            "deletable": obj_desc.get("deletable", False),
+            "feed_enabled": obj_desc.get("feedEnabled", False),
+            "created_date": dates.get("created"),
+            "modified_date": dates.get("modified"),
+            "fields": [],
+            "relationships": {
+                "child_relationships": [],
+                "reference_fields": []
+            },
+            "record_types": [],
+            "validation_rules": []
+        }
+        
+        # Add fields information
+        self.value_sets.cover(obj_desc["name"])
+        for field in obj_desc["fields"]:
+            field_data = {
+                "label": field["label"],
+                "api_name": field["name"],
+                "type": field["type"],
+                "required": not field["nillable"],
+                "description": field.get("description", "")
             }
+            # Fields link to a shared value set page instead of listing the values
+            if field.get("picklistValues"):
+                field_data["value_set"] = self.value_sets.add(
+                    obj_desc["name"], field["name"], field["label"], field["picklistValues"]
+                )
+                field_data["value_count"] = len(field["picklistValues"])
+            obj_data["fields"].append(field_data)
             
-            # Add fields information
-            for field in obj_desc["fields"]:
-                field_data = {
+            # If it's a reference field, add to relationship section
+            if field["type"] == "reference" and field.get("referenceTo"):
+                ref_data = {
                     "label": field["label"],
                     "api_name": field["name"],
-                    "type": field["type"],
-                    "required": not field["nillable"],
+                    "reference_to": ", ".join(field["referenceTo"]),
                     "description": field.get("description", "")
                 }
-                obj_data["fields"].append(field_data)
-                
-                # If it's a reference field, add to relationship section
-                if field["type"] == "reference" and field.get("referenceTo"):
-                    ref_data = {
-                        "label": field["label"],
-                        "api_name": field["name"],
-                        "reference_to": ", ".join(field["referenceTo"]),
-                        "description": field.get("description", "")
-                    }
-                    obj_data["relationships"]["reference_fields"].append(ref_data)
-            
-            # Add child relationships
-            for rel in obj_desc.get("childRelationships", []):
-                if rel.get("childSObject") and rel.get("field"):
-                    rel_data = {
-                        "label": rel.get("childSObject"),
-                        "api_name": rel.get("field"),
-                        "description": f"Child relationship from {rel.get('childSObject')}"
-                    }
-                    obj_data["relationships"]["child_relationships"].append(rel_data)
-            
-            # Get record types
-            try:
-                query = f"SELECT Id, Name, DeveloperName, Description, IsActive FROM RecordType WHERE SObjectType = '{object_name}'"
-                record_types = self.sf.query(query)
-                
-                for rt in record_types.get("records", []):
-                    rt_data = {
-                        "label": rt.get("Name"),
-                        "api_name": rt.get("DeveloperName"),
-                        "active": rt.get("IsActive", False),
-                        "description": rt.get("Description", "")
-                    }
-                    obj_data["record_types"].append(rt_data)
-            except Exception as e:
-                logger.warning(f"Failed to get record types for {object_name}: {str(e)}")
-            
-            # Get validation rules
-            try:
-                # Using tooling API to get validation rules
-                query = f"SELECT Id, ValidationName, Active, Description, ErrorMessage FROM ValidationRule WHERE EntityDefinition.QualifiedApiName = '{object_name}'"
-                validation_rules = self.sf.tooling.query(query)
-                
-                for vr in validation_rules.get("records", []):
-                    vr_data = {
-                        "label": vr.get("ValidationName"),
-                        "api_name": vr.get("ValidationName"),
-                        "active": vr.get("Active", False),
-                        "description": vr.get("Description", ""),
-                        "error_message": vr.get("ErrorMessage", "")
-                    }
-                    obj_data["validation_rules"].append(vr_data)
-            except Exception as e:
-                logger.warning(f"Failed to get validation rules for {object_name}: {str(e)}")
-            
-            return obj_data
-            
-        except Exception as e:
-            logger.error(f"Error getting metadata for {object_name}: {str(e)}")
-            return None
+                obj_data["relationships"]["reference_fields"].append(ref_data)
+        
+        # Add child relationships
+        for rel in obj_desc.get("childRelationships", []):
+            if rel.get("childSObject") and rel.get("field"):
+                rel_data = {
+                    "label": rel.get("childSObject"),
+                    "api_name": rel.get("field"),
+                    "description": f"Child relationship from {rel.get('childSObject')}"
+                }
+                obj_data["relationships"]["child_relationships"].append(rel_data)
+        
+        for rt in raw["record_types"]:
+            rt_data = {
+                "label": rt.get("Name"),
+                "api_name": rt.get("DeveloperName"),
+                "active": rt.get("IsActive", False),
+                "description": rt.get("Description", "")
+            }
+            obj_data["record_types"].append(rt_data)
+        
+        for vr in raw["validation_rules"]:
+            vr_data = {
+                "label": vr.get("ValidationName"),
+                "api_name": vr.get("ValidationName"),
+                "active": vr.get("Active", False),
+                "description": vr.get("Description", ""),
+                "error_message": vr.get("ErrorMessage", "")
+            }
+            obj_data["validation_rules"].append(vr_data)
+        
+        return obj_data
     
     def generate_object_documentation(self, object_name, output_path=None):
         """
@@ -167,18 +247,66 @@ class SalesforceDocumentationGenerator:
             logger.error(f"Could not generate documentation for {object_name}")
             return None
         
-        # Render documentation with template
-        documentation = self.template.render(object_data=object_data)
+        documentation = self._render(object_data)
         
         # Save to file if output path provided
         if output_path:
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            with open(output_path, "w") as file:
-                file.write(documentation)
-            logger.info(f"Documentation saved to {output_path}")
+            self._write(output_path, documentation)
+            self._write_value_sets(os.path.dirname(output_path))
         
         return documentation
     
+    def _render(self, object_data):
+        """
+        Render the documentation of one object with the template.
+        """
+        with span("render", object=object_data.get("api_name")):
+            return self.template.render(object_data=object_data)
+    
+    def _write(self, output_path, documentation):
+        if get_writer().write(output_path, documentation):
+            logger.info(f"Documentation saved to {output_path}")
+    
+    def _write_value_sets(self, output_dir):
+        """
+        Write the pages of the picklist value sets of the objects normalized so far.
+        """
+        if self.value_sets.sets:
+            write_value_set_pages(self.value_sets, output_dir, self.env)
+    
+    def document_objects(self, object_names, output_dir):
+        """
+        Fetch, normalize, render and write several objects in a pipeline,
+        each step on its own workers (see pipeline).
+        
+        Args:
+            object_names (list): API names of the objects
+            output_dir (str): Directory to save the documentation files
+            
+        Returns:
+            list: Objects documented, in the order given
+        """
+        # Loaded once up front instead of by every fetch worker at once
+        self._get_object_dates()
+        
+        def render(object_data):
+            return object_data["api_name"], self._render(object_data)
+        
+        def write(page):
+            object_name, documentation = page
+            self._write(os.path.join(output_dir, f"{object_name.lower()}.md"), documentation)
+            return object_name
+        
+        workers = self.pipeline_workers
+        documented = Pipeline([
+            Stage("fetch", self._fetch_object_data, workers["fetch"]),
+            Stage("normalize", self._normalize_object_data, workers["normalize"]),
+            Stage("render", render, workers["render"]),
+            Stage("write", write, workers["write"])
+        ]).run(object_names)
+        self._write_value_sets(output_dir)
+        return documented
+    
     def generate_standard_objects_documentation(self, output_dir="docs/data-model/objects"):
         """
         Generate documentation for all standard objects in Salesforce.
@@ -194,18 +322,11 @@ class SalesforceDocumentationGenerator:
             return []
         
         # Get the global describe to list all objects
-        describe = self.sf.describe()
+        with span("describe_global"):
+            describe = self.sf.describe()
         standard_objects = [obj["name"] for obj in describe["sobjects"] if not obj["custom"]]
         
-        documented_objects = []
-        for obj_name in standard_objects:
-            try:
-                output_path = os.path.join(output_dir, f"{obj_name.lower()}.md")
-                result = self.generate_object_documentation(obj_name, output_path)
-                if result:
-                    documented_objects.append(obj_name)
-            except Exception as e:
-                logger.error(f"Error documenting {obj_name}: {str(e)}")
+        documented_objects = self.document_objects(standard_objects, output_dir)
         
         logger.info(f"Generated documentation for {len(documented_objects)} standard objects")
         return documented_objects
@@ -225,18 +346,11 @@ class SalesforceDocumentationGenerator:
             return []
         
         # Get the global describe to list all objects
-        describe = self.sf.describe()
+        with span("describe_global"):
+            describe = self.sf.describe()
         custom_objects = [obj["name"] for obj in describe["sobjects"] if obj["custom"]]
         
-        documented_objects = []
-        for obj_name in custom_objects:
-            try:
-                output_path = os.path.join(output_dir, f"{obj_name.lower()}.md")
-                result = self.generate_object_documentation(obj_name, output_path)
-                if result:
-                    documented_objects.append(obj_name)
-            except Exception as e:
-                logger.error(f"Error documenting {obj_name}: {str(e)}")
+        documented_objects = self.document_objects(custom_objects, output_dir)
         
         logger.info(f"Generated documentation for {len(documented_objects)} custom objects")
         return documented_objects
@@ -244,7 +358,8 @@ class SalesforceDocumentationGenerator:
 
 def setup_documentation_generator(username, password, security_token, 
                                 template_path='templates/object_documentation.j2', 
-                                domain='login'):
+                                domain='login', cassette=None, cassette_mode=None,
+                                pipeline_workers=None):
     """
     Set up the documentation generator with the provided credentials.
     
@@ -254,6 +369,9 @@ def setup_documentation_generator(username, password, security_token,
         security_token (str): Salesforce security token
         template_path (str): Path to the Jinja2 template
         domain (str): Salesforce login domain
+        cassette (str): Cassette file to record to or replay from
+        cassette_mode (str): record, replay or strict
+        pipeline_workers (dict): Workers per pipeline stage
         
     Returns:
         SalesforceDocumentationGenerator: Configured generator instance
@@ -264,7 +382,10 @@ def setup_documentation_generator(username, password, security_token,
             password=password,
             security_token=security_token,
             template_path=template_path,
-            domain=domain
+            domain=domain,
+            cassette=cassette,
+            cassette_mode=cassette_mode,
+            pipeline_workers=pipeline_workers
         )
         return generator
     except Exception as e:
@@ -283,6 +404,13 @@ if __name__ == "__main__":
     parser.add_argument("--object", help="Specific object to document")
     parser.add_argument("--standard", action="store_true", help="Document standard objects")
     parser.add_argument("--custom", action="store_true", help="Document custom objects")
+    parser.add_argument("--cassette", help="Cassette file to record to or replay from")
+    parser.add_argument("--cassette-mode", choices=["record", "replay", "strict"],
+                        help="record, replay, or strict replay")
+    parser.add_argument("--pipeline-workers", type=parse_workers, default=dict(DEFAULT_WORKERS),
+                        help="Workers per pipeline stage, e.g. fetch=8,render=2")
+    parser.add_argument("--trace", help="Write a JSON trace of the run to this file")
+    parser.add_argument("--metrics", help="Write run metrics as a Prometheus textfile")
     
     args = parser.parse_args()
     
@@ -294,7 +422,8 @@ if __name__ == "__main__":
         args.password = args.password or os.environ.get("SALESFORCE_PASSWORD")
         args.token = args.token or os.environ.get("SALESFORCE_TOKEN")
         
-        if not (args.username and args.password):
+        # Credentials are not needed when replaying a cassette
+        if not (args.username and args.password) and not is_replaying(args.cassette, args.cassette_mode):
             parser.error("Salesforce credentials are required (--username and --password)")
     
     try:
@@ -304,7 +433,10 @@ if __name__ == "__main__":
             password=args.password,
             security_token=args.token,
             template_path=args.template,
-            domain=args.domain
+            domain=args.domain,
+            cassette=args.cassette,
+            cassette_mode=args.cassette_mode,
+            pipeline_workers=args.pipeline_workers
         )
         
         # Generate documentation based on arguments
@@ -328,4 +460,6 @@ if __name__ == "__main__":
         logger.error(f"Documentation generation failed: {str(e)}")
         import traceback
         traceback.print_exc()
-        exit(1)
\ No newline at end of file
+        exit(1)
+    finally:
+        finish_run(args.trace, args.metrics)
\ No newline at end of file
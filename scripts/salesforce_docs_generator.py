@@ -25,7 +25,14 @@ import logging
 import argparse
 from datetime import datetime
 from jinja2 import Environment, FileSystemLoader
-from simple_salesforce import Salesforce
+
+from instrumentation import finish_run, span
+from object_dates import fetch_object_dates
+from output_writer import get_writer
+from pipeline import DEFAULT_WORKERS, Pipeline, Stage, parse_workers
+from query_iterator import query_all, query_count
+from sf_session import connect, is_replaying
+from value_sets import ValueSetStore, write_value_set_pages
 
 # Configure logging
 logging.basicConfig(
@@ -44,6 +51,10 @@ class SalesforceDocGenerator:
         security_token=None,
         domain="login",
         template_dir="templates",
+        sf_connection=None,
+        cassette=None,
+        cassette_mode=None,
+        pipeline_workers=None,
     ):
         """
         Initialize the documentation generator
@@ -54,18 +65,32 @@ class SalesforceDocGenerator:
             security_token (str): Salesforce security token
             domain (str): Salesforce login domain (default: login)
             template_dir (str): Directory containing Jinja2 templates
+            sf_connection (Salesforce, optional): Existing connection to use
+                instead of logging in with the credentials
+            cassette (str, optional): Cassette file to record to or replay from
+            cassette_mode (str, optional): record, replay or strict
+            pipeline_workers (dict, optional): Workers per pipeline stage
+                (fetch, normalize, render, write), see pipeline.DEFAULT_WORKERS
         """
-        self.sf = None
+        self.sf = sf_connection
         self.template_dir = template_dir
+        self.pipeline_workers = dict(DEFAULT_WORKERS, **(pipeline_workers or {}))
+        self._object_dates = None
+        # Picklist value lists of the normalized objects, each kept once
+        self.value_sets = ValueSetStore()
 
         # Connect to Salesforce if credentials are provided
-        if username and password:
+        if self.sf is None and (
+            (username and password) or is_replaying(cassette, cassette_mode)
+        ):
             try:
-                self.sf = Salesforce(
+                self.sf = connect(
                     username=username,
                     password=password,
                     security_token=security_token,
                     domain=domain,
+                    cassette=cassette,
+                    cassette_mode=cassette_mode,
                 )
                 logger.info(f"Successfully connected to Salesforce as {username}")
             except Exception as e:
@@ -97,6 +122,55 @@ class SalesforceDocGenerator:
             logger.error(f"Failed to load template {template_name}: {str(e)}")
             raise
 
+    def list_objects(self, custom=None):
+        """
+        List object API names from the global describe
+
+        Args:
+            custom (bool, optional): True for custom objects, False for
+                standard objects, None for both
+
+        Returns:
+            list: Object API names
+        """
+        with span("describe_global"):
+            describe = self.sf.describe()
+        return [
+            obj["name"]
+            for obj in describe["sobjects"]
+            if custom is None or obj["custom"] == custom
+        ]
+
+    def get_record_count(self, object_name):
+        """
+        Get the number of records of an object
+
+        Args:
+            object_name (str): API name of the Salesforce object
+
+        Returns:
+            int: Record count, or None if the object cannot be counted
+        """
+        try:
+            with span("soql_query", object=object_name):
+                return query_count(self.sf, f"SELECT COUNT() FROM {object_name}")
+        except Exception as e:
+            logger.warning(f"Failed to count records for {object_name}: {str(e)}")
+            return None
+
+    def get_object_dates(self):
+        """
+        Get created and last-modified dates of all objects
+
+        Fetched once per generator with two Tooling API queries.
+
+        Returns:
+            dict: {object API name: {"created": str, "modified": str}}
+        """
+        if self._object_dates is None:
+            self._object_dates = fetch_object_dates(self.sf)
+        return self._object_dates
+
     def get_object_metadata(self, object_name):
         """
         Get metadata for a specific Salesforce object
@@ -107,106 +181,159 @@ class SalesforceDocGenerator:
         Returns:
             dict: Object metadata
         """
+        raw = self.fetch_object_data(object_name)
+        if raw is None:
+            return None
+        try:
+            return self.normalize_object_data(raw)
+        except Exception as e:
+            logger.error(f"Error getting metadata for {object_name}: {str(e)}")
+            return None
+
+    def fetch_object_data(self, object_name):
+        """
+        Fetch the raw describe, record types and validation rules of an object
+
+        This is the network part of get_object_metadata(); the pipeline runs
+        it on its fetch workers.
+
+        Args:
+            object_name (str): API name of the Salesforce object
+
+        Returns:
+            dict: {"name", "describe", "dates", "record_types", "validation_rules"},
+            or None if the object could not be described
+        """
         if not self.sf:
             logger.error("Not connected to Salesforce")
             return None
 
         try:
             # Get object description
-            obj_desc = getattr(self.sf, object_name).describe()
-
-            # Basic object info
-            metadata = {
-                "label": obj_desc["label"],
-                "api_name": obj_desc["name"],
-                "plural_label": obj_desc["labelPlural"],
-                "custom": obj_desc["custom"],
-                "description": obj_desc.get("description", "No description available"),
-                "sharing_model": obj_desc.get("sharingModel", "Unknown"),
-                "searchable": obj_desc.get("searchable", False),
-                "deletable": obj_desc.get("deletable", False),
-                "feed_enabled": obj_desc.get("feedEnabled", False),
-                "fields": [],
-                "relationships": {"child_relationships": [], "reference_fields": []},
-                "record_types": [],
-                "validation_rules": [],
-                "permissions": [],
+            with span("describe", object=object_name):
+                obj_desc = getattr(self.sf, object_name).describe()
+        except Exception as e:
+            logger.error(f"Error getting metadata for {object_name}: {str(e)}")
+            return None
+
+        raw = {
+            "name": object_name,
+            "describe": obj_desc,
+            "dates": self.get_object_dates().get(object_name) or {},
+            "record_types": [],
+            "validation_rules": [],
+        }
+
+        # Get record types
+        try:
+            query = f"SELECT Id, Name, DeveloperName, Description, IsActive FROM RecordType WHERE SObjectType = '{object_name}'"
+            with span("soql_query", object=object_name):
+                raw["record_types"] = query_all(self.sf, query)
+        except Exception as e:
+            logger.warning(f"Failed to get record types for {object_name}: {str(e)}")
+
+        # Get validation rules
+        try:
+            # Using tooling API to get validation rules
+            query = f"SELECT Id, ValidationName, Active, Description, ErrorMessage FROM ValidationRule WHERE EntityDefinition.QualifiedApiName = '{object_name}'"
+            with span("tooling_query", object=object_name):
+                raw["validation_rules"] = query_all(self.sf, query, tooling=True)
+        except Exception as e:
+            logger.warning(f"Failed to get validation rules for {object_name}: {str(e)}")
+
+        return raw
+
+    def normalize_object_data(self, raw):
+        """
+        Turn the raw data of fetch_object_data() into the template's object metadata
+
+        Args:
+            raw (dict): Output of fetch_object_data()
+
+        Returns:
+            dict: Object metadata
+        """
+        obj_desc = raw["describe"]
+        dates = raw["dates"]
+
+        # Basic object info
+        metadata = {
+            "label": obj_desc["label"],
+            "api_name": obj_desc["name"],
+            "plural_label": obj_desc["labelPlural"],
+            "custom": obj_desc["custom"],
+            "description": obj_desc.get("description", "No description available"),
+            "sharing_model": obj_desc.get("sharingModel", "Unknown"),
+            "searchable": obj_desc.get("searchable", False),
+            "deletable": obj_desc.get("deletable", False),
+            "feed_enabled": obj_desc.get("feedEnabled", False),
+            "created_date": dates.get("created"),
+            "modified_date": dates.get("modified"),
+            "fields": [],
+            "relationships": {"child_relationships": [], "reference_fields": []},
+            "record_types": [],
+            "validation_rules": [],
+            "permissions": [],
+        }
+
+        # Add fields
+        self.value_sets.cover(obj_desc["name"])
+        for field in obj_desc["fields"]:
+            field_data = {
+                "label": field["label"],
+                "api_name": field["name"],
+                "type": field["type"],
+                "required": not field["nillable"],
+                "description": field.get("description", ""),
             }
+            # Fields link to a shared value set page instead of listing the values
+            if field.get("picklistValues"):
+                field_data["value_set"] = self.value_sets.add(
+                    obj_desc["name"], field["name"], field["label"], field["picklistValues"]
+                )
+                field_data["value_count"] = len(field["picklistValues"])
+            metadata["fields"].append(field_data)
 
-            # Add fields
-            for field in obj_desc["fields"]:
-                field_data = {
+            # If it's a reference field, add to relationships
+            if field["type"] == "reference" and field.get("referenceTo"):
+                ref_data = {
                     "label": field["label"],
                     "api_name": field["name"],
-                    "type": field["type"],
-                    "required": not field["nillable"],
+                    "reference_to": ", ".join(field["referenceTo"]),
                     "description": field.get("description", ""),
                 }
-                metadata["fields"].append(field_data)
-
-                # If it's a reference field, add to relationships
-                if field["type"] == "reference" and field.get("referenceTo"):
-                    ref_data = {
-                        "label": field["label"],
-                        "api_name": field["name"],
-                        "reference_to": ", ".join(field["referenceTo"]),
-                        "description": field.get("description", ""),
-                    }
-                    metadata["relationships"]["reference_fields"].append(ref_data)
-
-            # Add child relationships
-            for rel in obj_desc.get("childRelationships", []):
-                if rel.get("childSObject") and rel.get("field"):
-                    rel_data = {
-                        "label": rel.get("childSObject"),
-                        "api_name": rel.get("field"),
-                        "description": f"Child relationship from {rel.get('childSObject')}",
-                    }
-                    metadata["relationships"]["child_relationships"].append(rel_data)
-
-            # Get record types
-            try:
-                query = f"SELECT Id, Name, DeveloperName, Description, IsActive FROM RecordType WHERE SObjectType = '{object_name}'"
-                record_types = self.sf.query(query)
-
-                for rt in record_types.get("records", []):
-                    rt_data = {
-                        "label": rt.get("Name"),
-                        "api_name": rt.get("DeveloperName"),
-                        "active": rt.get("IsActive", False),
-                        "description": rt.get("Description", ""),
-                    }
-                    metadata["record_types"].append(rt_data)
-            except Exception as e:
-                logger.warning(
-                    f"Failed to get record types for {object_name}: {str(e)}"
-                )
-
-            # Get validation rules
-            try:
-                # Using tooling API to get validation rules
-                query = f"SELECT Id, ValidationName, Active, Description, ErrorMessage FROM ValidationRule WHERE EntityDefinition.QualifiedApiName = '{object_name}'"
-                validation_rules = self.sf.tooling.query(query)
-
-                for vr in validation_rules.get("records", []):
-                    vr_data = {
-                        "label": vr.get("ValidationName"),
-                        "api_name": vr.get("ValidationName"),
-                        "active": vr.get("Active", False),
-                        "description": vr.get("Description", ""),
-                        "error_message": vr.get("ErrorMessage", ""),
-                    }
-                    metadata["validation_rules"].append(vr_data)
-            except Exception as e:
-                logger.warning(
-                    f"Failed to get validation rules for {object_name}: {str(e)}"
-                )
+                metadata["relationships"]["reference_fields"].append(ref_data)
+
+        # Add child relationships
+        for rel in obj_desc.get("childRelationships", []):
+            if rel.get("childSObject") and rel.get("field"):
+                rel_data = {
+                    "label": rel.get("childSObject"),
+                    "api_name": rel.get("field"),
+                    "description": f"Child relationship from {rel.get('childSObject')}",
+                }
+                metadata["relationships"]["child_relationships"].append(rel_data)
+
+        for rt in raw["record_types"]:
+            rt_data = {
+                "label": rt.get("Name"),
+                "api_name": rt.get("DeveloperName"),
+                "active": rt.get("IsActive", False),
+                "description": rt.get("Description", ""),
+            }
+            metadata["record_types"].append(rt_data)
+
+        for vr in raw["validation_rules"]:
+            vr_data = {
+                "label": vr.get("ValidationName"),
+                "api_name": vr.get("ValidationName"),
+                "active": vr.get("Active", False),
+                "description": vr.get("Description", ""),
+                "error_message": vr.get("ErrorMessage", ""),
+            }
+            metadata["validation_rules"].append(vr_data)
 
-            return metadata
-
-        except Exception as e:
-            logger.error(f"Error getting metadata for {object_name}: {str(e)}")
-            return None
+        return metadata
 
     def generate_object_documentation(
         self, object_name, output_path=None, template_name="object_documentation.j2"
@@ -233,27 +360,112 @@ class SalesforceDocGenerator:
                 logger.error(f"Failed to get metadata for {object_name}")
                 return None
 
-            # Get template
-            template = self.get_template(template_name)
-            if not template:
-                logger.error(f"Failed to get template {template_name}")
-                return None
+            documentation = self.render_object_documentation(
+                metadata, output_path, template_name
+            )
+            if documentation is not None and output_path:
+                self.write_value_sets(os.path.dirname(output_path))
+            return documentation
+
+        except Exception as e:
+            logger.error(f"Error generating documentation for {object_name}: {str(e)}")
+            return None
+
+    def render_object_documentation(
+        self, metadata, output_path=None, template_name="object_documentation.j2"
+    ):
+        """
+        Render documentation for already fetched object metadata
 
-            # Render template
-            documentation = template.render(object_data=metadata)
+        Needs no Salesforce connection, so it also renders from snapshots.
+
+        Args:
+            metadata (dict): Object metadata from get_object_metadata()
+            output_path (str, optional): Path to save the documentation
+            template_name (str): Name of the template to use
+
+        Returns:
+            str: Generated documentation
+        """
+        object_name = metadata.get("api_name")
+        try:
+            documentation = self._render(metadata, template_name)
+            if documentation is None:
+                return None
 
             # Save to file if output path is provided
             if output_path:
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                with open(output_path, "w") as f:
-                    f.write(documentation)
-                logger.info(f"Documentation for {object_name} saved to {output_path}")
+                self._write(output_path, documentation, object_name)
 
             return documentation
 
         except Exception as e:
-            logger.error(f"Error generating documentation for {object_name}: {str(e)}")
+            logger.error(f"Error rendering documentation for {object_name}: {str(e)}")
+            return None
+
+    def _render(self, metadata, template_name="object_documentation.j2"):
+        """Render one object's page; None if the template is missing"""
+        template = self.get_template(template_name)
+        if not template:
+            logger.error(f"Failed to get template {template_name}")
             return None
+        with span("render", object=metadata.get("api_name")):
+            return template.render(object_data=metadata)
+
+    def _write(self, output_path, documentation, object_name):
+        if get_writer().write(output_path, documentation):
+            logger.info(f"Documentation for {object_name} saved to {output_path}")
+
+    def write_value_sets(self, output_dir):
+        """
+        Write the pages of the picklist value sets of the objects normalized so far
+
+        Args:
+            output_dir (str): Directory of the object pages linking to them
+        """
+        if self.value_sets.sets:
+            write_value_set_pages(self.value_sets, output_dir, self.env)
+
+    def document_objects(self, object_names, output_dir, template_name="object_documentation.j2"):
+        """
+        Fetch, normalize, render and write several objects in a pipeline
+
+        Each step runs on its own workers (see pipeline), so objects are
+        fetched while others are rendered and written.
+
+        Args:
+            object_names (list): API names of the objects
+            output_dir (str): Directory to save the documentation
+            template_name (str): Name of the template to use
+
+        Returns:
+            list: Objects documented, in the order given
+        """
+        # Loaded once up front instead of by every fetch worker at once
+        self.get_object_dates()
+
+        def render(metadata):
+            documentation = self._render(metadata, template_name)
+            return (metadata["api_name"], documentation) if documentation is not None else None
+
+        def write(page):
+            object_name, documentation = page
+            self._write(
+                os.path.join(output_dir, f"{object_name.lower()}.md"), documentation, object_name
+            )
+            return object_name
+
+        workers = self.pipeline_workers
+        documented = Pipeline(
+            [
+                Stage("fetch", self.fetch_object_data, workers["fetch"]),
+                Stage("normalize", self.normalize_object_data, workers["normalize"]),
+                Stage("render", render, workers["render"]),
+                Stage("write", write, workers["write"]),
+            ]
+        ).run(object_names)
+        self.write_value_sets(output_dir)
+        return documented
 
     def generate_standard_objects_documentation(
         self, output_dir="docs/data-model/objects"
@@ -271,28 +483,18 @@ class SalesforceDocGenerator:
             logger.error("Not connected to Salesforce")
             return []
 
-        documented_objects = []
-
         try:
             # Get global describe to list all objects
-            describe = self.sf.describe()
+            with span("describe_global"):
+                describe = self.sf.describe()
             standard_objects = [
                 obj["name"] for obj in describe["sobjects"] if not obj["custom"]
             ]
 
             logger.info(f"Found {len(standard_objects)} standard objects")
 
-            # Generate documentation for each standard object
-            for obj_name in standard_objects:
-                try:
-                    output_path = os.path.join(output_dir, f"{obj_name.lower()}.md")
-                    documentation = self.generate_object_documentation(
-                        obj_name, output_path
-                    )
-                    if documentation:
-                        documented_objects.append(obj_name)
-                except Exception as e:
-                    logger.error(f"Error documenting {obj_name}: {str(e)}")
+            # Fetch, render and write the standard objects in a pipeline
+            documented_objects = self.document_objects(standard_objects, output_dir)
 
             logger.info(
                 f"Generated documentation for {len(documented_objects)} standard objects"
@@ -327,28 +529,18 @@ class SalesforceDocGenerator:
             logger.error("Not connected to Salesforce")
             return []
 
-        documented_objects = []
-
         try:
             # Get global describe to list all objects
-            describe = self.sf.describe()
+            with span("describe_global"):
+                describe = self.sf.describe()
             custom_objects = [
                 obj["name"] for obj in describe["sobjects"] if obj["custom"]
             ]
 
             logger.info(f"Found {len(custom_objects)} custom objects")
 
-            # Generate documentation for each custom object
-            for obj_name in custom_objects:
-                try:
-                    output_path = os.path.join(output_dir, f"{obj_name.lower()}.md")
-                    documentation = self.generate_object_documentation(
-                        obj_name, output_path
-                    )
-                    if documentation:
-                        documented_objects.append(obj_name)
-                except Exception as e:
-                    logger.error(f"Error documenting {obj_name}: {str(e)}")
+            # Fetch, render and write the custom objects in a pipeline
+            documented_objects = self.document_objects(custom_objects, output_dir)
 
             logger.info(
                 f"Generated documentation for {len(documented_objects)} custom objects"
@@ -401,9 +593,7 @@ This page lists all {title.lower()} in the Salesforce organization.
                 content += f"| {obj_name} | [{obj_name}](./{obj_name.lower()}.md) |\n"
 
             # Save to file
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            with open(output_path, "w") as f:
-                f.write(content)
+            get_writer().write(output_path, content)
 
             logger.info(f"Created {title} index at {output_path}")
 
@@ -442,6 +632,32 @@ def parse_args():
     )
     parser.add_argument("--custom", action="store_true", help="Document custom objects")
 
+    # Record/replay options
+    parser.add_argument(
+        "--cassette", help="Cassette file to record Salesforce traffic to or replay from"
+    )
+    parser.add_argument(
+        "--cassette-mode",
+        choices=["record", "replay", "strict"],
+        help="record, replay, or strict replay (default: replay if the cassette exists)",
+    )
+
+    # Pipeline options
+    parser.add_argument(
+        "--pipeline-workers",
+        type=parse_workers,
+        default=dict(DEFAULT_WORKERS),
+        help="Workers per pipeline stage, e.g. fetch=8,render=2 (default: "
+        + ",".join(f"{k}={v}" for k, v in DEFAULT_WORKERS.items())
+        + ")",
+    )
+
+    # Instrumentation options
+    parser.add_argument("--trace", help="Write a JSON trace of the run to this file")
+    parser.add_argument(
+        "--metrics", help="Write run metrics as a Prometheus textfile to this file"
+    )
+
     return parser.parse_args()
 
 
@@ -455,8 +671,10 @@ def main():
     password = args.password or os.environ.get("SALESFORCE_PASSWORD")
     token = args.token or os.environ.get("SALESFORCE_TOKEN")
 
-    # Check if we have credentials
-    if not username or not password:
+    # Check if we have credentials (not needed when replaying a cassette)
+    if (not username or not password) and not is_replaying(
+        args.cassette, args.cassette_mode
+    ):
         logger.error("Salesforce username and password are required")
         sys.exit(1)
 
@@ -468,6 +686,9 @@ def main():
             security_token=token,
             domain=args.domain,
             template_dir=args.template_dir,
+            cassette=args.cassette,
+            cassette_mode=args.cassette_mode,
+            pipeline_workers=args.pipeline_workers,
         )
 
         # Generate documentation based on arguments
@@ -498,6 +719,8 @@ def main():
 
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        finish_run(args.trace, args.metrics)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,289 @@
+"""
+Record/replay transport for Salesforce HTTP traffic
+
+A cassette is a single append-only file of zlib-compressed request/response
+entries followed by an index that maps each request key to the offsets of its
+entries. Replay reads the index up front and decompresses entries on demand.
+
+File layout:
+    MAGIC
+    entry*      4-byte big-endian length + zlib(JSON entry)
+    index       zlib(JSON {key: [offset, ...]})
+    trailer     8-byte big-endian index offset + INDEX_MAGIC
+
+If the trailer is missing (the recording process died) the entries are
+scanned sequentially instead.
+"""
+
+import atexit
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import struct
+import threading
+import zlib
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SFCASSETTE\x01\n"
+INDEX_MAGIC = b"SFIDX\x01"
+CASSETTE_MODES = ("off", "record", "replay", "strict")
+
+# Response headers worth keeping; everything else is dropped to stay compact
+KEPT_HEADERS = ("Content-Type", "Sforce-Limit-Info")
+
+# <sessionId> of login responses and <met:sessionId> of SOAP request headers
+SESSION_ID_PATTERN = re.compile(rb"<((?:[\w.-]+:)?sessionId)>[^<]*</\1>")
+SESSION_ID_PLACEHOLDER = rb"<\1>REDACTED</\1>"
+
+
+class CassetteMismatch(Exception):
+    """Raised in strict mode when a request has no recorded response"""
+
+
+def request_key(method, url, body=None):
+    """
+    Build the lookup key for a request
+
+    The host is ignored so a cassette recorded against one instance replays
+    against another. Query parameters are sorted. Request bodies are hashed,
+    except for the SOAP login whose body carries the credentials. The session
+    id in SOAP headers is replaced first, so calls recorded with a real
+    session match on replay, where the session id is REDACTED.
+
+    Args:
+        method (str): HTTP method
+        url (str): Full request URL
+        body (bytes or str, optional): Request body
+
+    Returns:
+        str: Cassette key
+    """
+    parsed = urlparse(url)
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    key = f"{method.upper()} {parsed.path}"
+    if query:
+        key += f"?{query}"
+    if body and "/Soap/u/" not in parsed.path:
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        body = SESSION_ID_PATTERN.sub(SESSION_ID_PLACEHOLDER, body)
+        key += f" #{hashlib.sha1(body).hexdigest()[:16]}"
+    return key
+
+
+class Cassette:
+    """Indexed store of recorded request/response pairs"""
+
+    def __init__(self, path, mode):
+        """
+        Open a cassette
+
+        Args:
+            path (str): Cassette file path
+            mode (str): record, replay or strict
+        """
+        if mode not in ("record", "replay", "strict"):
+            raise ValueError(f"Unsupported cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.index = {}
+        self.played = {}
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._digests = set()
+
+        if self.replaying:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Cassette not found: {path}")
+            self._file = open(path, "rb")
+            self._load_index()
+            logger.info(
+                f"Replaying {sum(len(v) for v in self.index.values())} responses from {path}"
+            )
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = open(path, "wb")
+            self._file.write(MAGIC)
+            # Write the index even if the generator never closes its session
+            atexit.register(self.close)
+
+    @property
+    def replaying(self):
+        return self.mode in ("replay", "strict")
+
+    def _load_index(self):
+        f = self._file
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{self.path} is not a cassette file")
+
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        trailer_size = 8 + len(INDEX_MAGIC)
+        if size >= len(MAGIC) + trailer_size:
+            f.seek(size - trailer_size)
+            trailer = f.read(trailer_size)
+            if trailer.endswith(INDEX_MAGIC):
+                (index_offset,) = struct.unpack(">Q", trailer[:8])
+                f.seek(index_offset)
+                raw = f.read(size - trailer_size - index_offset)
+                self.index = json.loads(zlib.decompress(raw))
+                return
+
+        # No index: the recording was interrupted, scan the entries instead
+        logger.warning(f"Cassette {self.path} has no index, scanning entries")
+        offset = len(MAGIC)
+        while offset + 4 <= size:
+            f.seek(offset)
+            (length,) = struct.unpack(">I", f.read(4))
+            data = f.read(length)
+            if len(data) < length:
+                break
+            entry = json.loads(zlib.decompress(data))
+            self.index.setdefault(entry["key"], []).append(offset)
+            offset += 4 + length
+
+    def _read_entry(self, offset):
+        self._file.seek(offset)
+        (length,) = struct.unpack(">I", self._file.read(4))
+        return json.loads(zlib.decompress(self._file.read(length)))
+
+    def record(self, key, response):
+        """
+        Append a response to the cassette
+
+        Args:
+            key (str): Request key from request_key()
+            response (requests.Response): Response to store
+        """
+        content = SESSION_ID_PATTERN.sub(SESSION_ID_PLACEHOLDER, response.content)
+        try:
+            body, encoding = content.decode("utf-8"), "utf-8"
+        except UnicodeDecodeError:
+            body, encoding = base64.b64encode(content).decode("ascii"), "base64"
+        entry = {
+            "key": key,
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {
+                name: response.headers[name]
+                for name in KEPT_HEADERS
+                if name in response.headers
+            },
+            "encoding": encoding,
+            "body": body,
+        }
+
+        with self._lock:
+            # Identical repeats of a response are stored only once
+            digest = hashlib.sha1(
+                f"{key}\0{entry['status']}\0".encode("utf-8") + content
+            ).digest()
+            if digest in self._digests:
+                return
+            self._digests.add(digest)
+
+            data = zlib.compress(json.dumps(entry, separators=(",", ":")).encode("utf-8"))
+            offset = self._file.tell()
+            self._file.write(struct.pack(">I", len(data)))
+            self._file.write(data)
+            self._file.flush()
+            self.index.setdefault(key, []).append(offset)
+
+    def play(self, key):
+        """
+        Return the next recorded entry for a key
+
+        Repeated requests are served the recorded responses in order; once
+        they run out the last one is repeated.
+
+        Args:
+            key (str): Request key from request_key()
+
+        Returns:
+            dict: Recorded entry, or None when nothing matches
+        """
+        with self._lock:
+            offsets = self.index.get(key)
+            if not offsets:
+                self.misses += 1
+                return None
+            position = self.played.get(key, 0)
+            self.played[key] = position + 1
+            return self._read_entry(offsets[min(position, len(offsets) - 1)])
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            if not self.replaying:
+                index_offset = self._file.tell()
+                self._file.write(
+                    zlib.compress(json.dumps(self.index, separators=(",", ":")).encode("utf-8"))
+                )
+                self._file.write(struct.pack(">Q", index_offset) + INDEX_MAGIC)
+                logger.info(
+                    f"Recorded {sum(len(v) for v in self.index.values())} responses to {self.path}"
+                )
+            self._file.close()
+            self._file = None
+
+
+class CassetteAdapter(HTTPAdapter):
+    """Transport adapter that records to or replays from a cassette"""
+
+    def __init__(self, path, mode, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = Cassette(path, mode)
+
+    def send(self, request, **kwargs):
+        key = request_key(request.method, request.url, request.body)
+
+        if not self.cassette.replaying:
+            response = super().send(request, **kwargs)
+            self.cassette.record(key, response)
+            return response
+
+        entry = self.cassette.play(key)
+        if entry is None:
+            if self.cassette.mode == "strict":
+                raise CassetteMismatch(f"No recorded response for {key}")
+            logger.warning(f"No recorded response for {key}")
+            entry = {
+                "status": 404,
+                "reason": "Not Recorded",
+                "headers": {"Content-Type": "application/json"},
+                "encoding": "utf-8",
+                "body": json.dumps(
+                    [{"errorCode": "NOT_FOUND", "message": f"Not in cassette: {key}"}]
+                ),
+            }
+        return self._build_response(request, entry)
+
+    @staticmethod
+    def _build_response(request, entry):
+        response = Response()
+        response.status_code = entry["status"]
+        response.reason = entry.get("reason")
+        response.headers = CaseInsensitiveDict(entry.get("headers", {}))
+        if entry.get("encoding") == "base64":
+            response._content = base64.b64decode(entry["body"])
+        else:
+            response._content = entry["body"].encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        self.cassette.close()
+        super().close()
@@ -0,0 +1,164 @@
+"""
+Shared Salesforce session factory
+
+Every generator connects through connect() so that transport-level features
+(record/replay cassettes, API call instrumentation, API budgets) apply to all
+of them.
+The cassette can be selected explicitly or with the SF_CASSETTE and
+SF_CASSETTE_MODE environment variables, which also covers the interactive
+app.
+"""
+
+import os
+import threading
+
+import requests
+from simple_salesforce import Salesforce
+
+from instrumentation import get_tracer, span
+from sf_cassette import CASSETTE_MODES, CassetteAdapter
+
+# Credentials used when replaying a cassette without real credentials
+REPLAY_USERNAME = "replay@example.com"
+REPLAY_PASSWORD = "replay"
+
+
+class ApiBudgetExceeded(Exception):
+    """Raised instead of sending a request past an API budget"""
+
+
+class ApiBudget:
+    """
+    Caps the requests sent through a session
+
+    Used to split one budget between orgs (org_runner) and to stop a cache
+    warm-up (cache_warmer) before it uses up the org's API requests.
+    """
+
+    def __init__(self, max_calls=None):
+        """
+        Args:
+            max_calls (int, optional): Requests allowed, None for no limit
+        """
+        self.max_calls = max_calls
+        self.calls = 0
+        # Requests refused once the budget was used up
+        self.refused = 0
+        self._lock = threading.Lock()
+
+    @property
+    def exhausted(self):
+        return self.max_calls is not None and self.calls >= self.max_calls
+
+    def spend(self):
+        with self._lock:
+            if self.exhausted:
+                self.refused += 1
+                raise ApiBudgetExceeded(f"API budget of {self.max_calls} requests used up")
+            self.calls += 1
+
+    def attach(self, session):
+        """Count every request of a requests session against the budget"""
+        request = session.request
+
+        def limited(*args, **kwargs):
+            self.spend()
+            return request(*args, **kwargs)
+
+        limited.unlimited = request
+        session.request = limited
+        return session
+
+    def detach(self, session):
+        """Stop counting the requests of a session attached with attach()"""
+        request = getattr(session.request, "unlimited", None)
+        if request is not None:
+            session.request = request
+
+
+def cassette_settings(cassette=None, cassette_mode=None):
+    """
+    Resolve cassette path and mode from arguments or the environment
+
+    Returns:
+        tuple: (cassette path or None, mode)
+    """
+    cassette = cassette or os.environ.get("SF_CASSETTE")
+    mode = cassette_mode or os.environ.get("SF_CASSETTE_MODE") or "off"
+    if mode not in CASSETTE_MODES:
+        raise ValueError(
+            f"Unknown cassette mode {mode!r}, expected one of {', '.join(CASSETTE_MODES)}"
+        )
+    if not cassette:
+        mode = "off"
+    elif mode == "off":
+        # A cassette without an explicit mode replays when it exists
+        mode = "replay" if os.path.exists(cassette) else "record"
+    return cassette, mode
+
+
+def is_replaying(cassette=None, cassette_mode=None):
+    """Return True when requests are served from a cassette"""
+    return cassette_settings(cassette, cassette_mode)[1] in ("replay", "strict")
+
+
+def create_session(cassette=None, cassette_mode=None):
+    """
+    Create the requests session used for Salesforce calls
+
+    Args:
+        cassette (str, optional): Cassette file for record/replay
+        cassette_mode (str, optional): off, record, replay or strict
+
+    Returns:
+        requests.Session: Session with the cassette adapter mounted if needed
+    """
+    session = requests.Session()
+    cassette, mode = cassette_settings(cassette, cassette_mode)
+    if mode != "off":
+        adapter = CassetteAdapter(cassette, mode)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.cassette = adapter.cassette
+    return get_tracer().instrument_session(session)
+
+
+def connect(
+    username=None,
+    password=None,
+    security_token=None,
+    domain="login",
+    session=None,
+    cassette=None,
+    cassette_mode=None,
+):
+    """
+    Log in to Salesforce through the shared session
+
+    Args:
+        username (str): Salesforce username
+        password (str): Salesforce password
+        security_token (str): Salesforce security token
+        domain (str): Salesforce login domain (default: login)
+        session (requests.Session, optional): Session to use
+        cassette (str, optional): Cassette file for record/replay
+        cassette_mode (str, optional): off, record, replay or strict
+
+    Returns:
+        simple_salesforce.Salesforce: Authenticated connection
+    """
+    if session is None:
+        session = create_session(cassette, cassette_mode)
+    if getattr(session, "cassette", None) is not None and session.cassette.replaying:
+        # Login is replayed from the cassette, so any credentials will do
+        username = username or REPLAY_USERNAME
+        password = password or REPLAY_PASSWORD
+        security_token = security_token or ""
+    with span("login", domain=domain):
+        return Salesforce(
+            username=username,
+            password=password,
+            security_token=security_token,
+            domain=domain,
+            session=session,
+        )
@@ -0,0 +1,282 @@
+"""
+Deduplicated picklist value sets
+
+Describe results carry the full picklistValues list of every picklist field.
+Global value sets (countries, states, industries, ...) repeat across dozens of
+fields, so the same list ends up in every cached describe, in memory and on
+every page. Value lists are identified by a hash of their values, labels and
+active flags, and kept once:
+
+    - the normalizers put a value_set key on each picklist field instead of
+      the values, and ValueSetStore keeps each list once with the fields
+      using it
+    - write_value_set_pages() renders one page per value set, plus an index,
+      to <output_dir>/value-sets/; the field tables link to them. The sets
+      are kept in value-sets/.value_sets.json and each run is merged into
+      them: the objects normalized in the run replace their earlier entries,
+      all others stay, so documenting a single object keeps the full index
+    - cache_value_sets() does the same for cached describes (main.py): the
+      fields keep a valueSet key and each list is cached as
+      value_set_<key>.pkl, saved again whenever a describe using it is
+      cached, so it does not expire before the describes referencing it; cached_value_sets() reads them back into a store,
+      so PageAssembler writes the same pages next to the data dictionary
+
+Default values differ between fields sharing a list, so they are not part of
+the set; the field keeps its own default as picklistDefault.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+
+from output_writer import get_writer
+
+VALUE_SET_DIR = "value-sets"
+STATE_NAME = ".value_sets.json"
+
+# Cache path -> time this process last saved the value set, see cache_value_sets
+_saved: Dict[str, float] = {}
+# Saves of the same value set closer together than this are skipped
+RESAVE_SECONDS = 60.0
+_saved_lock = threading.Lock()
+
+
+def compact_values(values: List[Dict]) -> List[Dict]:
+    """The parts of describe picklist values that are shared between fields"""
+    return [
+        {"value": v.get("value"), "label": v.get("label"), "active": v.get("active", True)}
+        for v in values
+    ]
+
+
+def value_set_key(values: List[Dict]) -> str:
+    """Hash identifying a list of (compacted) picklist values"""
+    data = json.dumps(compact_values(values), separators=(",", ":"), sort_keys=True)
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def cache_key(key: str) -> str:
+    return f"value_set_{key}.pkl"
+
+
+def default_value(values: List[Dict]) -> Optional[str]:
+    return next((v.get("value") for v in values if v.get("defaultValue")), None)
+
+
+class ValueSetStore:
+    """Picklist value lists by key, each with the fields using it"""
+
+    def __init__(self):
+        # key -> {"values": [...], "fields": {"Object.Field": label}}
+        self.sets: Dict[str, Dict] = {}
+        # Objects whose fields are all in the store, picklists or not
+        self.objects: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def cover(self, object_name: str):
+        """Record that all picklist fields of an object are (being) added"""
+        with self._lock:
+            self.objects.add(object_name)
+
+    def add(self, object_name: str, field_name: str, label: str, values: List[Dict]) -> str:
+        """Record the values of one field; returns the key of its value set"""
+        key = value_set_key(values)
+        with self._lock:
+            entry = self.sets.get(key)
+            if entry is None:
+                entry = self.sets[key] = {"values": compact_values(values), "fields": {}}
+            entry["fields"][f"{object_name}.{field_name}"] = label
+        return key
+
+    def update(self, sets: Dict[str, Dict], objects: Iterable[str] = ()):
+        """
+        Merge value sets of another store, e.g. read from a snapshot
+
+        Args:
+            sets: key -> {"values", "fields"}
+            objects: Objects whose fields are all in sets
+        """
+        with self._lock:
+            self.objects.update(objects)
+            for key, other in sets.items():
+                entry = self.sets.setdefault(key, {"values": other["values"], "fields": {}})
+                entry["fields"].update(other["fields"])
+
+    @property
+    def values_seen(self) -> int:
+        """Values the fields would carry without deduplication"""
+        return sum(len(entry["values"]) * len(entry["fields"]) for entry in self.sets.values())
+
+    @property
+    def values_stored(self) -> int:
+        return sum(len(entry["values"]) for entry in self.sets.values())
+
+    def entries(self) -> List[Dict]:
+        """Copies of the value sets with their key and title, ordered by title"""
+        with self._lock:
+            entries = [
+                dict(entry, key=key, title=title(entry), fields=dict(sorted(entry["fields"].items())))
+                for key, entry in self.sets.items()
+            ]
+        return sorted(entries, key=lambda entry: (entry["title"].lower(), entry["key"]))
+
+
+def title(entry: Dict) -> str:
+    """Title of a value set: the label most of its fields use"""
+    labels = Counter(entry["fields"].values())
+    return min(labels, key=lambda label: (-labels[label], label)) if labels else "Value Set"
+
+
+def _load_state(path: str) -> Dict[str, Dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("value_sets", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def merge_state(previous: Dict[str, Dict], store: ValueSetStore) -> ValueSetStore:
+    """
+    Value sets of earlier runs updated with a store
+
+    Fields of the objects the store covers are taken from the store only, so
+    a field whose values changed leaves its old set.
+    """
+    merged = ValueSetStore()
+    for key, entry in previous.items():
+        fields = {
+            name: label
+            for name, label in entry["fields"].items()
+            if name.split(".", 1)[0] not in store.objects
+        }
+        if fields:
+            merged.sets[key] = {"values": entry["values"], "fields": fields}
+    with store._lock:
+        current = {key: dict(entry, fields=dict(entry["fields"])) for key, entry in store.sets.items()}
+    merged.update(current)
+    return merged
+
+
+def write_value_set_pages(
+    store: ValueSetStore, output_dir: str, env, object_links: bool = True
+) -> List[str]:
+    """
+    Render one page per value set and an index page to <output_dir>/value-sets/
+
+    The store is merged into the value sets of earlier runs (see merge_state),
+    and pages of sets no field uses anymore are removed.
+
+    Args:
+        store: Value sets of this run
+        output_dir: Directory of the object pages linking to the value sets
+        env: Jinja2 environment with value_set.j2 and value_sets.j2
+        object_links: Link the fields to the object pages in output_dir
+
+    Returns:
+        Paths written (unchanged pages are skipped)
+    """
+    directory = os.path.join(output_dir, VALUE_SET_DIR)
+    state_path = os.path.join(directory, STATE_NAME)
+    previous = _load_state(state_path)
+    store = merge_state(previous, store)
+    for key in set(previous) - set(store.sets):
+        try:
+            os.remove(os.path.join(directory, f"{key}.md"))
+        except OSError:
+            pass
+
+    page = env.get_template("value_set.j2")
+    ordered = store.entries()
+    files = [
+        (
+            os.path.join(directory, f"{entry['key']}.md"),
+            page.render(value_set=entry, object_links=object_links),
+        )
+        for entry in ordered
+    ]
+    files.append(
+        (
+            os.path.join(directory, "index.md"),
+            env.get_template("value_sets.j2").render(
+                value_sets=ordered,
+                values_seen=store.values_seen,
+                values_stored=store.values_stored,
+            ),
+        )
+    )
+    files.append(
+        (state_path, json.dumps({"value_sets": store.sets}, sort_keys=True, ensure_ascii=False))
+    )
+    return get_writer().write_many(files)
+
+
+def cache_value_sets(cache, fields: List[Dict]) -> List[Dict]:
+    """
+    Cached describe fields with each picklist value list stored once in the cache
+
+    Args:
+        cache: SalesforceCache of the org
+        fields: Describe fields of the object
+
+    Returns:
+        The fields, picklistValues replaced by valueSet, valueCount and
+        picklistDefault
+    """
+    compacted = []
+    for field in fields:
+        values = field.get("picklistValues")
+        if not values:
+            compacted.append(field)
+            continue
+        key = value_set_key(values)
+        # Identical lists hash to the same entry. Saving it again renews its
+        # timestamp along with the describes using it; a shared list is not
+        # rewritten for every field of one describe batch
+        path = cache._get_cache_path(cache_key(key))
+        now = time.time()
+        with _saved_lock:
+            stale = now - _saved.get(path, float("-inf")) > RESAVE_SECONDS
+            if stale:
+                _saved[path] = now
+        if stale:
+            cache.save(compact_values(values), cache_key(key))
+        field = {name: value for name, value in field.items() if name != "picklistValues"}
+        field.update(valueSet=key, valueCount=len(values), picklistDefault=default_value(values))
+        compacted.append(field)
+    return compacted
+
+
+def cached_value_sets(cache, objects: Iterable[Dict]) -> ValueSetStore:
+    """
+    Value sets of cached object metadata, read back from the cache
+
+    Args:
+        cache: SalesforceCache the describes were cached in
+        objects: Object metadata whose fields carry valueSet keys
+
+    Returns:
+        Store covering the objects; fields whose list is no longer cached
+        are left out
+
+    The lists are read regardless of their age: a key is the hash of the
+    values, so the list it names never changes, and whether it is current
+    is decided by the (fresh) describe referencing it.
+    """
+    store = ValueSetStore()
+    values: Dict[str, Optional[List[Dict]]] = {}
+    for obj in objects:
+        store.cover(obj["api_name"])
+        for field in obj.get("fields") or []:
+            key = field.get("valueSet")
+            if not key:
+                continue
+            if key not in values:
+                values[key] = cache.load(cache_key(key), ttl=float("inf"))
+            if values[key]:
+                label = field.get("label") or field["name"]
+                store.add(obj["api_name"], field["name"], label, values[key])
+    return store
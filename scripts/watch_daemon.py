@@ -0,0 +1,239 @@
+"""
+Watch daemon regenerating the pages affected by Setup changes
+
+A regular run logs in, imports everything, compiles the templates and loads
+the cache from disk. The daemon does that once and keeps it all warm: the
+authenticated session, the PageAssembler with its compiled templates and the
+object metadata it has loaded. It then polls SetupAuditTrail and, for every
+batch of new rows:
+
+    1. maps each row to the objects, cache files and docs page types it
+       affects (SECTION_RULES, object sections for fields, layouts, ...)
+    2. expires those cache files and drops or reloads the affected in-memory
+       data; objects are reloaded one by one instead of the whole list
+    3. re-renders only the pages of the affected page types
+"""
+
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set
+
+from instrumentation import span
+from page_assembler import FETCHERS, METADATA_API_TYPES, PageAssembler
+from query_iterator import query_all
+
+logger = logging.getLogger(__name__)
+
+AUDIT_QUERY = (
+    "SELECT Id, Action, Section, Display, CreatedDate, CreatedBy.Username "
+    "FROM SetupAuditTrail WHERE CreatedDate >= {since} ORDER BY CreatedDate"
+)
+
+DEFAULT_INTERVAL = 30.0
+
+# (Section prefixes, page types, cache files, assembler sources) of Setup
+# areas that are not about one object
+SECTION_RULES = (
+    (("Apex Class",), ["apex_classes", "apex_tests"], ["apex_inventory.pkl"], ["apex"]),
+    (("Apex Trigger",), ["apex_triggers"], ["apex_inventory.pkl"], ["apex"]),
+    (
+        ("Flows", "Process Builder", "Workflow"),
+        ["flow_usage"],
+        ["metadata_api_Flow.pkl"],
+        ["metadata_api"],
+    ),
+    (
+        ("Manage Users", "Profiles"),
+        ["profile_permissions", "profile_matrix"],
+        ["permission_matrix.pkl", "metadata_api_Profile.pkl"],
+        ["permissions"],
+    ),
+    (
+        ("Permission Sets",),
+        ["permission_sets"],
+        ["permission_matrix.pkl", "metadata_api_PermissionSet.pkl"],
+        ["permissions"],
+    ),
+    (("Roles", "Role Hierarchy"), ["roles"], ["role_hierarchy.pkl"], []),
+    (("Territories", "Territory"), ["territories"], ["territory_hierarchy.pkl"], []),
+)
+
+# Sections about the definition of one object (fields, layouts, rules, ...)
+OBJECT_SECTION_PREFIXES = ("Customize ", "Custom Objects", "Custom Object")
+
+# Page assembler fetchers rendering from the object metadata
+OBJECT_FETCHERS = ("_standard_objects", "_custom_objects", "_all_objects", "_field_usage")
+
+
+def _object_page_types() -> List[str]:
+    """Page types rendered from the object metadata"""
+    return [
+        metadata_type
+        for metadata_type, fetch in FETCHERS.items()
+        if fetch.__name__ in OBJECT_FETCHERS
+    ]
+
+
+def _plurals(label: str) -> Set[str]:
+    label = label.lower()
+    plurals = {label, f"{label}s", f"{label}es"}
+    if label.endswith("y"):
+        plurals.add(f"{label[:-1]}ies")
+    return plurals
+
+
+def resolve_objects(row: Dict, objects: List[Dict]) -> Optional[Set[str]]:
+    """
+    Objects an object-section audit row is about
+
+    Returns:
+        API names, or None when the row names no known object
+    """
+    section = row.get("Section") or ""
+    display = row.get("Display") or ""
+    if section.startswith("Customize "):
+        plural = section[len("Customize ") :].strip().lower()
+        names = {obj["api_name"] for obj in objects if plural in _plurals(obj.get("label") or "")}
+        if names:
+            return names
+    # Custom object rows name the object by label or API name in Display
+    names = {
+        obj["api_name"]
+        for obj in objects
+        if re.search(rf"\b{re.escape(obj['api_name'])}\b", display)
+        or (obj.get("label") and re.search(rf"\b{re.escape(obj['label'])}\b", display))
+    }
+    return names or None
+
+
+def soql_datetime(value: str) -> str:
+    """Salesforce timestamp (2024-01-15T10:30:00.000+0000) as a SOQL literal"""
+    return f"{value[:19]}Z"
+
+
+class WatchDaemon:
+    """Poll SetupAuditTrail and regenerate the affected pages"""
+
+    def __init__(self, metadata, assembler: PageAssembler, interval: float = DEFAULT_INTERVAL):
+        """
+        Args:
+            metadata: SalesforceMetadata with the warm connection and cache
+            assembler: PageAssembler kept across polls
+            interval: Seconds between SetupAuditTrail polls
+        """
+        self.metadata = metadata
+        self.assembler = assembler
+        self.interval = interval
+        self.since = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        # Ids of the rows at self.since, which the next poll returns again
+        self._seen: Set[str] = set()
+        self.cycles = 0
+
+    def poll(self) -> List[Dict]:
+        """SetupAuditTrail rows created since the previous poll"""
+        with span("watch_poll"):
+            rows = query_all(self.metadata.sf, AUDIT_QUERY.format(since=self.since))
+        new_rows = [row for row in rows if row["Id"] not in self._seen]
+        if rows:
+            latest = soql_datetime(rows[-1]["CreatedDate"])
+            if latest != self.since:
+                self.since, self._seen = latest, set()
+            self._seen.update(
+                row["Id"] for row in rows if soql_datetime(row["CreatedDate"]) == latest
+            )
+        return new_rows
+
+    def affected(self, rows: List[Dict]) -> Dict[str, Set[str]]:
+        """
+        Everything a batch of audit rows invalidates
+
+        Returns:
+            {"types", "cache_files", "sources", "objects"}; objects holds
+            "*" when an object change names no loaded object, e.g. a new
+            custom object, and the object list has to be reloaded
+        """
+        result = {"types": set(), "cache_files": set(), "sources": set(), "objects": set()}
+        loaded = self.assembler.objects()
+        for row in rows:
+            section = row.get("Section") or ""
+            for prefixes, types, cache_files, sources in SECTION_RULES:
+                if section.startswith(prefixes):
+                    result["types"].update(types)
+                    result["cache_files"].update(cache_files)
+                    result["sources"].update(sources)
+            if not section.startswith(OBJECT_SECTION_PREFIXES):
+                continue
+            result["types"].update(_object_page_types())
+            names = resolve_objects(row, loaded)
+            result["objects"].update(names or {"*"})
+            if "layout" in (row.get("Display") or "").lower():
+                result["types"].update(
+                    t for t, api in METADATA_API_TYPES.items() if api == "Layout"
+                )
+                result["cache_files"].add("metadata_api_Layout.pkl")
+                result["sources"].add("metadata_api")
+        return result
+
+    def apply(self, rows: List[Dict]) -> List[str]:
+        """Invalidate what the rows changed and re-render the affected pages"""
+        affected = self.affected(rows)
+        cache = self.metadata.cache
+        for filename in affected["cache_files"]:
+            cache.invalidate(filename)
+
+        objects = affected["objects"]
+        if objects:
+            self.metadata.clear_object_dates()
+            for name in objects - {"*"}:
+                cache.invalidate(f"object_metadata_{name}.pkl")
+                cache.invalidate(f"field_usage_{name}.pkl")
+            if "*" in objects:
+                # Objects still cached are read back from disk, not described
+                cache.invalidate("custom_object_names.pkl")
+                self.assembler.invalidate("objects")
+            else:
+                self.assembler.refresh_objects(sorted(objects))
+        self.assembler.invalidate(*affected["sources"])
+
+        paths = {
+            path
+            for metadata_type, path in self.assembler.docs_paths.items()
+            if metadata_type in affected["types"]
+        }
+        if not paths:
+            return []
+        with span("watch_regenerate", pages=len(paths)):
+            return self.assembler.assemble(sorted(paths))
+
+    def run_once(self) -> List[str]:
+        """One poll; returns the pages written"""
+        self.cycles += 1
+        try:
+            rows = self.poll()
+        except Exception as e:
+            print(f"Error polling SetupAuditTrail: {str(e)}")
+            return []
+        if not rows:
+            return []
+        for row in rows:
+            print(f"{row.get('CreatedDate')} {row.get('Section')}: {row.get('Display')}")
+        written = self.apply(rows)
+        print(f"Regenerated {len(written)} pages after {len(rows)} Setup changes")
+        return written
+
+    def run(self, stop: Optional[threading.Event] = None, max_cycles: Optional[int] = None):
+        """Poll until stopped (Ctrl+C, stop event or max_cycles polls)"""
+        stop = stop or threading.Event()
+        print(f"Watching SetupAuditTrail every {self.interval:g}s since {self.since}")
+        try:
+            while not stop.is_set():
+                started = time.monotonic()
+                self.run_once()
+                if max_cycles is not None and self.cycles >= max_cycles:
+                    break
+                stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            print("Stopped watching")